@@ -5,6 +5,56 @@ Kite Agent implementation for identity management
 
 import os
 import sys
+import atexit
+
+from console import log
+from metrics import span
+
+# Batches at least this large are signed on a process pool
+PARALLEL_SIGNING_THRESHOLD = int(os.getenv("SIGNING_PARALLEL_THRESHOLD", 256))
+# Signing processes (default: one per CPU)
+SIGNING_PROCESSES = int(os.getenv("SIGNING_PROCESSES", 0)) or os.cpu_count() or 1
+
+_signing_pool = None
+# Accounts derived in this (worker) process, by private key
+_worker_accounts = {}
+
+
+def _sign_chunk(private_key, transactions):
+    """
+    Sign a slice of a batch in a worker process, deriving the account once per process
+    """
+    account = _worker_accounts.get(private_key)
+    if account is None:
+        from eth_account import Account
+        account = _worker_accounts[private_key] = Account.from_key(private_key)
+    return [account.sign_transaction(transaction) for transaction in transactions]
+
+
+def get_signing_pool():
+    """
+    Shared process pool for batch signing, started on first use
+    """
+    global _signing_pool
+    if _signing_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn: forking a process that runs an event loop and pooled connections is unsafe
+        _signing_pool = ProcessPoolExecutor(max_workers=SIGNING_PROCESSES,
+                                            mp_context=multiprocessing.get_context("spawn"))
+        atexit.register(shutdown_signing_pool)
+    return _signing_pool
+
+
+def shutdown_signing_pool():
+    """
+    Stop the batch signing workers; the next large batch starts a new pool
+    """
+    global _signing_pool
+    if _signing_pool is not None:
+        _signing_pool.shutdown()
+        _signing_pool = None
+
 
 class KiteAgent:
     """
@@ -12,16 +62,39 @@ class KiteAgent:
     Provides identity management, registration, authorization, and transaction capabilities
     """
     
-    def __init__(self, private_key):
+    def __init__(self, private_key, rpc_url="https://rpc-testnet.gokite.ai/"):
         """
         Initialize Kite Agent with private key
         
         Args:
             private_key (str): Ethereum private key (with or without 0x prefix)
+            rpc_url (str): RPC endpoint used when sending transactions
         """
         self.private_key = private_key if private_key.startswith('0x') else '0x' + private_key
+        self.rpc_url = rpc_url
         self.address = None
         self.sdk = None
+        self._account = None
+        self._web3 = None
+
+    @property
+    def account(self):
+        """
+        Local account for the private key, derived once
+        """
+        if self._account is None:
+            from eth_account import Account
+            self._account = Account.from_key(self.private_key)
+        return self._account
+
+    def _get_web3(self):
+        """
+        Get the shared keep-alive Web3 client for this agent's RPC endpoint, created on first use
+        """
+        if self._web3 is None:
+            from transport import get_web3
+            self._web3 = get_web3(self.rpc_url)
+        return self._web3
         
     def init_sdk(self):
         """
@@ -29,26 +102,22 @@ class KiteAgent:
         """
         try:
             # Simulate Kite Agent initialization
-            print("✅ Kite Agent initialized successfully")
+            log("✅ Kite Agent initialized successfully")
             
             # Get EOA address from private key
-            from eth_account import Account
-            account = Account.from_key(self.private_key)
-            eoa_address = account.address
+            eoa_address = self.account.address
             
             # Generate Kite Agent address (simulated)
             # In a real implementation, this would use getAccountAddress from gokite-aa-sdk
             # For now, we'll use the EOA address with a prefix to indicate it's a Kite Agent
             self.address = eoa_address
-            print(f"✅ Kite Agent address: {self.address}")
+            log(f"✅ Kite Agent address: {self.address}")
             
             return True
         except Exception as e:
             print(f"❌ Failed to initialize Kite Agent: {e}")
             # Fallback to traditional private key usage
-            from eth_account import Account
-            account = Account.from_key(self.private_key)
-            self.address = account.address
+            self.address = self.account.address
             print(f"⚠️  Using traditional private key address: {self.address}")
             return False
     
@@ -73,24 +142,57 @@ class KiteAgent:
         Returns:
             dict: Signed transaction
         """
+        with span("sign"):
+            return self._sign_transaction(transaction)
+
+    def _sign_transaction(self, transaction):
         try:
             if self.sdk:
                 # Use SDK to sign transaction
                 # Note: This is a simplified implementation
-                print("✅ Using Kite Agent to sign transaction")
+                log("✅ Using Kite Agent to sign transaction")
                 return transaction
             else:
                 # Fallback to traditional signing
-                from eth_account import Account
-                signed_tx = Account.sign_transaction(transaction, self.private_key)
-                print("⚠️  Using traditional private key to sign transaction")
+                signed_tx = self.account.sign_transaction(transaction)
+                log("⚠️  Using traditional private key to sign transaction")
                 return signed_tx
         except Exception as e:
             print(f"❌ Failed to sign transaction: {e}")
             # Fallback to traditional signing
-            from eth_account import Account
-            signed_tx = Account.sign_transaction(transaction, self.private_key)
+            signed_tx = self.account.sign_transaction(transaction)
             return signed_tx
+
+    def sign_transactions(self, transactions, parallel=None):
+        """
+        Sign many prebuilt transactions
+
+        Large batches are split across a process pool, since secp256k1 signing and
+        RLP encoding are CPU-bound.
+
+        Args:
+            transactions (list): Transactions to sign
+            parallel (bool): Force (True) or disable (False) the process pool
+                (default: batches of at least SIGNING_PARALLEL_THRESHOLD)
+
+        Returns:
+            list: Signed transactions, in input order
+        """
+        transactions = list(transactions)
+        if self.sdk:
+            return [self.sign_transaction(transaction) for transaction in transactions]
+        if parallel is None:
+            parallel = len(transactions) >= PARALLEL_SIGNING_THRESHOLD and SIGNING_PROCESSES > 1
+        with span("sign_batch"):
+            if not parallel or not transactions:
+                return [self.account.sign_transaction(transaction) for transaction in transactions]
+            # A few chunks per process keeps workers busy without much pickling overhead
+            size = max(1, -(-len(transactions) // (SIGNING_PROCESSES * 4)))
+            chunks = [transactions[i:i + size] for i in range(0, len(transactions), size)]
+            signed = []
+            for part in get_signing_pool().map(_sign_chunk, [self.private_key] * len(chunks), chunks):
+                signed.extend(part)
+            return signed
     
     def send_transaction(self, transaction):
         """
@@ -102,25 +204,27 @@ class KiteAgent:
         Returns:
             str: Transaction hash
         """
+        with span("send"):
+            return self._send_transaction(transaction)
+
+    def _send_transaction(self, transaction):
         try:
             if self.sdk:
                 # Use SDK to send user operation
-                print("✅ Using Kite Agent to send transaction")
+                log("✅ Using Kite Agent to send transaction")
                 # Note: This is a simplified implementation
                 # In a real implementation, you would use sendUserOperation
                 return "0xmock_transaction_hash"
             else:
                 # Fallback to traditional transaction sending
-                from web3 import Web3
-                w3 = Web3(Web3.HTTPProvider("https://rpc-testnet.gokite.ai/"))
+                w3 = self._get_web3()
                 signed_tx = self.sign_transaction(transaction)
                 tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
                 return tx_hash.hex()
         except Exception as e:
             print(f"❌ Failed to send transaction: {e}")
             # Fallback to traditional transaction sending
-            from web3 import Web3
-            w3 = Web3(Web3.HTTPProvider("https://rpc-testnet.gokite.ai/"))
+            w3 = self._get_web3()
             signed_tx = self.sign_transaction(transaction)
             tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
             return tx_hash.hex()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Tool-calling agent loop for OpenAI-compatible chat models
+
+The model is called repeatedly until it answers without requesting tools, so
+tools can build on each other's results over several steps. All tool calls of
+one turn run concurrently (sync tools on worker threads), and results of tools
+registered as idempotent are memoized in a bounded LRU shared by every run of
+the loop, so repeated lookups cost nothing. With on_token set, completions are
+streamed: content is handed over token by token and tool calls are assembled
+from their deltas (see llm_cache.py).
+
+Settings can be overridden with environment variables:
+    AGENT_MAX_STEPS     Model turns per run before giving up (default: 8)
+    TOOL_CACHE_SIZE     Memoized idempotent tool results kept (default: 1024)
+"""
+
+import os
+import json
+import asyncio
+import inspect
+from collections import OrderedDict
+
+AGENT_MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", 8))
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", 1024))
+
+
+class Tool:
+    """
+    A function the model may call
+    """
+
+    def __init__(self, function, description, parameters, name=None, idempotent=False):
+        """
+        Initialize tool
+
+        Args:
+            function (callable): Called with the model's arguments as keyword arguments;
+                may be a coroutine function
+            description (str): What the tool does, for the model
+            parameters (dict): JSON schema of the arguments
+            name (str): Tool name (default: the function name)
+            idempotent (bool): Same arguments always give the same result, so it may be memoized
+        """
+        self.function = function
+        self.name = name or function.__name__
+        self.description = description
+        self.parameters = parameters
+        self.idempotent = idempotent
+
+    def schema(self):
+        """Tool definition for the chat completions API"""
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            },
+        }
+
+    async def __call__(self, **kwargs):
+        if inspect.iscoroutinefunction(self.function):
+            result = await self.function(**kwargs)
+        else:
+            result = await asyncio.to_thread(self.function, **kwargs)
+        return result if isinstance(result, str) else json.dumps(result)
+
+
+class ToolCache:
+    """
+    Bounded LRU of idempotent tool results
+
+    Concurrent calls with the same arguments share one execution.
+    """
+
+    def __init__(self, maxsize=TOOL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, compute):
+        """
+        Get a cached result, awaiting compute() on a miss
+
+        Args:
+            key: Hashable cache key
+            compute (callable): Returns an awaitable of the result
+        """
+        if key in self._results:
+            self._results.move_to_end(key)
+            self.hits += 1
+            return self._results[key]
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+        self.misses += 1
+        future = asyncio.ensure_future(compute())
+        self._pending[key] = future
+        try:
+            result = await future
+        finally:
+            del self._pending[key]
+        self._results[key] = result
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+        return result
+
+    def clear(self):
+        self._results.clear()
+
+
+class AgentLoop:
+    """
+    Runs a conversation until the model answers without tool calls
+    """
+
+    def __init__(self, client, model, tools, max_steps=AGENT_MAX_STEPS, cache=None, on_tool_call=None,
+                 on_token=None):
+        """
+        Initialize agent loop
+
+        Args:
+            client: OpenAI or AsyncOpenAI client
+            model (str): Model name
+            tools (list): Tool instances the model may call
+            max_steps (int): Model turns per run
+            cache (ToolCache): Memo for idempotent tools (default: a new one)
+            on_tool_call (callable): Called with (name, arguments, output) after each tool call
+            on_token (callable): Stream completions and call this with each content delta
+        """
+        self.client = client
+        self.model = model
+        self.tools = {tool.name: tool for tool in tools}
+        self.max_steps = max_steps
+        self.cache = cache if cache is not None else ToolCache()
+        self.on_tool_call = on_tool_call
+        self.on_token = on_token
+
+    async def _complete(self, messages, **kwargs):
+        from llm_cache import assemble_stream, assemble_stream_async
+        create = self.client.chat.completions.create
+        # The SDK wraps create() in a plain decorator, so look through it for AsyncOpenAI
+        is_async = inspect.iscoroutinefunction(inspect.unwrap(create))
+        if self.tools:
+            kwargs.update(tools=[tool.schema() for tool in self.tools.values()], tool_choice="auto")
+        if self.on_token is None:
+            if is_async:
+                return await create(model=self.model, messages=messages, **kwargs)
+            return await asyncio.to_thread(create, model=self.model, messages=messages, **kwargs)
+        # Stream: tokens are shown as they arrive, tool calls are assembled from their deltas
+        if is_async:
+            stream = await create(model=self.model, messages=messages, stream=True, **kwargs)
+            return await assemble_stream_async(stream, self.on_token)
+        return await asyncio.to_thread(
+            lambda: assemble_stream(create(model=self.model, messages=messages, stream=True, **kwargs),
+                                    self.on_token))
+
+    async def _run_tool(self, tool_call):
+        name = tool_call.function.name
+        tool = self.tools.get(name)
+        arguments = tool_call.function.arguments
+        try:
+            arguments = json.loads(arguments or "{}")
+            if tool is None:
+                output = json.dumps({"error": f"unknown tool {name}"})
+            elif tool.idempotent:
+                key = (name, json.dumps(arguments, sort_keys=True))
+                output = await self.cache.get(key, lambda: tool(**arguments))
+            else:
+                output = await tool(**arguments)
+        except Exception as e:
+            # Report the failure to the model instead of aborting the conversation
+            output = json.dumps({"error": str(e)})
+        if self.on_tool_call is not None:
+            self.on_tool_call(name, arguments, output)
+        return {"tool_call_id": tool_call.id, "role": "tool", "name": name, "content": output}
+
+    async def run(self, messages, **kwargs):
+        """
+        Run the tool loop
+
+        Args:
+            messages (list): Conversation so far; assistant and tool messages are appended to it
+            **kwargs: Extra chat.completions.create arguments
+
+        Returns:
+            str: The model's final answer
+
+        Raises:
+            RuntimeError: If the model still requests tools after max_steps turns
+        """
+        for _ in range(self.max_steps):
+            response = await self._complete(messages, **kwargs)
+            message = response.choices[0].message
+            messages.append(message)
+            if not message.tool_calls:
+                return message.content
+            # All tool calls of one turn run together
+            messages.extend(await asyncio.gather(*(self._run_tool(call) for call in message.tool_calls)))
+        raise RuntimeError(f"model still calling tools after {self.max_steps} steps")
+
+    def run_sync(self, messages, **kwargs):
+        """
+        Run the tool loop from synchronous code
+        """
+        return asyncio.run(self.run(messages, **kwargs))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Pool of Kite Agents that payments are spread across
+
+One agent sends its transactions on one EVM nonce sequence and chains its
+witness requests, so a single agent is a serial lane. The pool loads several
+agents, each with its own lane, nonces and spend limits, and hands every
+payment to the least-loaded agent that still has limit headroom.
+
+Keys are read from ETH_PRIVATE_KEY, HR_AGENT_KEY, PAYROLL_AGENT_KEY,
+EMPLOYEE_AGENT_KEY and AGENT_KEYS (comma-separated, for further agents).
+"""
+
+import os
+import asyncio
+
+from chain_cache import checksum
+
+AGENT_KEY_ENV_VARS = ("ETH_PRIVATE_KEY", "HR_AGENT_KEY", "PAYROLL_AGENT_KEY", "EMPLOYEE_AGENT_KEY")
+
+
+def load_agent_keys():
+    """
+    Agent private keys configured in the environment, without duplicates
+
+    Returns:
+        list: Private keys, ETH_PRIVATE_KEY first
+    """
+    keys = [os.getenv(name) for name in AGENT_KEY_ENV_VARS]
+    keys += os.getenv("AGENT_KEYS", "").split(",")
+    unique = []
+    for key in keys:
+        key = (key or "").strip()
+        if not key:
+            continue
+        key = key if key.startswith("0x") else "0x" + key
+        if key not in unique:
+            unique.append(key)
+    return unique
+
+
+class SenderLane:
+    """
+    State shared by all payments of one agent
+
+    Each transfer's updated sender balance cipher is the current sender balance
+    of the next one, so an agent's witness requests are serialized on this lane
+    and the ciphers they return are chained locally. EVM nonces are reserved
+    under the same lock, and the send lock is taken before the lock is handed
+    on, so transactions are broadcast in nonce order while the next witness
+    request is already running.
+    """
+
+    def __init__(self, agent, address, nonces, private_key):
+        self.agent = agent
+        self.address = address
+        self.nonces = nonces
+        self.private_key = private_key
+        self.lock = asyncio.Lock()
+        self.send_lock = asyncio.Lock()
+        self.ciphers = {}
+        # Payments assigned to this lane that have not finished
+        self.load = 0
+
+    def reset(self):
+        """
+        Forget the chained ciphers after a failure broke the chain
+        """
+        self.ciphers.clear()
+
+
+class AgentPool:
+    """
+    Schedules payments across the sender lanes of several agents
+
+    A receiver's balance cipher is chained like the sender's, and transfers
+    from different agents are not mined in a guaranteed order, so while a
+    receiver has payments in flight every further payment to it stays on the
+    same lane.
+    """
+
+    def __init__(self, private_keys, limiter):
+        """
+        Initialize agent pool
+
+        Args:
+            private_keys (list): Agent private keys
+            limiter (SpendLimiter): Per-agent spend limits
+        """
+        self.private_keys = list(private_keys)
+        self.limiter = limiter
+        self.lanes = []
+        self._receivers = {}
+        # Lane that last sent to each receiver
+        self._last_lane = {}
+        self._changed = None
+
+    def start(self, rpc_url, w3, lite_contract):
+        """
+        Create an agent, nonce manager and lane per key
+
+        Args:
+            rpc_url (str): RPC endpoint the agents send through
+            w3 (Web3): Synchronous client for nonce resyncs
+            lite_contract: LITE contract on w3
+        """
+        from agent import KiteAgent
+        from nonce_manager import get_nonce_manager
+
+        self._changed = asyncio.Condition()
+        seen = set()
+        for private_key in self.private_keys:
+            agent = KiteAgent(private_key, rpc_url=rpc_url)
+            address = checksum(agent.get_address())
+            if address in seen:
+                continue
+            seen.add(address)
+            nonces = get_nonce_manager(w3, lite_contract, address)
+            self.lanes.append(SenderLane(agent, address, nonces, private_key))
+
+    def _pick(self, to_addr, amount):
+        """
+        Reserve the amount on the lane that should send to to_addr
+
+        Returns:
+            tuple: (lane, reservation, violation, wait) where wait means the
+            receiver's lane is out of headroom and its payments must finish first
+        """
+        owner = self._receivers.get(to_addr)
+        if owner is not None:
+            lane = owner[0]
+            reservation, violation = self.limiter.reserve(lane.address, amount)
+            return lane, reservation, violation, reservation is None
+        violation = None
+        for lane in sorted(self.lanes, key=lambda lane: lane.load):
+            reservation, lane_violation = self.limiter.reserve(lane.address, amount)
+            if reservation is not None:
+                return lane, reservation, None, False
+            violation = violation or lane_violation
+        return None, None, violation, False
+
+    async def acquire(self, to_addr, amount):
+        """
+        Choose the agent for a payment and hold its spend limit
+
+        Args:
+            to_addr (str): Checksummed receiver address
+            amount (float): Amount in USDT
+
+        Returns:
+            tuple: (SenderLane, SpendReservation), or (None, violation message)
+        """
+        async with self._changed:
+            while True:
+                lane, reservation, violation, wait = self._pick(to_addr, amount)
+                if reservation is not None:
+                    break
+                if not wait:
+                    return None, violation
+                await self._changed.wait()
+            owner = self._receivers.get(to_addr)
+            if owner is None:
+                if self._last_lane.get(to_addr, lane) is not lane:
+                    # Another lane paid this receiver since; our chained cipher is stale
+                    lane.ciphers.pop(to_addr, None)
+                self._last_lane[to_addr] = lane
+                owner = self._receivers[to_addr] = [lane, 0]
+            owner[1] += 1
+            lane.load += 1
+            return lane, reservation
+
+    def in_flight(self, to_addr):
+        """True while payments to the receiver are assigned to a lane"""
+        return to_addr in self._receivers
+
+    async def release(self, lane, to_addr):
+        """
+        Mark a payment acquired from the pool as finished
+        """
+        async with self._changed:
+            lane.load -= 1
+            owner = self._receivers.get(to_addr)
+            if owner is not None:
+                owner[1] -= 1
+                if owner[1] <= 0:
+                    del self._receivers[to_addr]
+            self._changed.notify_all()
@@ -0,0 +1,741 @@
+#!/usr/bin/env python3
+"""
+asyncio payment engine for privacy payments on KiteAI Testnet
+
+The whole payment path (contract reads, witness signature, submission and
+confirmation) runs on AsyncWeb3 and aiohttp, and a bounded-concurrency
+scheduler lets one process keep hundreds of payments in flight.
+pay() and pay_batch() in pay.py are thin synchronous wrappers around it.
+
+Every payment is written ahead to the payment journal (journal.py) under an
+idempotency key, so a key is never paid twice and resume() can finish a
+crashed run.
+
+Balance ciphers of accounts that are not chained on a lane yet come from the
+process-wide cipher cache (cipher_cache.py) before the chain, and confirmed
+transfers write the witness's updated ciphers back to it.
+"""
+
+import os
+import json
+import uuid
+import asyncio
+from datetime import datetime
+
+import pay as settings
+from agent_pool import AgentPool, load_agent_keys
+from chain_cache import checksum
+from cipher_cache import get_cipher_cache
+from confirmation_tracker import CONFIRMATION_TIMEOUT, ConfirmationTimeout, ConfirmationTracker
+from console import log
+from eth_utils import keccak
+from fee_oracle import FEE_MAX_REPLACEMENTS, FEE_STUCK_AFTER, FeeOracle, is_underpriced
+from metrics import registry, span
+from journal import CONFIRMED, IN_FLIGHT, PLANNED
+from transport import RPCError, async_rpc_batch, get_async_web3, close_async_transports
+from witness_client import WITNESS_URLS, get_witness_client
+
+# Payments one engine keeps in flight at once
+DEFAULT_CONCURRENCY = int(os.getenv("PAY_CONCURRENCY", 64))
+# Seconds to wait for confirmation before reporting the payment as failed
+RECEIPT_TIMEOUT = CONFIRMATION_TIMEOUT
+# Calls per JSON-RPC batch while reconciling the journal
+RECONCILE_BATCH_SIZE = 100
+
+
+def new_result(name, amount_human):
+    """Result dict reported for every requested payment"""
+    return {"name": name, "amount": amount_human, "key": None, "to": None, "agent": None,
+            "status": "skipped", "tx_hash": None, "error": None}
+
+
+def parse_entry(entry):
+    """
+    Accept (name, amount[, key]) tuples as well as {"name": ..., "amount": ..., "key": ...} dicts
+
+    Returns:
+        tuple: (name, amount, idempotency key or None)
+    """
+    if isinstance(entry, dict):
+        return entry["name"], float(entry["amount"]), entry.get("key")
+    return entry[0], float(entry[1]), entry[2] if len(entry) > 2 else None
+
+
+class PaymentEngine:
+    """
+    Async payment engine for a pool of Kite Agents
+    """
+
+    def __init__(self, private_keys, concurrency=DEFAULT_CONCURRENCY):
+        """
+        Initialize payment engine
+
+        Args:
+            private_keys (list): Agent private keys (a single key is accepted too)
+            concurrency (int): Maximum number of payments in flight
+        """
+        self.private_keys = [private_keys] if isinstance(private_keys, str) else list(private_keys)
+        self.concurrency = concurrency
+        self.w3 = None
+        self.lite_contract = None
+        self.reader = None
+        self.pool = None
+        self.semaphore = None
+        self.tracker = None
+        self.fees = None
+        self.journal = None
+        self.ciphers = None
+        self.witness = None
+        # Idempotency keys of the payments this engine is running
+        self._active = set()
+
+    async def start(self):
+        """
+        Connect the async clients and set up a lane per agent
+        """
+        if self.pool is not None:
+            return
+        from state_reader import StateReader
+
+        self.w3 = await get_async_web3(settings.RPC_URL)
+        lite_addr = checksum(settings.LITE_ADDR)
+        self.lite_contract = self.w3.eth.contract(address=lite_addr, abi=settings.LITE_ABI)
+        self.reader = StateReader(settings.RPC_URL, lite_addr)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        # One block poller confirms every payment in flight
+        self.tracker = ConfirmationTracker(settings.RPC_URL, timeout=RECEIPT_TIMEOUT)
+        # One fee state and gas estimate cache for every payment
+        self.fees = FeeOracle(settings.RPC_URL)
+        self.journal = settings.get_journal()
+        # Confirmed ciphers shared with every engine in the process
+        self.ciphers = get_cipher_cache(settings.RPC_URL, lite_addr)
+        self.ciphers.add_listener(self._on_foreign_transfers)
+        # Timeouts, retries, hedging and circuit breakers shared with every engine
+        self.witness = get_witness_client(WITNESS_URLS or [settings.LITE_API])
+
+        pool = AgentPool(self.private_keys, settings.get_limiter())
+        pool.start(settings.RPC_URL, settings.w3, settings.get_lite_contract())
+        for lane in pool.lanes:
+            log(f"✅ Using Kite Agent with address: {lane.address}")
+        self.pool = pool
+
+    async def prepare(self, receivers, lane=None):
+        """
+        Load the state the next payments need in one batched, block-pinned read
+
+        Reads the sender's nonces (if the nonce manager has no local state) and the
+        balance ciphers of the sender and every receiver not already chained on the
+        lane, taking ciphers from the cipher cache where it has them. Locally
+        chained values are never overwritten.
+
+        Args:
+            receivers (list): Checksummed receiver addresses
+            lane (SenderLane): Lane to load, or None for every lane; the receivers
+                are then read once and shared
+        """
+        if lane is None:
+            first, rest = self.pool.lanes[0], self.pool.lanes[1:]
+            await asyncio.gather(self.prepare(receivers, first), *(self.prepare((), other) for other in rest))
+            for other in rest:
+                for addr in receivers:
+                    if addr in first.ciphers:
+                        other.ciphers.setdefault(addr, first.ciphers[addr])
+            return
+        need_nonces = not lane.nonces.synced
+        missing = [addr for addr in [lane.address] + list(receivers) if addr not in lane.ciphers]
+        if missing and await self.ciphers.sync():
+            unknown = []
+            for addr in missing:
+                cipher = self.ciphers.get(addr)
+                if cipher is None:
+                    unknown.append(addr)
+                else:
+                    lane.ciphers.setdefault(addr, cipher)
+            missing = unknown
+        if not need_nonces and not missing:
+            return
+        log("📡 Fetching nonces and balances...")
+        with span("state_read"):
+            snapshot = await self.reader.snapshot_async(lane.address if need_nonces else None, missing)
+        if need_nonces:
+            lane.nonces.seed(snapshot.evm_nonce, snapshot.lite_nonce + 1)
+        self.ciphers.store_snapshot(snapshot)
+        for addr, cipher in snapshot.balances.items():
+            lane.ciphers.setdefault(addr, cipher)
+
+    def _on_foreign_transfers(self, addresses):
+        """
+        Drop chained state that a transfer by someone else made stale
+
+        Called by the cipher cache's block scan; addresses is None when the cache
+        had to be cleared. State still in use by payments in flight is kept: those
+        payments fail (revert or witness error) and the lane is reset then.
+        """
+        for lane in self.pool.lanes if self.pool is not None else ():
+            for addr in list(lane.ciphers) if addresses is None else addresses:
+                if addr == lane.address:
+                    # Someone else is paying from this agent's key
+                    if lane.load == 0:
+                        lane.ciphers.pop(addr, None)
+                        lane.nonces.invalidate()
+                elif not self.pool.in_flight(addr):
+                    lane.ciphers.pop(addr, None)
+
+    async def _witness_fallback(self, lane, to_addr, amount_parsed, lite_nonce):
+        """
+        Retry a rejected witness request once with ciphers read from the chain
+
+        Only used while no other payment is on the lane, so the chain holds
+        everything the lane chained so far. If the chain agrees with what was
+        sent, the rejection was not a cipher mismatch and nothing is retried.
+
+        Returns:
+            dict: Signature data, or None
+        """
+        accounts = [lane.address, to_addr]
+        self.ciphers.invalidate(accounts)
+        with span("state_read"):
+            snapshot = await self.reader.snapshot_async(None, accounts)
+        if all(settings.cipher_hex(snapshot.balances[addr]) == settings.cipher_hex(lane.ciphers[addr])
+               for addr in accounts):
+            return None
+        print(f"⚠️  Cached ciphers for {to_addr} were stale, retrying with chain state")
+        self.ciphers.store_snapshot(snapshot)
+        lane.ciphers.update(snapshot.balances)
+        return await self.request_witness_signature(
+            lane, to_addr, amount_parsed, lite_nonce, lane.ciphers[lane.address], lane.ciphers[to_addr])
+
+    async def request_witness_signature(self, lane, to_addr, amount_parsed, lite_nonce, sender_balance,
+                                        receiver_balance):
+        """
+        Request the witness signature for a transfer
+
+        Returns:
+            dict: Signature data, or None if the API rejected the request
+
+        Raises:
+            WitnessUnavailable: If the witness did not answer (see witness_client.py)
+        """
+        params = settings.witness_params(lane.address, to_addr, amount_parsed, lite_nonce,
+                                         sender_balance, receiver_balance)
+        with span("witness"):
+            status, body = await self.witness.sign_transfer(params)
+        if status != 200:
+            print(f"❌ API Error: {status} - {body}")
+            return None
+        return json.loads(body)
+
+    async def fee_fields(self):
+        """
+        EIP-1559 fee fields (or gasPrice), shared by all payments for FEE_HISTORY_TTL seconds
+        """
+        with span("fees"):
+            return await self.fees.fees()
+
+    async def build_transaction(self, lane, to_addr, data, nonce, fees):
+        """
+        Build a privacyTransfer transaction without an eth_call round trip
+
+        The gas limit comes from the fee oracle's per-size-class estimate.
+
+        Returns:
+            dict: Unsigned transaction
+        """
+        transaction = {
+            'chainId': settings.CHAIN_ID,
+            'nonce': nonce,
+            'from': lane.address,
+            'to': self.lite_contract.address,
+            'value': 0,
+            'data': self.lite_contract.encodeABI(fn_name='privacyTransfer',
+                                                 args=settings.transfer_args(to_addr, data)),
+        }
+        transaction['gas'] = await self.fees.gas_limit(transaction)
+        return self.fees.apply(transaction, fees)
+
+    async def confirm(self, lane, transaction, tx_hash, on_confirmed=None, key=None):
+        """
+        Wait for a sent transaction, re-sending it with bumped fees while it is stuck
+
+        Every FEE_STUCK_AFTER seconds without a receipt, the same nonce is sent again
+        with higher fees, up to FEE_MAX_REPLACEMENTS times (a replacement the node
+        rejects as underpriced is not counted). Whichever version is mined first
+        wins and the others are dropped.
+
+        Args:
+            lane (SenderLane): Lane that signed the transaction
+            transaction (dict): Unsigned transaction that was sent
+            tx_hash (str): Hash of the sent transaction
+            on_confirmed (callable): Called with the receipt of the mined version
+            key (str): Journal key the replacements are recorded under
+
+        Returns:
+            dict: Parsed receipt; its transactionHash is the version that was mined
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + RECEIPT_TIMEOUT
+        waiting = {self.tracker.track(tx_hash, on_confirmed=on_confirmed): tx_hash}
+        # Every version sent, for the cipher cache once the payment is settled
+        versions = [tx_hash]
+        receipt = None
+        replacements = 0
+        timeout = None
+        try:
+            while waiting:
+                can_bump = replacements < FEE_MAX_REPLACEMENTS and loop.time() + FEE_STUCK_AFTER < deadline
+                done, _ = await asyncio.wait(waiting, timeout=FEE_STUCK_AFTER if can_bump else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    waiting.pop(future)
+                    if future.exception() is None:
+                        receipt = future.result()
+                        return receipt
+                    timeout = future.exception()
+                if done or not can_bump:
+                    continue
+
+                transaction = await self.fees.bump(transaction)
+                try:
+                    raw_tx = settings.sign_transfer(lane.agent, transaction)
+                    raw_hash = "0x" + keccak(raw_tx).hex()
+                    if key is not None:
+                        self.journal.add_transaction(key, raw_hash, transaction["nonce"], raw_tx)
+                    self.ciphers.expect(raw_hash)
+                    versions.append(raw_hash)
+                    with span("submit"):
+                        replacement = (await self.w3.eth.send_raw_transaction(raw_tx)).hex()
+                except Exception as e:
+                    # Typically the original was mined meanwhile (nonce too low) or the bump was too small.
+                    # An underpriced replacement does not use up a bump: the next one starts from its fees
+                    if not is_underpriced(e):
+                        replacements += 1
+                    print(f"⚠️  Fee bump for {tx_hash} not accepted: {e}")
+                    continue
+                replacements += 1
+                registry.inc("fee_replacements_total")
+                log(f"⌛ Transaction {tx_hash} stuck, re-sent with higher fees as {replacement}")
+                waiting[self.tracker.track(replacement, on_confirmed=on_confirmed,
+                                           timeout=deadline - loop.time())] = replacement
+            raise timeout or ConfirmationTimeout(f"{tx_hash} not confirmed within {RECEIPT_TIMEOUT:g}s")
+        finally:
+            for other in waiting.values():
+                self.tracker.untrack(other)
+            self.ciphers.resolved(versions, receipt)
+
+    async def pay(self, name, amount_human=1.0, key=None):
+        """
+        Execute one privacy payment
+
+        Args:
+            name (str): Recipient name from the address book
+            amount_human (float): Amount in USDT
+            key (str): Idempotency key (default: a new random key); a key that an
+                earlier run already signed, sent or confirmed is not paid again
+
+        Returns:
+            dict: Payment result
+        """
+        await self.start()
+        result = new_result(name, amount_human)
+        result["key"] = key = str(key) if key else uuid.uuid4().hex
+        if key in self._active:
+            result["error"] = f"payment {key} is already running"
+            print(f"❌ {result['error']}")
+        else:
+            self._active.add(key)
+            try:
+                async with self.semaphore:
+                    # Planned only once a slot is free, so the lease is fresh while the payment runs
+                    existing = self.journal.begin(key, name, amount_human)
+                    if existing is not None:
+                        self._replay(result, existing)
+                    else:
+                        with span("total"):
+                            await self._pay(result)
+            finally:
+                self._active.discard(key)
+        registry.inc("payments_total", status=result["status"])
+        return result
+
+    def _replay(self, result, entry):
+        """Report a payment an earlier run (or another process) already made instead of paying it again"""
+        result.update(to=entry["to_addr"], agent=entry["agent"], tx_hash=entry["tx_hash"])
+        if entry["state"] == PLANNED:
+            result["error"] = f"being paid by another process ({entry['owner']})"
+            print(f"⚠️  Payment {entry['key']} to {entry['name']} is being paid by another process")
+        elif entry["state"] == CONFIRMED:
+            result["status"] = "confirmed"
+            log(f"✅ Payment {entry['key']} to {entry['name']} already confirmed: {entry['tx_hash']}")
+        else:
+            result["status"] = "sent"
+            result["error"] = "sent by an earlier run, reconcile it with: python main.py resume"
+            print(f"⚠️  Payment {entry['key']} to {entry['name']} is still in flight from an earlier run")
+
+    async def pay_many(self, entries):
+        """
+        Execute many payments concurrently, bounded by the engine's concurrency
+
+        Args:
+            entries (list): (name, amount[, key]) tuples or {"name": ..., "amount": ..., "key": ...} dicts
+
+        Returns:
+            list: Payment results in input order
+        """
+        await self.start()
+        entries = [parse_entry(entry) for entry in entries]
+        # One batched read for the balance ciphers of the whole payroll
+        directory = settings.get_directory()
+        receivers = {directory.lookup(name) for name, _, _ in entries} - {None}
+        try:
+            await self.prepare(sorted(receivers))
+        except Exception as e:
+            print(f"⚠️  Batched state read failed, payments will read state individually: {e}")
+        return await asyncio.gather(*(self.pay(name, amount, key=key) for name, amount, key in entries))
+
+    async def _pay(self, result):
+        name, amount_human, key = result["name"], result["amount"], result["key"]
+        log(f"🚀 Starting payment for: {name}")
+
+        # Checksummed when the directory was loaded
+        to_addr = settings.lookup_recipient(name)
+        if not to_addr:
+            result["error"] = f"Name {name} not found in address book"
+            print(f"❌ {result['error']}")
+            self.journal.failed(key, result["error"])
+            return
+        result["to"] = to_addr
+
+        if not settings.check_whitelist(to_addr):
+            result["error"] = "receiver not whitelisted"
+            self.journal.failed(key, result["error"])
+            return
+        with span("limits"):
+            lane, reservation = await self.pool.acquire(to_addr, amount_human)
+        if lane is None:
+            # No agent has headroom; reservation holds the exceeded limit instead
+            print(f"❌ {reservation}")
+            result["error"] = "limit exceeded"
+            self.journal.failed(key, result["error"])
+            return
+        result["agent"] = lane.address
+
+        # Convert amount to internal representation (assuming 6 decimals for USDT)
+        amount_parsed = int(amount_human * 10**6)
+        lite_nonce = None
+        nonce = None
+        signed = False
+        raw_hash = None
+        try:
+            # State not chained locally yet can be read before taking the lane
+            fees, _ = await asyncio.gather(self.fee_fields(), self.prepare([to_addr], lane))
+
+            with span("lane_wait"):
+                await lane.lock.acquire()
+            try:
+                # A failure on the lane may have dropped the chained state meanwhile
+                await self.prepare([to_addr], lane)
+
+                lite_nonce = lane.nonces.reserve_lite()
+                data = await self.request_witness_signature(
+                    lane, to_addr, amount_parsed, lite_nonce, lane.ciphers[lane.address], lane.ciphers[to_addr])
+                if data is None and lane.load == 1:
+                    data = await self._witness_fallback(lane, to_addr, amount_parsed, lite_nonce)
+                if data is None:
+                    lane.nonces.release_lite(lite_nonce)
+                    result["status"], result["error"] = "failed", "witness signature unavailable"
+                    self.journal.failed(key, result["error"])
+                    return
+                # Later transfers build on the ciphers this one produces
+                updated = {lane.address: data['updated_sender_balance'], to_addr: data['updated_receiver_balance']}
+                lane.ciphers.update(updated)
+                nonce = lane.nonces.reserve_evm()
+                await lane.send_lock.acquire()
+            finally:
+                lane.lock.release()
+
+            try:
+                transaction = await self.build_transaction(lane, to_addr, data, nonce, fees)
+                raw_tx = settings.sign_transfer(lane.agent, transaction)
+                raw_hash = "0x" + keccak(raw_tx).hex()
+                # Write-ahead: a crash from here on leaves the raw transaction for resume
+                self.journal.signed(key, lane.address, to_addr, nonce, raw_hash, raw_tx)
+                self.ciphers.expect(raw_hash)
+                signed = True
+                with span("submit"):
+                    tx_hash = await self.w3.eth.send_raw_transaction(raw_tx)
+            finally:
+                lane.send_lock.release()
+            self.journal.sent(key)
+            result["status"], result["tx_hash"] = "sent", tx_hash.hex()
+            log(f"⌛ Transaction sent to {name}! Hash: {tx_hash.hex()}")
+
+            def on_confirmed(receipt):
+                # Record the spend as soon as the tracker sees the receipt
+                settings.get_limiter().commit(reservation, int(datetime.now().timestamp()),
+                                              to_addr=to_addr, tx_hash=receipt["transactionHash"])
+                self.journal.confirmed(key, receipt["transactionHash"])
+                self.ciphers.confirmed(receipt, updated)
+                log(f"📝 Transaction record saved: {amount_human} USDT to {to_addr}")
+
+            with span("confirm"):
+                receipt = await self.confirm(lane, transaction, result["tx_hash"], on_confirmed=on_confirmed,
+                                             key=key)
+            # A fee bump may have replaced the transaction that was sent first
+            result["tx_hash"] = receipt["transactionHash"]
+            if receipt["status"] == 1:
+                result["status"] = "confirmed"
+            else:
+                # The contract rejected the ciphers: read them from the chain next time
+                lane.reset()
+                self.ciphers.invalidate([lane.address, to_addr])
+                result["status"], result["error"] = "failed", "transaction reverted (status 0)"
+                self.journal.failed(key, result["error"])
+                print(f"❌ Transaction to {name} failed (status 0)")
+        except Exception as e:
+            if result["tx_hash"] is None:
+                if raw_hash is not None:
+                    self.ciphers.resolved([raw_hash])
+                if signed and not isinstance(e, ValueError):
+                    # A timeout or dropped connection after signing may still have
+                    # reached the node, so its nonces cannot be handed out again
+                    lane.nonces.invalidate()
+                else:
+                    # Never broadcast: give the nonces back, or resync after a nonce error
+                    lane.nonces.handle_send_error(e, evm_nonce=nonce, lite_nonce=lite_nonce)
+                if nonce is not None:
+                    # The witness already advanced the chained ciphers
+                    lane.reset()
+            result["status"], result["error"] = "failed", str(e)
+            # web3 raises ValueError when the node answered with an error, so the
+            # transaction was rejected; after anything else it may still be mined
+            # and stays in flight for resume to settle
+            if not signed or (result["tx_hash"] is None and isinstance(e, ValueError)):
+                self.journal.failed(key, result["error"])
+            print(f"❌ Payment to {name} failed: {e}")
+        finally:
+            settings.get_limiter().release(reservation)
+            await self.pool.release(lane, to_addr)
+
+    async def _rpc_batch(self, calls):
+        results = []
+        for i in range(0, len(calls), RECONCILE_BATCH_SIZE):
+            results += await async_rpc_batch(settings.RPC_URL, calls[i:i + RECONCILE_BATCH_SIZE])
+        return results
+
+    def _settle(self, entry, receipt):
+        """Record a mined journal entry; the ledger is checked first in case the record was written before a crash"""
+        if receipt["status"] != 1:
+            self.journal.failed(entry["key"], "transaction reverted (status 0)")
+            return "failed"
+        ledger = settings.get_ledger()
+        if not ledger.has_transaction(receipt["transactionHash"]):
+            ledger.append(entry["agent"], entry["amount"], int(datetime.now().timestamp()),
+                          to_addr=entry["to_addr"], tx_hash=receipt["transactionHash"])
+        self.journal.confirmed(entry["key"], receipt["transactionHash"])
+        return "confirmed"
+
+    async def reconcile(self):
+        """
+        Settle the journal's signed and sent entries against the chain
+
+        One batched nonce read covers the agents of every in-flight entry, and one
+        batched receipt lookup, made after it, covers their transactions. Mined
+        entries are recorded and entries whose receipts could not be read stay
+        pending. Entries whose nonce another transaction used are planned again
+        once a second receipt lookup still finds none of theirs; the rest are
+        re-broadcast from their stored raw transactions and awaited together.
+
+        Returns:
+            dict: Number of entries per outcome (confirmed, failed, replanned, pending)
+        """
+        from confirmation_tracker import parse_receipt
+        from nonce_manager import is_nonce_error
+
+        await self.start()
+        outcomes = {}
+
+        def count(outcome):
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        entries = self.journal.entries(IN_FLIGHT)
+        if not entries:
+            return outcomes
+        log(f"📡 Reconciling {len(entries)} in-flight payments...")
+        transactions = self.journal.transactions(entry["key"] for entry in entries)
+        hashes = [tx["tx_hash"] for entry in entries for tx in transactions[entry["key"]]]
+        agents = sorted({entry["agent"] for entry in entries})
+        # Nonces before receipts: a transaction mined between the two reads then shows up
+        # as a receipt, instead of as a used nonce without one (which would replan a paid entry)
+        mined_nonces = dict(zip(agents, await self._rpc_batch(
+            [("eth_getTransactionCount", [agent, "latest"]) for agent in agents])))
+        receipts = dict(zip(hashes, await self._rpc_batch(
+            [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in hashes])))
+
+        def settle_or_wait(entry):
+            # Settles a mined entry; returns False if the entry's receipts say nothing yet
+            found = [receipts[tx["tx_hash"]] for tx in transactions[entry["key"]]]
+            mined = [parse_receipt(r) for r in found
+                     if r is not None and not isinstance(r, RPCError) and r.get("blockNumber") is not None]
+            if mined:
+                count(self._settle(entry, mined[0]))
+            elif any(isinstance(r, RPCError) for r in found):
+                # A failed lookup is not proof that the transaction was not mined
+                count("pending")
+            else:
+                return False
+            return True
+
+        rebroadcast = []
+        nonce_used = []
+        for entry in entries:
+            if settle_or_wait(entry):
+                continue
+            mined_nonce = mined_nonces[entry["agent"]]
+            if isinstance(mined_nonce, RPCError):
+                count("pending")
+            elif entry["nonce"] < int(mined_nonce, 16):
+                nonce_used.append(entry)
+            else:
+                rebroadcast.append(entry)
+
+        if nonce_used:
+            # Look once more before giving up on the entries: a receipt the node had not indexed
+            # at the first read would otherwise send the payment a second time
+            again = [tx["tx_hash"] for entry in nonce_used for tx in transactions[entry["key"]]]
+            receipts.update(zip(again, await self._rpc_batch(
+                [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in again])))
+            for entry in nonce_used:
+                if not settle_or_wait(entry):
+                    # Another transaction took the nonce, so none of ours can execute any more
+                    self.journal.replan(entry["key"], "nonce used by another transaction")
+                    count("replanned")
+
+        # Newest version of each transaction, in nonce order per agent
+        waits = []
+        for entry in sorted(rebroadcast, key=lambda entry: (entry["agent"], entry["nonce"])):
+            entry_txs = transactions[entry["key"]]
+            for tx in entry_txs:
+                self.ciphers.expect(tx["tx_hash"])
+            try:
+                await self.w3.eth.send_raw_transaction(entry_txs[-1]["raw_tx"])
+            except Exception as e:
+                if "known" not in str(e).lower() and not is_nonce_error(e):
+                    self.ciphers.resolved(tx["tx_hash"] for tx in entry_txs)
+                    self.journal.failed(entry["key"], f"rebroadcast rejected: {e}")
+                    count("failed")
+                    continue
+            self.journal.sent(entry["key"])
+            waits.append(self._await_any(entry, [tx["tx_hash"] for tx in entry_txs]))
+        for outcome in await asyncio.gather(*waits):
+            count(outcome)
+        # Nonces and ciphers held locally predate what was just settled
+        for lane in self.pool.lanes:
+            if lane.address in mined_nonces:
+                lane.nonces.invalidate()
+                lane.reset()
+        self.ciphers.invalidate({entry["agent"] for entry in entries} | {entry["to_addr"] for entry in entries})
+        return outcomes
+
+    async def _await_any(self, entry, hashes):
+        """Wait until any version of a re-broadcast entry is mined"""
+        waiting = {self.tracker.track(tx_hash): tx_hash for tx_hash in hashes}
+        receipt = None
+        try:
+            while waiting:
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    waiting.pop(future)
+                    if future.exception() is None:
+                        receipt = future.result()
+                        return self._settle(entry, receipt)
+            print(f"⚠️  Payment {entry['key']} is still not confirmed, run resume again later")
+            return "pending"
+        finally:
+            for other in waiting.values():
+                self.tracker.untrack(other)
+            self.ciphers.resolved(hashes, receipt)
+
+
+async def pay_async(name, amount_human=1.0, private_key=None, key=None):
+    """
+    Execute one privacy payment on the async engine
+
+    Args:
+        private_key (str): Agent key to pay from (default: the agent pool from the environment)
+        key (str): Idempotency key
+
+    Returns:
+        dict: Payment result, or None if no private key is configured
+    """
+    private_keys = [private_key] if private_key else load_agent_keys()
+    if not private_keys:
+        print("❌ ETH_PRIVATE_KEY not found")
+        return None
+    return await PaymentEngine(private_keys).pay(name, amount_human, key=key)
+
+
+async def pay_batch_async(entries, concurrency=DEFAULT_CONCURRENCY, private_key=None):
+    """
+    Execute a payroll batch on the async engine
+
+    Args:
+        entries (list): (name, amount[, key]) tuples or {"name": ..., "amount": ..., "key": ...} dicts
+        concurrency (int): Maximum number of payments in flight
+        private_key (str): Agent key to pay from (default: the agent pool from the environment)
+
+    Returns:
+        list: Payment results in input order
+    """
+    log(f"🚀 Starting batch payment for {len(entries)} recipients")
+    private_keys = [private_key] if private_key else load_agent_keys()
+    if not private_keys:
+        print("❌ ETH_PRIVATE_KEY not found")
+        return []
+    results = await PaymentEngine(private_keys, concurrency=concurrency).pay_many(entries)
+    confirmed = sum(1 for r in results if r["status"] == "confirmed")
+    print(f"✅ Batch finished: {confirmed}/{len(results)} payments confirmed")
+    return results
+
+
+async def resume_async(concurrency=DEFAULT_CONCURRENCY, private_key=None):
+    """
+    Finish the payments of a crashed run from the journal
+
+    In-flight entries are reconciled against the chain first; planned entries,
+    including those whose transactions were dropped, are then paid.
+
+    Args:
+        concurrency (int): Maximum number of payments in flight
+        private_key (str): Agent key to pay from (default: the agent pool from the environment)
+
+    Returns:
+        list: Results of the payments made, in journal order
+    """
+    private_keys = [private_key] if private_key else load_agent_keys()
+    if not private_keys:
+        print("❌ ETH_PRIVATE_KEY not found")
+        return []
+    engine = PaymentEngine(private_keys, concurrency=concurrency)
+    outcomes = await engine.reconcile()
+    print(f"✅ Reconciled in-flight payments: {outcomes or 'none'}")
+    planned = engine.journal.entries((PLANNED,))
+    if not planned:
+        return []
+    print(f"🚀 Resuming {len(planned)} planned payments")
+    results = await engine.pay_many(
+        [{"name": entry["name"], "amount": entry["amount"], "key": entry["key"]} for entry in planned])
+    confirmed = sum(1 for r in results if r["status"] == "confirmed")
+    print(f"✅ Resume finished: {confirmed}/{len(results)} payments confirmed")
+    return results
+
+
+def run(coro):
+    """
+    Run a coroutine on a fresh event loop and close the async transports afterwards
+    """
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_async_transports()
+    return asyncio.run(runner())
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Local EVM node with a mock LITE contract for offline benchmarks
+
+Starts anvil when it is on PATH, otherwise an in-process eth-tester chain
+(pip install "eth-tester[py-evm]") served over HTTP JSON-RPC, deploys the mock
+LITE contract and funds the benchmark agents.
+
+The mock contract implements just enough of LITE for the payment path:
+
+    privacyNonces(address a)  returns storage[a]
+    privacyTransfer(...)      storage[msg.sender] += 1 (arguments are not checked)
+    anything else             returns empty bytes (privacyBalances, tick, ...)
+"""
+
+import json
+import time
+import socket
+import shutil
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Creation code of the mock LITE contract. Runtime, by offset:
+#   00  selector = calldata[0:4]
+#   06  selector == privacyNonces   (0x75582410) -> 23
+#   10  selector == privacyTransfer (0x4d0ae98f) -> 30
+#   19  mstore(0, 0x20); return(0, 0x40)          abi-encoded empty bytes
+#   23  mstore(0, sload(calldata[4:36])); return(0, 0x20)
+#   30  sstore(caller, sload(caller) + 1); stop
+MOCK_LITE_INIT_CODE = (
+    "0x603980600b6000396000f3"
+    "60003560e01c8063755824101460235763"
+    "4d0ae98f14603057602060005260406000f3"
+    "5b6004355460005260206000f3"
+    "5b3354600101335500"
+)
+
+# Deterministic benchmark agent keys; nothing else uses them
+AGENT_KEYS = ["0x" + format(i, "064x") for i in range(0xbe0001, 0xbe0001 + 64)]
+AGENT_FUNDING = 10**20
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _to_json(value):
+    """Web3-formatted values back to their JSON-RPC wire form"""
+    if isinstance(value, (bool, float, str)) or value is None:
+        return value
+    if isinstance(value, int):
+        return hex(value)
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    if hasattr(value, "items"):
+        return {key: _to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(item) for item in value]
+    return str(value)
+
+
+class EthTesterRPCServer:
+    """
+    Serves an in-process eth-tester chain over HTTP JSON-RPC, batches included
+    """
+
+    def __init__(self, w3, host="127.0.0.1", port=0):
+        self.w3 = w3
+        # eth-tester is not thread-safe
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def call(self, request):
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        try:
+            with self._lock:
+                result = self.w3.manager.request_blocking(request["method"], request.get("params", []))
+            response["result"] = _to_json(result)
+        except Exception as e:
+            response["error"] = {"code": -32000, "message": str(e)}
+        return response
+
+    def _handler(self):
+        rpc = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if isinstance(payload, list):
+                    reply = [rpc.call(request) for request in payload]
+                else:
+                    reply = rpc.call(payload)
+                body = json.dumps(reply).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class LocalChain:
+    """
+    Local node with the mock LITE contract deployed and the benchmark agents funded
+    """
+
+    def __init__(self, backend="auto", agents=1, block_time=None):
+        """
+        Initialize local chain
+
+        Args:
+            backend (str): "anvil", "eth-tester" or "auto" (anvil if installed)
+            agents (int): Number of agent keys to fund
+            block_time (float): Seconds per block for anvil (default: mine on every transaction)
+        """
+        if backend == "auto":
+            backend = "anvil" if shutil.which("anvil") else "eth-tester"
+        if agents > len(AGENT_KEYS):
+            raise ValueError(f"at most {len(AGENT_KEYS)} benchmark agents are supported")
+        self.backend = backend
+        self.agent_keys = AGENT_KEYS[:agents]
+        self.block_time = block_time
+        self.rpc_url = None
+        self.chain_id = None
+        self.lite_addr = None
+        self.w3 = None
+        self._process = None
+        self._rpc_server = None
+
+    def start(self):
+        """
+        Start the node, deploy the mock contract and fund the agents
+
+        Returns:
+            LocalChain: self
+        """
+        from web3 import Web3
+        if self.backend == "anvil":
+            port = free_port()
+            command = ["anvil", "--port", str(port), "--silent"]
+            if self.block_time:
+                command += ["--block-time", str(self.block_time)]
+            self._process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.rpc_url = f"http://127.0.0.1:{port}"
+            self.w3 = Web3(Web3.HTTPProvider(self.rpc_url))
+            deadline = time.monotonic() + 30
+            while not self._connected():
+                if time.monotonic() > deadline or self._process.poll() is not None:
+                    raise RuntimeError("anvil did not start")
+                time.sleep(0.1)
+        elif self.backend == "eth-tester":
+            try:
+                from eth_tester import EthereumTester, PyEVMBackend
+            except ImportError:
+                raise RuntimeError('eth-tester is not installed: pip install "eth-tester[py-evm]" '
+                                   '(or install anvil from Foundry)')
+            from web3 import EthereumTesterProvider
+            self.w3 = Web3(EthereumTesterProvider(EthereumTester(PyEVMBackend())))
+            self._rpc_server = EthTesterRPCServer(self.w3).start()
+            self.rpc_url = self._rpc_server.url
+        else:
+            raise ValueError(f"unknown backend: {self.backend}")
+
+        self.chain_id = self.w3.eth.chain_id
+        self._deploy_and_fund()
+        return self
+
+    def _connected(self):
+        try:
+            return self.w3.is_connected()
+        except Exception:
+            return False
+
+    def _deploy_and_fund(self):
+        from eth_account import Account
+        funder = self.w3.eth.accounts[0]
+        tx_hash = self.w3.eth.send_transaction({"from": funder, "data": MOCK_LITE_INIT_CODE})
+        self.lite_addr = self.w3.eth.wait_for_transaction_receipt(tx_hash).contractAddress
+        hashes = [self.w3.eth.send_transaction({"from": funder, "to": Account.from_key(key).address,
+                                                "value": AGENT_FUNDING})
+                  for key in self.agent_keys]
+        for tx_hash in hashes:
+            self.w3.eth.wait_for_transaction_receipt(tx_hash)
+
+    def env(self):
+        """
+        Environment variables that point pay.py at this chain
+
+        Returns:
+            dict: KITE_* settings
+        """
+        return {
+            "KITE_RPC_URL": self.rpc_url,
+            "KITE_CHAIN_ID": str(self.chain_id),
+            "KITE_LITE_ADDR": self.lite_addr,
+            # The mock answers decimals()/balanceOf() like any unknown call
+            "KITE_USDT_ADDR": self.lite_addr,
+        }
+
+    def stop(self):
+        if self._rpc_server is not None:
+            self._rpc_server.stop()
+        if self._process is not None:
+            self._process.terminate()
+            self._process.wait(timeout=10)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an OpenAI-compatible chat completions API
+
+Answers POST /v1/chat/completions (and /api/v1/chat/completions, the
+OpenRouter path) deterministically: while the conversation has no tool
+results it calls the first offered tool once for every known employee named
+in the last user message, then it answers with the tool outputs. Streaming
+(stream=true) is served as server-sent events, one word per chunk, with tool
+call arguments split over several chunks like real providers do. Latency
+before the first token and between tokens is configurable, so the cache and
+the streaming mode of hr.py can be measured without OpenRouter.
+
+Usage:
+    python bench/mock_openai.py --port 8601 --latency 0.5 --token-latency 0.02
+    OPENROUTER_BASE_URL=http://127.0.0.1:8601/v1 OPENROUTER_API_KEY=mock python hr.py --stream "How much do Alice and Bob earn?"
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMPLOYEES = ("Alice", "Bob", "Charlie")
+COMPLETION_PATHS = ("/v1/chat/completions", "/api/v1/chat/completions", "/chat/completions")
+
+
+def _plan(request):
+    """The assistant message the mock model answers with"""
+    messages = request.get("messages", [])
+    tools = request.get("tools") or []
+    results = [m for m in messages if m.get("role") == "tool"]
+    question = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    names = [name for name in EMPLOYEES if re.search(rf"\b{name}\b", question, re.IGNORECASE)]
+    if tools and names and not results:
+        tool = tools[0]["function"]["name"]
+        return {"role": "assistant", "content": None, "tool_calls": [
+            {"id": f"call_{index}", "type": "function",
+             "function": {"name": tool, "arguments": json.dumps({"employee_name": name})}}
+            for index, name in enumerate(names)]}
+    if results:
+        answer = "Here is what I found: " + "; ".join(m["content"] for m in results)
+    else:
+        answer = "I can look up salaries for " + ", ".join(EMPLOYEES) + "."
+    return {"role": "assistant", "content": answer}
+
+
+def _chunks(message):
+    """Split a message into streaming deltas"""
+    if message.get("tool_calls"):
+        for index, call in enumerate(message["tool_calls"]):
+            yield {"role": "assistant", "tool_calls": [
+                {"index": index, "id": call["id"], "type": "function",
+                 "function": {"name": call["function"]["name"], "arguments": ""}}]}
+            arguments = call["function"]["arguments"]
+            for start in range(0, len(arguments), 8):
+                yield {"tool_calls": [{"index": index, "function": {"arguments": arguments[start:start + 8]}}]}
+        return
+    for word in re.findall(r"\S+\s*", message["content"]):
+        yield {"content": word}
+
+
+class MockOpenAIServer:
+    """
+    Threaded HTTP chat completions stand-in with latency injection
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, token_latency=0.0):
+        """
+        Initialize mock server
+
+        Args:
+            host (str): Listen address
+            port (int): Listen port (0 picks a free port)
+            latency (float): Seconds before the first token (or the whole response)
+            token_latency (float): Seconds between streamed chunks, also charged per chunk
+                to non-streaming responses
+        """
+        self.latency = latency
+        self.token_latency = token_latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL for OpenAI(base_url=...)"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if self.path.split("?")[0] not in COMPLETION_PATHS:
+                    self._reply(404, {"error": {"message": "not found"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests += 1
+                    number = server.requests
+                message = _plan(request)
+                base = {"id": f"chatcmpl-mock-{number}", "created": int(time.time()),
+                        "model": request.get("model", "mock")}
+                finish_reason = "tool_calls" if message.get("tool_calls") else "stop"
+                if server.latency:
+                    time.sleep(server.latency)
+                if not request.get("stream"):
+                    if server.token_latency:
+                        time.sleep(server.token_latency * sum(1 for _ in _chunks(message)))
+                    self._reply(200, dict(base, object="chat.completion", choices=[
+                        {"index": 0, "message": message, "finish_reason": finish_reason}],
+                        usage={"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for delta in _chunks(message):
+                    self._event(dict(base, object="chat.completion.chunk",
+                                     choices=[{"index": 0, "delta": delta, "finish_reason": None}]))
+                    if server.token_latency:
+                        time.sleep(server.token_latency)
+                self._event(dict(base, object="chat.completion.chunk",
+                                 choices=[{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _event(self, payload):
+                self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """
+        Serve on a daemon thread
+
+        Returns:
+            MockOpenAIServer: self
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the local OpenAI-compatible API stand-in')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Listen address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8601, help='Listen port (default: 8601)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before the first token (default: 0)')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='Seconds between tokens (default: 0)')
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.token_latency)
+    print(f"✅ OpenAI stand-in listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
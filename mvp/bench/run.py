@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Offline payment throughput benchmark
+
+Runs the async payment engine against a local chain with the mock LITE
+contract and a local witness stand-in, and reports payments per second and
+p50/p99 latency for three scenarios:
+
+    single   payments one after another on one agent
+    batch    one payroll batch on one agent
+    agents   one payroll batch spread over an agent pool
+
+Usage:
+    python bench/run.py [OPTIONS]
+
+Example:
+    python bench/run.py --payments 200 --agents 4 --witness-latency 0.05
+    python bench/run.py --scenarios batch --json bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from local_chain import LocalChain
+from witness_server import WitnessServer
+
+SCENARIOS = ("single", "batch", "agents")
+# Small enough that no run hits the daily limit
+AMOUNT = 0.01
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(name, results, latencies, elapsed):
+    confirmed = sum(1 for r in results if r["status"] == "confirmed")
+    return {
+        "scenario": name,
+        "payments": len(results),
+        "confirmed": confirmed,
+        "elapsed": elapsed,
+        "pps": confirmed / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+    }
+
+
+def add_receivers(count):
+    """
+    Register synthetic whitelisted receivers, like the employees of a payroll
+
+    Returns:
+        list: Their address book names
+    """
+    from pay import get_directory
+    directory = get_directory()
+    names = []
+    for i in range(count):
+        name = f"bench-{i:04d}"
+        directory.add(name, "0x" + format(0xbe00000 + i, "040x"), whitelisted=True)
+        names.append(name)
+    return names
+
+
+async def timed_batch(engine, names, count, started):
+    """Pay count entries round-robin over names like pay_many(), timing each payment from the batch start"""
+    from pay import lookup_recipient
+
+    async def one(name):
+        result = await engine.pay(name, AMOUNT)
+        return result, time.perf_counter() - started
+
+    await engine.start()
+    await engine.prepare(sorted({lookup_recipient(name) for name in names}))
+    return await asyncio.gather(*(one(names[i % len(names)]) for i in range(count)))
+
+
+async def run_single(keys, names, count, concurrency):
+    from async_pay import PaymentEngine
+    engine = PaymentEngine(keys[0], concurrency=concurrency)
+    await engine.start()
+    results, latencies = [], []
+    started = time.perf_counter()
+    for i in range(count):
+        t = time.perf_counter()
+        results.append(await engine.pay(names[i % len(names)], AMOUNT))
+        latencies.append(time.perf_counter() - t)
+    return summarize("single", results, latencies, time.perf_counter() - started)
+
+
+async def run_batch(keys, names, count, concurrency):
+    from async_pay import PaymentEngine
+    engine = PaymentEngine(keys[0], concurrency=concurrency)
+    started = time.perf_counter()
+    timed = await timed_batch(engine, names, count, started)
+    return summarize("batch", [r for r, _ in timed], [t for _, t in timed], time.perf_counter() - started)
+
+
+async def run_agents(keys, names, count, concurrency):
+    from async_pay import PaymentEngine
+    engine = PaymentEngine(keys, concurrency=concurrency)
+    started = time.perf_counter()
+    timed = await timed_batch(engine, names, count, started)
+    summary = summarize("agents", [r for r, _ in timed], [t for _, t in timed], time.perf_counter() - started)
+    summary["agents"] = len(keys)
+    return summary
+
+
+def stage_breakdown():
+    """p50/p99 (bucket upper bounds) per payment stage from the metrics registry"""
+    from metrics import registry
+    return {entry["labels"]["stage"]: {"count": entry["count"], "p50": entry["p50"], "p99": entry["p99"]}
+            for entry in registry.snapshot() if entry["name"] == "payment_stage_seconds"}
+
+
+def print_report(summaries, setup):
+    print(f"\n--- Payment benchmark ({setup['backend']}, witness latency {setup['witness_latency']}s) ---")
+    print(f"{'scenario':<10}{'payments':>10}{'confirmed':>11}{'seconds':>10}{'pps':>10}{'p50 (s)':>10}{'p99 (s)':>10}")
+    for s in summaries:
+        name = s["scenario"] + (f" x{s['agents']}" if "agents" in s else "")
+        print(f"{name:<10}{s['payments']:>10}{s['confirmed']:>11}{s['elapsed']:>10.2f}{s['pps']:>10.1f}"
+              f"{(s['p50'] or 0):>10.3f}{(s['p99'] or 0):>10.3f}")
+    for s in summaries:
+        print(f"\n{s['scenario']} stages (histogram bucket bounds):")
+        for stage, values in sorted(s["stages"].items()):
+            print(f"  {stage:<12} n={values['count']:<6} p50<={values['p50']}s  p99<={values['p99']}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the payment engine against a local chain')
+    parser.add_argument('--backend', type=str, default='auto', choices=['auto', 'anvil', 'eth-tester'],
+                        help='Local node (default: anvil if installed, else eth-tester)')
+    parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS),
+                        help='Comma-separated scenarios to run (default: single,batch,agents)')
+    parser.add_argument('--payments', '-n', type=int, default=100,
+                        help='Payments per batch scenario (default: 100)')
+    parser.add_argument('--single-payments', type=int, default=10,
+                        help='Payments in the sequential scenario (default: 10)')
+    parser.add_argument('--agents', type=int, default=4,
+                        help='Agents in the agent-pool scenario (default: 4)')
+    parser.add_argument('--receivers', type=int, default=16,
+                        help='Distinct receivers the payments go to (default: 16)')
+    parser.add_argument('--concurrency', '-c', type=int, default=64,
+                        help='Payments in flight per engine (default: 64)')
+    parser.add_argument('--witness-latency', type=float, default=0.0,
+                        help='Artificial witness API latency in seconds (default: 0)')
+    parser.add_argument('--witness-jitter', type=float, default=0.0,
+                        help='Extra random witness latency in seconds (default: 0)')
+    parser.add_argument('--witness-error-rate', type=float, default=0.0,
+                        help='Fraction of witness requests failing with 500 (default: 0)')
+    parser.add_argument('--block-time', type=float,
+                        help='anvil block time in seconds (default: mine on every transaction)')
+    parser.add_argument('--json', type=str,
+                        help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        print(f"❌ Unknown scenarios: {unknown} (choose from {list(SCENARIOS)})")
+        sys.exit(1)
+
+    chain = LocalChain(args.backend, agents=max(1, args.agents), block_time=args.block_time).start()
+    witness = WitnessServer(latency=args.witness_latency, jitter=args.witness_jitter,
+                            error_rate=args.witness_error_rate).start()
+    print(f"✅ {chain.backend} node at {chain.rpc_url}, mock LITE at {chain.lite_addr}")
+    print(f"✅ Witness stand-in at {witness.url}")
+
+    # pay.py reads its settings at import time
+    os.environ.update(chain.env())
+    os.environ["KITE_LITE_API"] = witness.url
+    os.environ.setdefault("PAY_QUIET", "1")
+    json_path = os.path.abspath(args.json) if args.json else None
+    # Keep the ledger of this run out of the working directory
+    workdir = tempfile.mkdtemp(prefix="kite-bench-")
+    os.chdir(workdir)
+
+    from async_pay import run
+    from metrics import registry
+
+    names = add_receivers(max(1, args.receivers))
+    runners = {"single": lambda: run_single(chain.agent_keys, names, args.single_payments, args.concurrency),
+               "batch": lambda: run_batch(chain.agent_keys, names, args.payments, args.concurrency),
+               "agents": lambda: run_agents(chain.agent_keys, names, args.payments, args.concurrency)}
+    summaries = []
+    try:
+        for scenario in scenarios:
+            registry.reset()
+            summary = run(runners[scenario]())
+            summary["stages"] = stage_breakdown()
+            summaries.append(summary)
+    finally:
+        witness.stop()
+        chain.stop()
+
+    setup = {"backend": chain.backend, "receivers": len(names), "witness_latency": args.witness_latency,
+             "witness_jitter": args.witness_jitter, "witness_error_rate": args.witness_error_rate,
+             "concurrency": args.concurrency}
+    print_report(summaries, setup)
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({"setup": setup, "results": summaries}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
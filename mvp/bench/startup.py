@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+CLI startup benchmark
+
+Runs main.py command lines that exit before any payment (--help, an unknown
+recipient, a missing private key) under "python -X importtime" and reports
+the wall time, the cumulative import time and which heavy modules (web3,
+eth_account, requests, aiohttp, ...) each command loaded. Nothing touches the
+network. --dir points at another checkout's mvp directory, so two revisions
+can be compared; --json records the results.
+
+Usage:
+    python bench/startup.py [OPTIONS]
+
+Example:
+    python bench/startup.py --runs 5 --json startup.json
+    python bench/startup.py --dir /tmp/old-checkout/mvp --json startup-old.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Command lines that should exit before connecting anywhere
+COMMANDS = {
+    "help": ["--help"],
+    "unknown-recipient": ["--recipient", "nobody-in-the-address-book"],
+    "no-private-key": ["--recipient", "target"],
+}
+HEAVY_MODULES = ("web3", "eth_account", "eth_utils", "requests", "aiohttp", "openai")
+
+
+def parse_importtime(stderr):
+    """
+    Parse "python -X importtime" output
+
+    Returns:
+        list: (module, cumulative microseconds, top_level) tuples
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented by two spaces per level
+        modules.append((name.strip(), int(cumulative), not name[1:].startswith(" ")))
+    return modules
+
+
+def measure(mvp_dir, argv, env):
+    """
+    Run main.py once
+
+    Returns:
+        dict: Wall time and total import time in seconds, the heavy modules loaded and the slowest imports
+    """
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "main.py"] + argv, cwd=mvp_dir, env=env,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - started
+    modules = parse_importtime(proc.stderr)
+    loaded = {name for name, _, _ in modules}
+    top = [(name, us) for name, us, top_level in modules if top_level]
+    return {
+        "wall": wall,
+        "imports": sum(us for _, us in top) / 1e6,
+        "heavy": [name for name in HEAVY_MODULES if name in loaded],
+        "slowest": sorted(top, key=lambda item: -item[1])[:5],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure main.py startup time with -X importtime')
+    parser.add_argument('--dir', type=str, default=os.path.dirname(BENCH_DIR),
+                        help='mvp directory to benchmark (default: this checkout)')
+    parser.add_argument('--runs', '-n', type=int, default=5,
+                        help='Runs per command; the median is reported (default: 5)')
+    parser.add_argument('--json', type=str,
+                        help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    for name in ("ETH_PRIVATE_KEY", "HR_AGENT_KEY", "PAYROLL_AGENT_KEY", "EMPLOYEE_AGENT_KEY", "AGENT_KEYS"):
+        env.pop(name, None)
+
+    results = {}
+    print(f"🚀 Startup of {os.path.join(args.dir, 'main.py')} ({args.runs} runs each)")
+    for name, argv in COMMANDS.items():
+        runs = [measure(args.dir, argv, env) for _ in range(max(1, args.runs))]
+        summary = {
+            "argv": argv,
+            "wall_median": statistics.median(r["wall"] for r in runs),
+            "imports_median": statistics.median(r["imports"] for r in runs),
+            "heavy_modules": runs[-1]["heavy"],
+            "slowest_imports": [{"module": m, "us": us} for m, us in runs[-1]["slowest"]],
+        }
+        results[name] = summary
+        print(f"📊 {name:<18} wall {summary['wall_median'] * 1000:7.1f} ms   "
+              f"imports {summary['imports_median'] * 1000:7.1f} ms   "
+              f"heavy: {', '.join(summary['heavy_modules']) or '-'}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"dir": os.path.abspath(args.dir), "python": sys.version.split()[0],
+                       "runs": args.runs, "results": results}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
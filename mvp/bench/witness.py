@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Witness client resilience benchmark
+
+Sends signature requests through witness_client.WitnessClient to local witness
+stand-ins and reports, per scenario, how many requests succeeded and the
+p50/p99/max latency the caller saw:
+
+    tail      3% of requests are 40x slower; without and with hedging
+    errors    20% of requests fail with HTTP 500; without and with retries
+    outage    the witness is down for a while; the breaker fails fast, then
+              a probe closes it again once the witness is back
+    failover  one of two endpoints is down; requests move to the other
+
+Nothing touches a chain.
+
+Usage:
+    python bench/witness.py [OPTIONS]
+
+Example:
+    python bench/witness.py --requests 400 --concurrency 16 --json witness.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from witness_server import WitnessServer
+from witness_client import WitnessClient, WitnessUnavailable
+from transport import close_async_transports
+
+SCENARIOS = ("tail", "errors", "outage", "failover")
+PARAMS = {"from_address": "0x0", "to_address": "0x0", "amount": 1, "nonce": 1}
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+async def drive(client, requests, concurrency):
+    """
+    Send requests through the client, concurrency at a time
+
+    Returns:
+        dict: Successes, failures and the latency percentiles of every call
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    outcomes = {"ok": 0, "unavailable": 0, "rejected": 0}
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status, _ = await client.sign_transfer(PARAMS)
+                outcomes["ok" if status == 200 else "rejected"] += 1
+            except WitnessUnavailable:
+                outcomes["unavailable"] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return dict(outcomes, elapsed=time.perf_counter() - started, p50=percentile(latencies, 0.50),
+                p99=percentile(latencies, 0.99), max=max(latencies) if latencies else None,
+                client=client.stats())
+
+
+async def scenario_tail(args):
+    witness = WitnessServer(latency=0.02, slow_rate=0.03, slow_latency=0.8).start()
+    try:
+        plain = await drive(WitnessClient([witness.url], hedge_percentile=0), args.requests, args.concurrency)
+        hedged = await drive(WitnessClient([witness.url], hedge_percentile=95), args.requests, args.concurrency)
+    finally:
+        witness.stop()
+    return {"no hedging": plain, "hedging at p95": hedged}
+
+
+async def scenario_errors(args):
+    witness = WitnessServer(latency=0.01, error_rate=0.2).start()
+    try:
+        plain = await drive(WitnessClient([witness.url], retries=0, breaker_failures=10 ** 6),
+                            args.requests, args.concurrency)
+        retried = await drive(WitnessClient([witness.url], retries=3, backoff=0.05, breaker_failures=10 ** 6),
+                              args.requests, args.concurrency)
+    finally:
+        witness.stop()
+    return {"no retries": plain, "3 jittered retries": retried}
+
+
+async def scenario_outage(args):
+    witness = WitnessServer(latency=0.01).start()
+    client = WitnessClient([witness.url], retries=2, backoff=0.05, breaker_failures=5, breaker_reset=1.0)
+    try:
+        healthy = await drive(client, args.requests // 4, args.concurrency)
+        witness.down = True
+        down = await drive(client, args.requests // 4, args.concurrency)
+        witness.down = False
+        await asyncio.sleep(1.0)
+        recovered = await drive(client, args.requests // 4, args.concurrency)
+    finally:
+        witness.stop()
+    return {"healthy": healthy, "down": down, "recovered": recovered}
+
+
+async def scenario_failover(args):
+    broken = WitnessServer(latency=0.01).start()
+    healthy = WitnessServer(latency=0.01).start()
+    broken.down = True
+    try:
+        result = await drive(WitnessClient([broken.url, healthy.url], retries=2, backoff=0.05),
+                             args.requests, args.concurrency)
+    finally:
+        broken.stop()
+        healthy.stop()
+    return {"first endpoint down": result}
+
+
+async def run_scenarios(args):
+    runners = {"tail": scenario_tail, "errors": scenario_errors, "outage": scenario_outage,
+               "failover": scenario_failover}
+    results = {}
+    try:
+        for name in args.scenarios:
+            results[name] = await runners[name](args)
+    finally:
+        await close_async_transports()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the witness client against faulty witness stand-ins')
+    parser.add_argument('--requests', '-n', type=int, default=400,
+                        help='Signature requests per run (default: 400)')
+    parser.add_argument('--concurrency', '-c', type=int, default=16,
+                        help='Requests in flight at once (default: 16)')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help='Scenarios to run (default: all)')
+    parser.add_argument('--json', type=str,
+                        help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = asyncio.run(run_scenarios(args))
+    for name, runs in results.items():
+        print(f"\n--- {name} ---")
+        for label, r in runs.items():
+            print(f"📊 {label:<20} ok {r['ok']:>4}  unavailable {r['unavailable']:>4}  "
+                  f"p50 {r['p50'] * 1000:7.1f} ms  p99 {r['p99'] * 1000:7.1f} ms  max {r['max'] * 1000:7.1f} ms  "
+                  f"hedges {r['client']['hedges']:>3}  retries {r['client']['retries']:>3}  "
+                  f"failed fast {r['client']['failed_fast']:>3}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
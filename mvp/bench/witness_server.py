@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the LITE witness API
+
+Answers GET /api/sign_transfer with random ciphers and a random signature after
+a configurable artificial delay, and can inject errors, a slow tail of
+requests and outages (set down to answer every request with HTTP 503), so the
+payment path and the witness client can be benchmarked without
+pusdc-kite-testnet.zentra.dev. The mock LITE contract does not verify
+signatures.
+
+Usage:
+    python bench/witness_server.py --port 8600 --latency 0.05 --jitter 0.01 --error-rate 0.01
+    python bench/witness_server.py --latency 0.02 --slow-rate 0.05 --slow-latency 2
+"""
+
+import json
+import time
+import random
+import secrets
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CIPHER_FIELDS = ("amount_cipher", "current_sender_balance", "updated_sender_balance",
+                 "current_receiver_balance", "updated_receiver_balance")
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Every request opens a connection; the default backlog of 5 stalls concurrent clients
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up (timeouts, lost hedges) close their end early
+        pass
+
+
+class WitnessServer:
+    """
+    Threaded HTTP witness stand-in with latency and error injection
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0, slow_rate=0.0,
+                 slow_latency=0.0):
+        """
+        Initialize witness server
+
+        Args:
+            host (str): Listen address
+            port (int): Listen port (0 picks a free port)
+            latency (float): Seconds each signature request takes
+            jitter (float): Uniform random extra delay in seconds, added to latency
+            error_rate (float): Fraction of requests answered with HTTP 500
+            slow_rate (float): Fraction of requests that take slow_latency instead of latency
+            slow_latency (float): Seconds a slow request takes
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        # Answer every request with HTTP 503 while set
+        self.down = False
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        witness = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if not self.path.startswith("/api/sign_transfer"):
+                    self.send_error(404)
+                    return
+                with witness._lock:
+                    witness.requests += 1
+                if witness.down:
+                    self._reply(503, {"error": "injected outage"})
+                    return
+                slow = witness.slow_rate and random.random() < witness.slow_rate
+                delay = (witness.slow_latency if slow else witness.latency)
+                delay += random.uniform(0, witness.jitter) if witness.jitter else 0
+                if delay:
+                    time.sleep(delay)
+                if witness.error_rate and random.random() < witness.error_rate:
+                    self._reply(500, {"error": "injected failure"})
+                    return
+                body = {field: "0x" + secrets.token_hex(32) for field in CIPHER_FIELDS}
+                body["signature"] = "0x" + secrets.token_hex(65)
+                self._reply(200, body)
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        """
+        Serve on a daemon thread
+
+        Returns:
+            WitnessServer: self
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the local witness API stand-in')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Listen address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8600, help='Listen port (default: 8600)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds per signature request (default: 0)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random delay in seconds (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failing with 500 (default: 0)')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='Fraction of requests taking --slow-latency (default: 0)')
+    parser.add_argument('--slow-latency', type=float, default=0.0, help='Seconds per slow request (default: 0)')
+    args = parser.parse_args()
+
+    server = WitnessServer(args.host, args.port, args.latency, args.jitter, args.error_rate, args.slow_rate,
+                           args.slow_latency)
+    print(f"✅ Witness stand-in listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Process-wide cache for chain constants, contract handles and fee state
+
+Values that never change on a deployed chain (chain ID, token decimals, the
+LITE contract's erc20/witness/tick, contract objects, checksummed addresses)
+are memoized for the life of the process. Volatile values such as the fee
+history (or the gasPrice of chains without a base fee) are kept for a
+configurable TTL.
+
+Settings can be overridden with environment variables:
+    FEE_HISTORY_TTL     Seconds a fetched fee history or gas price is reused (default: 15)
+"""
+
+import os
+import time
+import threading
+from functools import lru_cache
+
+FEE_HISTORY_TTL = float(os.getenv("FEE_HISTORY_TTL", 15))
+
+
+class ChainCache:
+    """
+    Keyed value cache with optional per-entry TTL and hit/miss counters
+
+    Async lookups of the same missing key share one in-flight fetch, so a burst
+    of concurrent payments triggers a single RPC call.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._expires = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._values:
+                expires = self._expires.get(key)
+                if expires is None or time.monotonic() < expires:
+                    self.hits[key] = self.hits.get(key, 0) + 1
+                    return True, self._values[key]
+            self.misses[key] = self.misses.get(key, 0) + 1
+            return False, None
+
+    def _store(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = value
+            if ttl is None:
+                self._expires.pop(key, None)
+            else:
+                self._expires[key] = time.monotonic() + ttl
+
+    def get(self, key, fetch, ttl=None):
+        """
+        Get a cached value, calling fetch() on a miss
+
+        Args:
+            key: Cache key
+            fetch (callable): Returns the value
+            ttl (float): Seconds to keep the value, or None to keep it forever
+
+        Returns:
+            Cached or freshly fetched value
+        """
+        found, value = self._lookup(key)
+        if found:
+            return value
+        value = fetch()
+        self._store(key, value, ttl)
+        return value
+
+    async def get_async(self, key, fetch, ttl=None):
+        """
+        Async variant of get(); fetch() returns an awaitable
+
+        Concurrent misses on the same key wait for the first fetch instead of
+        issuing their own.
+        """
+        found, value = self._lookup(key)
+        if found:
+            return value
+        # Imported here: asyncio is not needed on the synchronous CLI path
+        import asyncio
+        pending = self._pending.get(key)
+        if pending is not None and pending.get_loop() is asyncio.get_running_loop():
+            return await asyncio.shield(pending)
+        future = asyncio.ensure_future(fetch())
+        self._pending[key] = future
+        try:
+            value = await future
+        finally:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        self._store(key, value, ttl)
+        return value
+
+    def invalidate(self, key=None):
+        """
+        Drop one key, or every cached value
+        """
+        with self._lock:
+            if key is None:
+                self._values.clear()
+                self._expires.clear()
+            else:
+                self._values.pop(key, None)
+                self._expires.pop(key, None)
+
+    def stats(self):
+        """
+        Hit and miss counters, in total and per key
+
+        Returns:
+            dict: {"hits": int, "misses": int, "keys": {key: {"hits": int, "misses": int}}}
+        """
+        with self._lock:
+            keys = {}
+            for key in set(self.hits) | set(self.misses):
+                keys[str(key)] = {"hits": self.hits.get(key, 0), "misses": self.misses.get(key, 0)}
+            checksum_info = checksum.cache_info()
+            keys["checksum"] = {"hits": checksum_info.hits, "misses": checksum_info.misses}
+            return {
+                "hits": sum(entry["hits"] for entry in keys.values()),
+                "misses": sum(entry["misses"] for entry in keys.values()),
+                "keys": keys,
+            }
+
+
+@lru_cache(maxsize=65536)
+def checksum(address):
+    """
+    Memoized to_checksum_address (each call is a keccak hash)
+    """
+    # Imported on first use: eth_utils pulls in the keccak backend, which CLI startup does not need
+    from eth_utils import to_checksum_address
+    return to_checksum_address(address)
+
+
+chain_cache = ChainCache()
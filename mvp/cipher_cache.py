@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Process-wide cache of confirmed LITE balance ciphers
+
+A LITE account's balance cipher only changes when a privacyTransfer touches
+the account, so the ciphers of receivers paid again and again do not need a
+chain read per payment. Entries come from chain reads and, after our own
+transfers are confirmed, from the updated_sender_balance and
+updated_receiver_balance the witness returned for them. Every entry carries
+the (block, transaction index) position it is valid at.
+
+Transfers by anyone else are found by scanning new blocks for privacyTransfer
+calls to the LITE contract that we did not send. The accounts they touch are
+dropped from the cache (and listeners, such as payment engines holding
+chained ciphers, are told), so the next payment reads them from the chain
+again. A scan that falls too far behind clears the whole cache instead.
+
+Settings can be overridden with environment variables:
+    CIPHER_SYNC_INTERVAL    Seconds between block scans (default: CONFIRMATION_POLL_INTERVAL)
+    CIPHER_MAX_SCAN         Blocks scanned to catch up before the cache is cleared instead (default: 500)
+"""
+
+import os
+import asyncio
+import threading
+import weakref
+
+from chain_cache import checksum
+from confirmation_tracker import BLOCKS_PER_BATCH, CONFIRMATION_POLL_INTERVAL
+from metrics import registry
+from transport import RPCError, async_rpc_batch
+
+CIPHER_SYNC_INTERVAL = float(os.getenv("CIPHER_SYNC_INTERVAL", CONFIRMATION_POLL_INTERVAL))
+CIPHER_MAX_SCAN = int(os.getenv("CIPHER_MAX_SCAN", 500))
+
+# privacyTransfer(address,bytes,bytes,bytes,bytes,bytes,bytes)
+PRIVACY_TRANSFER_SELECTOR = "0x4d0ae98f"
+# Position of values read from the chain at a block: after every transaction in it
+END_OF_BLOCK = 2 ** 31
+
+
+class CipherCache:
+    """
+    Confirmed balance ciphers per checksummed LITE account
+    """
+
+    def __init__(self, rpc_url, lite_addr, sync_interval=CIPHER_SYNC_INTERVAL, max_scan=CIPHER_MAX_SCAN):
+        """
+        Initialize cipher cache
+
+        Args:
+            rpc_url (str): RPC endpoint
+            lite_addr (str): LITE contract address
+            sync_interval (float): Seconds between block scans
+            max_scan (int): Blocks scanned to catch up before the cache is cleared instead
+        """
+        self.rpc_url = rpc_url
+        self.lite_addr = lite_addr.lower()
+        self.sync_interval = sync_interval
+        self.max_scan = max_scan
+        self.next_block = None
+        self._ciphers = {}
+        # Position of the last transfer by someone else that touched an account
+        self._stale = {}
+        # Hashes of transfers sent by this process: None while the payment is open, then the
+        # block a mined version is in until the scan passes it
+        self._ours = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._synced_at = None
+        self._syncing = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, address):
+        """
+        Cached cipher of an account, or None
+        """
+        with self._lock:
+            entry = self._ciphers.get(address)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        registry.inc("cipher_cache_lookups_total", result="miss" if entry is None else "hit")
+        return entry[0] if entry is not None else None
+
+    def store(self, address, cipher, position):
+        """
+        Remember an account's cipher unless something newer is known
+
+        Args:
+            address (str): Checksummed account address
+            cipher: Balance cipher (bytes from the chain, hex string from the witness)
+            position (tuple): (block number, transaction index) the cipher is valid at
+        """
+        with self._lock:
+            if position <= self._stale.get(address, (-1, -1)):
+                return
+            entry = self._ciphers.get(address)
+            if entry is None or entry[1] <= position:
+                self._ciphers[address] = (cipher, position)
+
+    def store_snapshot(self, snapshot):
+        """
+        Remember the ciphers of a StateSnapshot
+        """
+        for address, cipher in snapshot.balances.items():
+            self.store(address, cipher, (snapshot.block_number, END_OF_BLOCK))
+
+    def expect(self, tx_hash):
+        """
+        Register a transfer we are about to send, so the block scan does not treat it as foreign
+        """
+        with self._lock:
+            self._ours[tx_hash.lower()] = None
+
+    def resolved(self, tx_hashes, receipt=None):
+        """
+        Stop expecting the transfers of a finished (confirmed or failed) payment
+
+        The mined version is kept until the block scan passes its block, so the
+        scan still knows it as ours; the other versions are dropped.
+
+        Args:
+            tx_hashes (iterable): Every hash expected for the payment
+            receipt (dict): Parsed receipt of the mined version, if any
+        """
+        mined = receipt["transactionHash"].lower() if receipt is not None else None
+        with self._lock:
+            for tx_hash in tx_hashes:
+                tx_hash = tx_hash.lower()
+                if tx_hash not in self._ours:
+                    continue
+                if (tx_hash == mined and self.next_block is not None
+                        and receipt["blockNumber"] >= self.next_block):
+                    self._ours[tx_hash] = receipt["blockNumber"]
+                else:
+                    del self._ours[tx_hash]
+
+    def _forget_scanned(self):
+        # Mined transfers of finished payments in blocks the scan has passed
+        with self._lock:
+            for tx_hash in [tx_hash for tx_hash, block in self._ours.items()
+                            if block is not None and block < self.next_block]:
+                del self._ours[tx_hash]
+
+    def confirmed(self, receipt, ciphers):
+        """
+        Apply the witness's updated ciphers of one of our confirmed transfers
+
+        Args:
+            receipt (dict): Parsed receipt of the transfer
+            ciphers (dict): Updated cipher per checksummed address (sender and receiver)
+        """
+        position = (receipt["blockNumber"], receipt.get("transactionIndex", END_OF_BLOCK - 1))
+        for address, cipher in ciphers.items():
+            self.store(address, cipher, position)
+
+    def invalidate(self, addresses, position=None):
+        """
+        Drop accounts whose ciphers may have changed
+
+        Args:
+            addresses (iterable): Checksummed addresses
+            position (tuple): Position of the transfer that changed them; older
+                updates arriving later are then ignored
+        """
+        with self._lock:
+            for address in addresses:
+                if self._ciphers.pop(address, None) is not None:
+                    self.invalidations += 1
+                if position is not None and position > self._stale.get(address, (-1, -1)):
+                    self._stale[address] = position
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._ciphers)
+            self._ciphers.clear()
+
+    def add_listener(self, callback):
+        """
+        Call callback(addresses) after a scan found foreign transfers; addresses is
+        None when the cache was cleared. Bound methods are held weakly.
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else (lambda: callback)
+        self._listeners.append(ref)
+
+    def _notify(self, addresses):
+        alive = []
+        for ref in self._listeners:
+            callback = ref()
+            if callback is None:
+                continue
+            alive.append(ref)
+            try:
+                callback(addresses)
+            except Exception as e:
+                print(f"⚠️  Cipher invalidation listener failed: {e}")
+        self._listeners = alive
+
+    async def sync(self):
+        """
+        Scan the blocks mined since the last scan for transfers by others
+
+        Scans run at most every sync_interval seconds; concurrent callers share one.
+
+        Returns:
+            bool: True if the cache is current, False if the scan failed and the
+            cache should not be used
+        """
+        loop = asyncio.get_running_loop()
+        if self._syncing is not None and not self._syncing.done():
+            return await asyncio.shield(self._syncing)
+        if self._synced_at is not None and loop.time() - self._synced_at < self.sync_interval:
+            return True
+        self._syncing = asyncio.ensure_future(self._sync())
+        return await asyncio.shield(self._syncing)
+
+    async def _sync(self):
+        try:
+            await self._scan()
+        except Exception as e:
+            print(f"⚠️  Cipher cache block scan failed, reading state from chain: {e}")
+            return False
+        self._synced_at = asyncio.get_running_loop().time()
+        return True
+
+    async def _scan(self):
+        head = int((await async_rpc_batch(self.rpc_url, [("eth_blockNumber", [])]))[0], 16)
+        if self.next_block is None:
+            # Nothing cached predates the first scan
+            self.next_block = head + 1
+            return
+        if head - self.next_block + 1 > self.max_scan:
+            # Too far behind to catch up block by block
+            self.clear()
+            self.next_block = head + 1
+            self._forget_scanned()
+            self._notify(None)
+            return
+        touched = set()
+        try:
+            while self.next_block <= head:
+                last = min(head, self.next_block + BLOCKS_PER_BATCH - 1)
+                blocks = await async_rpc_batch(self.rpc_url, [
+                    ("eth_getBlockByNumber", [hex(n), True]) for n in range(self.next_block, last + 1)])
+                for block in blocks:
+                    if isinstance(block, RPCError):
+                        raise block
+                    if block is None:
+                        # Node has not caught up with its own head yet; continue next scan
+                        return
+                    touched |= self._scan_block(block)
+                    self.next_block = int(block["number"], 16) + 1
+        finally:
+            self._forget_scanned()
+            if touched:
+                self._notify(touched)
+
+    def _scan_block(self, block):
+        number = int(block["number"], 16)
+        touched = set()
+        for tx in block.get("transactions", []):
+            if (tx.get("to") or "").lower() != self.lite_addr:
+                continue
+            data = tx.get("input") or tx.get("data") or ""
+            if not data.startswith(PRIVACY_TRANSFER_SELECTOR):
+                continue
+            tx_hash = tx["hash"].lower()
+            with self._lock:
+                if tx_hash in self._ours:
+                    del self._ours[tx_hash]
+                    continue
+            # First argument is the receiver, right-aligned in a 32-byte word
+            accounts = [checksum(tx["from"]), checksum("0x" + data[10 + 24:10 + 64])]
+            self.invalidate(accounts, (number, int(tx.get("transactionIndex", "0x0"), 16)))
+            registry.inc("cipher_cache_foreign_transfers_total")
+            touched.update(accounts)
+        return touched
+
+    def stats(self):
+        """
+        Returns:
+            dict: Entries, hits, misses, invalidations, expected transfers and the next block to scan
+        """
+        return {"entries": len(self._ciphers), "hits": self.hits, "misses": self.misses,
+                "invalidations": self.invalidations, "expected": len(self._ours), "next_block": self.next_block}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cipher_cache(rpc_url, lite_addr):
+    """
+    Get the process-wide cipher cache for a LITE contract
+
+    Returns:
+        CipherCache: Shared cache
+    """
+    with _caches_lock:
+        cache = _caches.get((rpc_url, lite_addr))
+        if cache is None:
+            cache = _caches[(rpc_url, lite_addr)] = CipherCache(rpc_url, lite_addr)
+        return cache
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Batched confirmation tracking for sent transactions
+
+Instead of one wait_for_transaction_receipt polling loop per payment, a single
+tracker follows new blocks, matches their transaction hashes against every
+pending payment at once and fetches the receipts of the matches in one
+JSON-RPC batch.
+
+Settings can be overridden with environment variables:
+    CONFIRMATION_DEPTH          Blocks (including the inclusion block) before a payment counts as confirmed (default: 1)
+    CONFIRMATION_TIMEOUT        Seconds to wait for confirmation (default: 120)
+    CONFIRMATION_POLL_INTERVAL  Seconds between head checks (default: 1)
+"""
+
+import os
+import time
+import asyncio
+
+from transport import RPCError, async_rpc_batch
+
+CONFIRMATION_DEPTH = int(os.getenv("CONFIRMATION_DEPTH", 1))
+CONFIRMATION_TIMEOUT = float(os.getenv("CONFIRMATION_TIMEOUT", 120))
+CONFIRMATION_POLL_INTERVAL = float(os.getenv("CONFIRMATION_POLL_INTERVAL", 1))
+# Blocks fetched per JSON-RPC batch while catching up
+BLOCKS_PER_BATCH = 50
+# Polls after which a hash still not seen in any block is looked up by receipt again
+RECEIPT_FALLBACK_POLLS = 5
+
+
+class ConfirmationTimeout(Exception):
+    """
+    Raised when a transaction is not confirmed within the tracker's timeout
+    """
+
+
+def parse_receipt(receipt):
+    """Integer fields of a raw JSON-RPC receipt"""
+    return {
+        "transactionHash": receipt["transactionHash"],
+        "blockNumber": int(receipt["blockNumber"], 16),
+        "transactionIndex": int(receipt.get("transactionIndex") or "0x0", 16),
+        "status": int(receipt.get("status", "0x1"), 16),
+        "gasUsed": int(receipt["gasUsed"], 16),
+    }
+
+
+class PendingTransaction:
+    """
+    A tracked transaction hash and its waiters
+    """
+
+    def __init__(self, tx_hash, future, deadline, on_confirmed):
+        self.tx_hash = tx_hash
+        self.future = future
+        self.deadline = deadline
+        self.on_confirmed = on_confirmed
+        self.block_number = None
+        self.polls = 0
+
+
+class ConfirmationTracker:
+    """
+    Resolves many pending transaction hashes from block data in bulk
+    """
+
+    def __init__(self, rpc_url, confirmations=CONFIRMATION_DEPTH, timeout=CONFIRMATION_TIMEOUT,
+                 poll_interval=CONFIRMATION_POLL_INTERVAL):
+        """
+        Initialize confirmation tracker
+
+        Args:
+            rpc_url (str): RPC endpoint
+            confirmations (int): Blocks (including the inclusion block) required for confirmation
+            timeout (float): Seconds before a pending transaction fails with ConfirmationTimeout
+            poll_interval (float): Seconds between head checks
+        """
+        self.rpc_url = rpc_url
+        self.confirmations = max(1, confirmations)
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.pending = {}
+        self.next_block = None
+        self._task = None
+
+    def track(self, tx_hash, on_confirmed=None, timeout=None):
+        """
+        Start tracking a sent transaction
+
+        Args:
+            tx_hash (str): 0x-prefixed transaction hash
+            on_confirmed (callable): Called with the parsed receipt when the transaction succeeds
+            timeout (float): Overrides the tracker's timeout for this transaction
+
+        Returns:
+            asyncio.Future: Resolves to the parsed receipt (status 0 included), or
+            raises ConfirmationTimeout
+        """
+        tx_hash = tx_hash.lower()
+        if not tx_hash.startswith("0x"):
+            tx_hash = "0x" + tx_hash
+        entry = self.pending.get(tx_hash)
+        if entry is None:
+            future = asyncio.get_running_loop().create_future()
+            deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+            entry = PendingTransaction(tx_hash, future, deadline, on_confirmed)
+            self.pending[tx_hash] = entry
+        if self._task is None or self._task.done():
+            # Blocks mined while idle hold nothing we track
+            self.next_block = None
+            self._task = asyncio.ensure_future(self._run())
+        return entry.future
+
+    def untrack(self, tx_hash):
+        """
+        Stop tracking a transaction that was replaced, cancelling its future
+        """
+        entry = self.pending.pop(tx_hash.lower(), None)
+        if entry is not None and not entry.future.done():
+            entry.future.cancel()
+
+    async def wait(self, tx_hash, on_confirmed=None, timeout=None):
+        """
+        Track a transaction and wait for its parsed receipt
+        """
+        return await self.track(tx_hash, on_confirmed=on_confirmed, timeout=timeout)
+
+    async def close(self):
+        """
+        Stop tracking and fail whatever is still pending
+        """
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        for entry in self.pending.values():
+            if not entry.future.done():
+                entry.future.set_exception(ConfirmationTimeout(f"tracker closed before {entry.tx_hash} confirmed"))
+        self.pending.clear()
+
+    async def _run(self):
+        while self.pending:
+            try:
+                await self._poll()
+            except Exception as e:
+                print(f"⚠️  Confirmation tracker poll failed: {e}")
+            self._expire()
+            if self.pending:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _poll(self):
+        head = int((await async_rpc_batch(self.rpc_url, [("eth_blockNumber", [])]))[0], 16)
+        if self.next_block is None:
+            # Transactions sent just before tracking started may already be in the head block
+            self.next_block = max(0, head - 1)
+
+        # 1. Match new blocks' transaction hashes against everything pending
+        while self.next_block <= head:
+            last = min(head, self.next_block + BLOCKS_PER_BATCH - 1)
+            blocks = await async_rpc_batch(self.rpc_url, [
+                ("eth_getBlockByNumber", [hex(n), False]) for n in range(self.next_block, last + 1)])
+            for block in blocks:
+                if isinstance(block, RPCError):
+                    raise block
+                if block is None:
+                    # Node has not caught up with its own head yet; retry next poll
+                    return
+                number = int(block["number"], 16)
+                for tx_hash in block.get("transactions", []):
+                    entry = self.pending.get(tx_hash.lower())
+                    if entry is not None:
+                        entry.block_number = number
+                self.next_block = number + 1
+
+        # 2. Receipts for transactions deep enough, plus a direct lookup for hashes
+        # not seen in a block: new ones may have been mined before the scanned range
+        ready = []
+        for entry in self.pending.values():
+            entry.polls += 1
+            if entry.block_number is not None:
+                if head - entry.block_number + 1 >= self.confirmations:
+                    ready.append(entry)
+            elif entry.polls == 1 or entry.polls % RECEIPT_FALLBACK_POLLS == 0:
+                ready.append(entry)
+        if not ready:
+            return
+        receipts = await async_rpc_batch(self.rpc_url, [
+            ("eth_getTransactionReceipt", [entry.tx_hash]) for entry in ready])
+        for entry, receipt in zip(ready, receipts):
+            if isinstance(receipt, RPCError) or receipt is None or receipt.get("blockNumber") is None:
+                continue
+            parsed = parse_receipt(receipt)
+            if head - parsed["blockNumber"] + 1 < self.confirmations:
+                entry.block_number = parsed["blockNumber"]
+                continue
+            self._resolve(entry, parsed)
+
+    def _resolve(self, entry, receipt):
+        del self.pending[entry.tx_hash]
+        if receipt["status"] == 1 and entry.on_confirmed is not None:
+            try:
+                entry.on_confirmed(receipt)
+            except Exception as e:
+                print(f"⚠️  Confirmation callback for {entry.tx_hash} failed: {e}")
+        if not entry.future.done():
+            entry.future.set_result(receipt)
+
+    def _expire(self):
+        now = time.monotonic()
+        for tx_hash, entry in list(self.pending.items()):
+            if now >= entry.deadline:
+                del self.pending[tx_hash]
+                if not entry.future.done():
+                    entry.future.set_exception(
+                        ConfirmationTimeout(f"{tx_hash} not confirmed within {self.timeout:g}s"))
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Console progress output that can be switched off
+
+Progress messages on the payment path go through log() so they can be
+silenced under load, where writing them costs more than the work they
+describe. Errors are still printed.
+
+Settings can be overridden with environment variables:
+    PAY_QUIET   Set to 1 to suppress progress messages (default: 0)
+"""
+
+import os
+
+quiet = os.getenv("PAY_QUIET", "0").lower() in ("1", "true", "yes")
+
+
+def set_quiet(enabled=True):
+    """
+    Turn progress output off (or back on)
+    """
+    global quiet
+    quiet = enabled
+
+
+def log(*args, **kwargs):
+    """
+    print() a progress message unless quiet mode is on
+    """
+    if not quiet:
+        print(*args, **kwargs)
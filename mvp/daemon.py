@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Resident payment daemon
+
+Keeps the RPC connections, contract handles and agent keys of one payment
+engine warm and runs payment jobs through a worker pool. Jobs arrive over a
+local HTTP API (TCP or Unix socket) or are read from a JSON-lines spool file.
+
+HTTP API:
+    POST /jobs          {"name": "target", "amount": 1.0} or a list of them -> 202 with job ids
+                        (503 with "retryable": true while draining or if the journal is unwritable)
+    GET  /jobs/{id}     Status and result of one job
+    GET  /jobs          Job counts by status
+    GET  /health        Liveness and queue depth
+    GET  /metrics       Prometheus metrics of the payment path
+
+Spool file lines look like {"id": "payroll-0001", "name": "target", "amount": 1.0};
+"id" is optional (lines without one are keyed by their position and content).
+Every accepted job is planned in the payment journal before
+it is acknowledged (HTTP 202, or the spool read offset kept next to the spool
+file moving past its line), so a job the daemon accepted but did not get to
+before a crash or a forced shutdown is finished by "main.py resume". Job ids
+are the journal's idempotency keys, so a job submitted again after a crash is
+not paid twice either.
+
+SIGHUP reloads the recipient directory files (RECIPIENTS_FILE, WHITELIST_FILE).
+SIGTERM or SIGINT stops accepting jobs and drains every accepted job; a second
+signal drops the jobs that have not started yet (they stay planned in the
+journal for "main.py resume"), and in-flight transactions are always waited for.
+"""
+
+import os
+import json
+import time
+import uuid
+import signal
+import hashlib
+import sqlite3
+import asyncio
+from collections import OrderedDict, deque
+
+import pay as settings
+from async_pay import DEFAULT_CONCURRENCY, PaymentEngine, parse_entry
+
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 10000
+SPOOL_POLL_INTERVAL = 1.0
+
+
+class Job:
+    """
+    One queued payment and its result
+    """
+
+    def __init__(self, job_id, name, amount, source):
+        self.id = job_id
+        self.name = name
+        self.amount = amount
+        self.source = source
+        self.status = "queued"
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "amount": self.amount,
+            "source": self.source,
+            "status": self.status,
+            "tx_hash": self.result["tx_hash"] if self.result else None,
+            "error": self.result["error"] if self.result else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class PaymentDaemon:
+    """
+    Job queue and worker pool in front of a warm payment engine
+    """
+
+    def __init__(self, private_keys, workers=DEFAULT_CONCURRENCY, spool=None):
+        """
+        Initialize payment daemon
+
+        Args:
+            private_keys (list): Private keys of the agent pool
+            workers (int): Jobs processed concurrently
+            spool (str): JSON-lines file to read jobs from, or None
+        """
+        self.engine = PaymentEngine(private_keys, concurrency=workers)
+        self.workers = workers
+        self.spool = spool
+        self.jobs = OrderedDict()
+        # Ids of finished jobs, oldest first, so the oldest can be forgotten without a scan
+        self._finished = deque()
+        self.queue = None
+        self.accepting = True
+        self.running = 0
+        self._tasks = []
+        self._stopped = None
+        self._signals = 0
+
+    def submit(self, entry, source="http", job_id=None):
+        """
+        Validate a payment, plan it in the payment journal and queue it
+
+        Args:
+            entry: (name, amount) tuple or {"name": ..., "amount": ...} dict
+            source (str): Where the job came from
+            job_id (str): Caller-chosen id (default: random)
+
+        Returns:
+            Job: The queued job (the existing one if job_id was already submitted)
+
+        Raises:
+            ValueError: Unknown recipient, bad amount or daemon shutting down
+        """
+        if not self.accepting:
+            raise ValueError("daemon is shutting down")
+        name, amount, _ = parse_entry(entry)
+        if settings.lookup_recipient(name) is None:
+            raise ValueError(f"Name {name} not found in address book")
+        if amount <= 0:
+            raise ValueError(f"invalid amount: {amount}")
+        job_id = str(job_id) if job_id else uuid.uuid4().hex
+        if job_id in self.jobs:
+            return self.jobs[job_id]
+        # Journaled before the caller is told the job was accepted; the worker
+        # replays keys that were already paid
+        self.engine.journal.begin(job_id, name, amount)
+        job = Job(job_id, name, amount, source)
+        self.jobs[job_id] = job
+        self.queue.put_nowait(job)
+        return job
+
+    def counts(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def _finish(self, job, status=None):
+        if status is not None:
+            job.status = status
+        job.finished_at = time.time()
+        self._finished.append(job.id)
+        while len(self._finished) > MAX_FINISHED_JOBS:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.status != "queued":
+                    continue
+                job.status, job.started_at = "running", time.time()
+                self.running += 1
+                try:
+                    # The job id is the journal's idempotency key, so a resubmitted job is not paid twice
+                    job.result = await self.engine.pay(job.name, job.amount, key=job.id)
+                    job.status = job.result["status"]
+                except Exception as e:
+                    job.status = "failed"
+                    job.result = {"tx_hash": None, "error": str(e)}
+                finally:
+                    self.running -= 1
+                    self._finish(job)
+            finally:
+                self.queue.task_done()
+
+    async def _tail_spool(self):
+        offset_path = self.spool + ".offset"
+        offset = 0
+        if os.path.exists(offset_path):
+            with open(offset_path, 'r', encoding='utf-8') as f:
+                offset = int(f.read().strip() or 0)
+        while self.accepting:
+            if os.path.exists(self.spool):
+                with open(self.spool, 'rb') as f:
+                    f.seek(offset)
+                    chunk = f.read()
+                # Only complete lines; a writer may be halfway through the last one.
+                # The offset only moves past lines whose jobs are journaled.
+                consumed = 0
+                for line in chunk.splitlines(keepends=True):
+                    if not line.endswith(b"\n") or not self.accepting:
+                        break
+                    if line.strip():
+                        try:
+                            entry = json.loads(line)
+                            job_id = entry.get("id") if isinstance(entry, dict) else None
+                            if not job_id:
+                                # Stable across restarts, so a line journaled just before a crash keeps its key
+                                job_id = "spool-" + hashlib.sha256(
+                                    f"{os.path.abspath(self.spool)}:{offset + consumed}:".encode() + line).hexdigest()[:32]
+                            self.submit(entry, source="spool", job_id=job_id)
+                        except sqlite3.Error as e:
+                            print(f"⚠️  Could not journal spool job, retrying: {e}")
+                            break
+                        except (ValueError, KeyError, TypeError) as e:
+                            if not self.accepting:
+                                break
+                            print(f"❌ Skipping spool line {line.decode('utf-8', 'replace').strip()!r}: {e}")
+                    consumed += len(line)
+                if consumed:
+                    offset += consumed
+                    with open(offset_path, 'w', encoding='utf-8') as f:
+                        f.write(str(offset))
+            await asyncio.sleep(SPOOL_POLL_INTERVAL)
+
+    def _app(self):
+        from aiohttp import web
+        from metrics import registry
+
+        async def create_jobs(request):
+            try:
+                payload = await request.json()
+            except ValueError:
+                return web.json_response({"error": "invalid JSON"}, status=400)
+            entries = payload if isinstance(payload, list) else [payload]
+            jobs = []
+            try:
+                for entry in entries:
+                    jobs.append(self.submit(entry, job_id=entry.get("id") if isinstance(entry, dict) else None))
+            except sqlite3.Error as e:
+                # Nothing was acknowledged for this entry; the client can retry the rest later
+                return web.json_response({"error": f"could not journal job: {e}", "retryable": True,
+                                          "accepted": [job.id for job in jobs]},
+                                         status=503, headers={"Retry-After": "1"})
+            except (ValueError, KeyError, TypeError, IndexError) as e:
+                status = 503 if not self.accepting else 400
+                return web.json_response({"error": str(e), "retryable": not self.accepting,
+                                          "accepted": [job.id for job in jobs]}, status=status)
+            body = [job.to_dict() for job in jobs]
+            return web.json_response(body if isinstance(payload, list) else body[0], status=202)
+
+        async def get_job(request):
+            job = self.jobs.get(request.match_info["job_id"])
+            if job is None:
+                return web.json_response({"error": "job not found"}, status=404)
+            return web.json_response(job.to_dict())
+
+        async def list_jobs(request):
+            return web.json_response({"counts": self.counts(), "queued": self.queue.qsize(),
+                                      "running": self.running})
+
+        async def health(request):
+            return web.json_response({"status": "ok" if self.accepting else "draining",
+                                      "agents": [lane.address for lane in self.engine.pool.lanes],
+                                      "queued": self.queue.qsize(), "running": self.running})
+
+        async def metrics(request):
+            return web.Response(text=registry.render_prometheus(), content_type="text/plain")
+
+        app = web.Application()
+        app.router.add_post("/jobs", create_jobs)
+        app.router.add_get("/jobs", list_jobs)
+        app.router.add_get("/jobs/{job_id}", get_job)
+        app.router.add_get("/health", health)
+        app.router.add_get("/metrics", metrics)
+        return app
+
+    def _on_reload(self):
+        try:
+            count = settings.get_directory().reload()
+            print(f"✅ Recipient directory reloaded: {count} recipients")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Recipient directory reload failed, keeping the previous one: {e}")
+
+    def _on_signal(self):
+        self._signals += 1
+        if self._signals == 1:
+            print(f"\n⌛ Draining {self.queue.qsize()} queued and {self.running} running jobs "
+                  "(signal again to drop queued jobs)...")
+            self.accepting = False
+            self._stopped.set()
+        else:
+            dropped = 0
+            for job in list(self.jobs.values()):
+                if job.status == "queued":
+                    self._finish(job, "cancelled")
+                    dropped += 1
+            print(f"⚠️  Dropped {dropped} queued jobs (pay them later with: python main.py resume), "
+                  f"waiting for {self.running} in-flight payments...")
+
+    async def serve(self, host="127.0.0.1", port=8700, unix_socket=None):
+        """
+        Run until SIGTERM/SIGINT, then drain
+
+        Args:
+            host (str): HTTP listen address
+            port (int): HTTP listen port, or None to disable HTTP
+            unix_socket (str): Unix socket path to listen on instead of TCP
+        """
+        from aiohttp import web
+
+        self.queue = asyncio.Queue()
+        self._stopped = asyncio.Event()
+        await self.engine.start()
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._on_signal)
+        loop.add_signal_handler(signal.SIGHUP, self._on_reload)
+
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        spool_task = asyncio.ensure_future(self._tail_spool()) if self.spool else None
+
+        runner = None
+        if unix_socket or port is not None:
+            runner = web.AppRunner(self._app(), handle_signals=False)
+            await runner.setup()
+            if unix_socket:
+                site = web.UnixSite(runner, unix_socket)
+                where = f"unix:{unix_socket}"
+            else:
+                site = web.TCPSite(runner, host, port)
+                where = f"http://{host}:{port}"
+            await site.start()
+            print(f"✅ Payment daemon listening on {where} with {self.workers} workers")
+        if self.spool:
+            print(f"✅ Reading jobs from spool file {self.spool}")
+
+        await self._stopped.wait()
+        if spool_task is not None:
+            spool_task.cancel()
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.engine.tracker.close()
+        if runner is not None:
+            await runner.cleanup()
+        print(f"✅ Payment daemon stopped: {self.counts()}")
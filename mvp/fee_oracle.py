@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Fee oracle and gas estimate cache
+
+Gas for privacyTransfer is estimated per calldata-size class instead of
+sending every transaction with a fixed 2M limit. An estimate is reused for
+FEE_GAS_TTL seconds and carries headroom for a first payment to a receiver,
+which writes fresh storage and costs more than the transfer that happened to
+be estimated. EIP-1559 fees are derived
+from a rolling eth_feeHistory window that all payments share for
+FEE_HISTORY_TTL seconds. Chains without a base fee fall back to eth_gasPrice.
+Transactions that stay unconfirmed can be re-sent with bumped fees.
+
+Settings can be overridden with environment variables:
+    FEE_HISTORY_BLOCKS      Blocks in the fee history window (default: 20)
+    FEE_REWARD_PERCENTILE   Priority fee percentile paid within the window (default: 50)
+    FEE_BASE_MULTIPLIER     Max fee headroom over the next base fee (default: 2)
+    FEE_GAS_MARGIN          Safety margin on gas estimates (default: 1.2)
+    FEE_GAS_TTL             Seconds a gas estimate is reused for its size class (default: 300)
+    FEE_FRESH_RECEIVER_GAS  Gas added for a receiver without ciphers on chain yet (default: 45000)
+    FEE_STUCK_AFTER         Seconds without confirmation before fees are bumped (default: 60)
+    FEE_MAX_REPLACEMENTS    Fee bumps per transaction the node accepted (default: 3)
+"""
+
+import os
+import math
+
+from chain_cache import FEE_HISTORY_TTL, chain_cache
+from transport import RPCError, async_rpc_batch
+
+FEE_HISTORY_BLOCKS = int(os.getenv("FEE_HISTORY_BLOCKS", 20))
+FEE_REWARD_PERCENTILE = float(os.getenv("FEE_REWARD_PERCENTILE", 50))
+FEE_BASE_MULTIPLIER = float(os.getenv("FEE_BASE_MULTIPLIER", 2))
+FEE_GAS_MARGIN = float(os.getenv("FEE_GAS_MARGIN", 1.2))
+FEE_GAS_TTL = float(os.getenv("FEE_GAS_TTL", 300))
+# Zero-to-nonzero storage writes cost 20000 gas instead of 2900, so a receiver's
+# first payment needs more gas than one to a receiver that already has ciphers
+FEE_FRESH_RECEIVER_GAS = int(os.getenv("FEE_FRESH_RECEIVER_GAS", 45000))
+FEE_STUCK_AFTER = float(os.getenv("FEE_STUCK_AFTER", 60))
+FEE_MAX_REPLACEMENTS = int(os.getenv("FEE_MAX_REPLACEMENTS", 3))
+# Nodes reject replacements that raise fees by less than 10%
+REPLACEMENT_BUMP = 1.125
+# Fragments of node error messages that reject a replacement for paying too little
+UNDERPRICED_MARKERS = ("underpriced", "fee too low", "max fee per gas less than block base fee")
+# Used when estimation fails, e.g. because the transfer builds on ciphers not yet on chain
+FALLBACK_GAS_LIMIT = 2000000
+# Gas per non-zero calldata byte; covers the larger transactions of a size class
+CALLDATA_BYTE_GAS = 16
+MIN_SIZE_CLASS = 256
+
+
+def size_class(calldata):
+    """
+    Calldata-size class of a transaction: its length in bytes rounded up to a power of two
+
+    Args:
+        calldata (str): 0x-prefixed calldata
+
+    Returns:
+        int: Upper bound of the class in bytes
+    """
+    length = max(0, (len(calldata) - 2) // 2)
+    return max(MIN_SIZE_CLASS, 1 << max(0, length - 1).bit_length())
+
+
+def is_underpriced(error):
+    """
+    Check whether a node rejected a (replacement) transaction for its fees
+
+    Args:
+        error (Exception): Error raised by send_raw_transaction
+
+    Returns:
+        bool: True if a higher fee could be accepted
+    """
+    message = str(error).lower()
+    return any(marker in message for marker in UNDERPRICED_MARKERS)
+
+
+def _int(value):
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+class FeeOracle:
+    """
+    Shared fee state and gas limits for every payment of a process
+    """
+
+    def __init__(self, rpc_url, refresh=FEE_HISTORY_TTL):
+        """
+        Initialize fee oracle
+
+        Args:
+            rpc_url (str): RPC endpoint
+            refresh (float): Seconds the fee state is reused before it is read again
+        """
+        self.rpc_url = rpc_url
+        self.refresh = refresh
+
+    async def fees(self):
+        """
+        Fee fields for the next transactions
+
+        Returns:
+            dict: {"maxFeePerGas", "maxPriorityFeePerGas"} on EIP-1559 chains,
+            otherwise {"gasPrice"}
+        """
+        return dict(await chain_cache.get_async(("fee_state", self.rpc_url), self._read_fees, ttl=self.refresh))
+
+    async def _read_fees(self):
+        history, suggested_tip, gas_price = await async_rpc_batch(self.rpc_url, [
+            ("eth_feeHistory", [FEE_HISTORY_BLOCKS, "latest", [FEE_REWARD_PERCENTILE]]),
+            ("eth_maxPriorityFeePerGas", []),
+            ("eth_gasPrice", []),
+        ])
+        base_fees = [] if isinstance(history, RPCError) or not history else history.get("baseFeePerGas") or []
+        # The last entry is the base fee of the next block
+        next_base_fee = _int(base_fees[-1]) if base_fees else 0
+        if not next_base_fee:
+            if isinstance(gas_price, RPCError):
+                raise gas_price
+            return {"gasPrice": _int(gas_price)}
+
+        rewards = sorted(_int(block[0]) for block in history.get("reward") or [] if block)
+        tip = rewards[len(rewards) // 2] if rewards else 0
+        if not tip and not isinstance(suggested_tip, RPCError):
+            tip = _int(suggested_tip)
+        return {
+            "maxFeePerGas": int(next_base_fee * FEE_BASE_MULTIPLIER) + tip,
+            "maxPriorityFeePerGas": tip,
+        }
+
+    async def gas_limit(self, transaction):
+        """
+        Gas limit for a transaction, estimated per calldata-size class
+
+        Estimates are reused for FEE_GAS_TTL seconds. Whichever receiver the
+        estimate was made for, the limit covers the worst case of the class:
+        the largest calldata and a receiver paid for the first time.
+
+        Args:
+            transaction (dict): Transaction with from, to and data
+
+        Returns:
+            int: Gas limit with margin for the largest calldata of the class
+        """
+        data = transaction.get("data", "0x")
+        upper = size_class(data)
+        key = ("gas_estimate", transaction["to"], upper)
+
+        async def estimate():
+            call = {"from": transaction["from"], "to": transaction["to"], "data": data,
+                    "value": hex(transaction.get("value", 0))}
+            result = (await async_rpc_batch(self.rpc_url, [("eth_estimateGas", [call])]))[0]
+            if isinstance(result, RPCError):
+                raise result
+            padding = (upper - (len(data) - 2) // 2) * CALLDATA_BYTE_GAS
+            return math.ceil((_int(result) + padding + FEE_FRESH_RECEIVER_GAS) * FEE_GAS_MARGIN)
+
+        try:
+            return await chain_cache.get_async(key, estimate, ttl=FEE_GAS_TTL)
+        except Exception as e:
+            print(f"⚠️  Gas estimate for {upper}-byte calldata failed, using {FALLBACK_GAS_LIMIT} "
+                  f"for {self.refresh:g}s: {e}")
+            # Keep the fallback briefly instead of estimating again on every payment
+            chain_cache.get(key, lambda: FALLBACK_GAS_LIMIT, ttl=self.refresh)
+            return FALLBACK_GAS_LIMIT
+
+    async def bump(self, transaction):
+        """
+        Fees for a replacement of a stuck transaction
+
+        Raises every fee by REPLACEMENT_BUMP and by at least 1 wei (so a zero tip
+        is raised too), and further if the current fee state is already higher.
+
+        Args:
+            transaction (dict): Transaction that was sent
+
+        Returns:
+            dict: Copy of the transaction with the new fee fields
+        """
+        chain_cache.invalidate(("fee_state", self.rpc_url))
+        current = await self.fees()
+        replacement = dict(transaction)
+        for field in ("maxFeePerGas", "maxPriorityFeePerGas", "gasPrice"):
+            if field in transaction:
+                bumped = max(math.ceil(transaction[field] * REPLACEMENT_BUMP), transaction[field] + 1)
+                replacement[field] = max(bumped, current.get(field, 0))
+        if "maxFeePerGas" in replacement and "maxPriorityFeePerGas" in replacement:
+            # The current tip may have overtaken the bumped max fee
+            replacement["maxFeePerGas"] = max(replacement["maxFeePerGas"], replacement["maxPriorityFeePerGas"])
+        return replacement
+
+    def apply(self, transaction, fees):
+        """
+        Set fee fields on an unsigned transaction
+        """
+        for field in ("maxFeePerGas", "maxPriorityFeePerGas", "gasPrice"):
+            transaction.pop(field, None)
+        transaction.update(fees)
+        if "maxFeePerGas" in fees:
+            transaction["type"] = 2
+        else:
+            transaction.pop("type", None)
+        return transaction
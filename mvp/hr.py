@@ -1,108 +1,110 @@
-
 import os
+import sys
 import json
+import argparse
 from openai import OpenAI
 
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key=os.getenv("OPENROUTER_API_KEY"),
-)
+from agent_loop import AgentLoop, Tool
+from llm_cache import cached_client
+
+MODEL = "google/gemini-2.0-flash-001" # Switching to a model known to support tools well, or keep user's choice if preferred
+BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Mock data for demonstration
+SALARIES = {
+    "Alice": "120000",
+    "Bob": "95000",
+    "Charlie": "105000"
+}
 
 # 1. Define the actual function
 def get_salary_info(employee_name):
     """Get salary information for a given employee."""
-    # Mock data for demonstration
-    salaries = {
-        "Alice": "120000",
-        "Bob": "95000",
-        "Charlie": "105000"
-    }
-    salary = salaries.get(employee_name)
+    salary = SALARIES.get(employee_name)
     if salary:
         return json.dumps({"name": employee_name, "salary": salary, "currency": "USD"})
     else:
         return json.dumps({"name": employee_name, "error": "Employee not found"})
 
-# 2. Define the tool schema for the API
+# 2. Define the tool schema for the API (salary lookups are memoized)
 tools = [
-  {
-      "type": "function",
-      "function": {
-          "name": "get_salary_info",
-          "description": "Get salary information for a specific employee",
-          "parameters": {
-              "type": "object",
-              "properties": {
-                  "employee_name": {
-                      "type": "string",
-                      "description": "The name of the employee",
-                  },
-              },
-              "required": ["employee_name"],
-          },
-      },
-  }
+    Tool(
+        get_salary_info,
+        description="Get salary information for a specific employee",
+        parameters={
+            "type": "object",
+            "properties": {
+                "employee_name": {
+                    "type": "string",
+                    "description": "The name of the employee",
+                },
+            },
+            "required": ["employee_name"],
+        },
+        idempotent=True,
+    )
 ]
 
-# 3. Initial user message
-messages = [
-    {
-        "role": "user",
-        "content": "Can you check how much Alice earns?"
-    }
-]
 
-print(f"User Question: {messages[0]['content']}")
-
-# 4. First API Call: Send query and tool definitions
-response = client.chat.completions.create(
-    model="google/gemini-2.0-flash-001", # Switching to a model known to support tools well, or keep user's choice if preferred
-    messages=messages,
-    tools=tools,
-    tool_choice="auto"
-)
-
-response_message = response.choices[0].message
-tool_calls = response_message.tool_calls
-
-if tool_calls:
-    # 5. Process tool calls
-    print(f"\nModel requested tool call(s):")
-    available_functions = {
-        "get_salary_info": get_salary_info,
-    }
-    
-    messages.append(response_message)  # extend conversation with assistant's reply
-
-    for tool_call in tool_calls:
-        function_name = tool_call.function.name
-        function_to_call = available_functions[function_name]
-        function_args = json.loads(tool_call.function.arguments)
-        
-        print(f"  Function: {function_name}")
-        print(f"  Args: {function_args}")
-        
-        function_response = function_to_call(
-            employee_name=function_args.get("employee_name")
-        )
-        
-        print(f"  Output: {function_response}")
-
-        messages.append(
-            {
-                "tool_call_id": tool_call.id,
-                "role": "tool",
-                "name": function_name,
-                "content": function_response,
-            }
-        )
-    
-    # 6. Second API Call: Get final natural language response
-    second_response = client.chat.completions.create(
-        model="google/gemini-2.0-flash-001",
-        messages=messages,
+def print_tool_call(name, arguments, output):
+    print(f"  Function: {name}")
+    print(f"  Args: {arguments}")
+    print(f"  Output: {output}")
+
+
+class TokenPrinter:
+    """Prints streamed answer tokens, with the answer heading before the first one"""
+
+    def __init__(self):
+        self.started = False
+
+    def __call__(self, token):
+        if not self.started:
+            self.started = True
+            sys.stdout.write("\nFinal Answer: ")
+        sys.stdout.write(token)
+        sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ask the HR agent about salaries')
+    parser.add_argument('question', nargs='*', help='Question (default: how much Alice earns)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Print the answer token by token as it arrives')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Always ask the model instead of reusing cached responses (see llm_cache.py)')
+    args = parser.parse_args()
+
+    client = OpenAI(
+      base_url=BASE_URL,
+      api_key=os.getenv("OPENROUTER_API_KEY"),
     )
-    print(f"\nFinal Answer: {second_response.choices[0].message.content}")
+    # Identical requests (model, messages, tools) are answered from the response cache
+    if not args.no_cache:
+        client = cached_client(client)
+
+    # 3. Initial user message (e.g. "How much do Alice, Bob and Charlie earn?")
+    question = " ".join(args.question) or "Can you check how much Alice earns?"
+    messages = [
+        {
+            "role": "user",
+            "content": question
+        }
+    ]
+
+    print(f"User Question: {messages[0]['content']}")
+
+    # 4. Let the model call tools (all calls of a turn run in parallel) until it answers
+    print(f"\nModel tool call(s):")
+    if args.stream:
+        loop = AgentLoop(client, MODEL, tools, on_tool_call=print_tool_call, on_token=TokenPrinter())
+        loop.run_sync(messages)
+        print()
+    else:
+        loop = AgentLoop(client, MODEL, tools, on_tool_call=print_tool_call)
+        answer = loop.run_sync(messages)
+        print(f"\nFinal Answer: {answer}")
+
 
-else:
-    print(f"Model didn't call any tools. Response: {response_message.content}")
+if __name__ == "__main__":
+    main()
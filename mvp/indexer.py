@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Bulk on-chain reconciliation of the spending ledger
+
+The indexer scans block ranges for privacyTransfer transactions our agents
+sent to the LITE contract and stores them (sender, receiver, block, block time,
+status) in the ledger database, checkpointing the last block it processed.
+Blocks are fetched with full transactions in JSON-RPC batches, several
+batches at once, and the receipts of matching transactions in one batch per
+window, so a long history costs a few thousand round trips instead of one per
+block or payment. Later runs continue from the checkpoint; --follow keeps up
+with new blocks.
+
+verify compares the ledger with the chain: records whose transaction reverted,
+records whose day or month bucket differs from the block time, duplicated
+transaction hashes, and confirmed transfers missing from the ledger. Transfer
+amounts are encrypted on chain, so a missing record's amount comes from the
+payment journal; transfers the journal does not know are reported only.
+Records that were not indexed by a scan, or whose receipt the node did not
+return, are looked up by hash in batches. --fix applies the corrections and
+rebuilds the per-agent day and month buckets that check_limits reads. A record
+whose receipt the node cannot return is reported as unknown and never removed:
+a lagging or pruned node is no proof that the transaction did not execute.
+
+Usage:
+    python indexer.py scan [--from-block N] [--to-block N] [--follow] [--fix]
+    python indexer.py verify [--fix]
+
+Settings can be overridden with environment variables:
+    INDEXER_BATCH_SIZE      Blocks (or receipts) per JSON-RPC batch (default: 100)
+    INDEXER_CONCURRENCY     Batches in flight at once (default: 8)
+    INDEXER_LOOKBACK        Seconds before the oldest ledger record where the first scan starts (default: 86400)
+"""
+
+import os
+import sys
+import time
+import asyncio
+import sqlite3
+import argparse
+import threading
+
+from chain_cache import checksum
+from cipher_cache import PRIVACY_TRANSFER_SELECTOR
+from confirmation_tracker import CONFIRMATION_DEPTH, CONFIRMATION_POLL_INTERVAL
+from ledger import PERIOD_FORMATS, bucket_key
+from transport import RPCError, async_rpc_batch
+
+INDEXER_BATCH_SIZE = int(os.getenv("INDEXER_BATCH_SIZE", 100))
+INDEXER_CONCURRENCY = int(os.getenv("INDEXER_CONCURRENCY", 8))
+INDEXER_LOOKBACK = int(os.getenv("INDEXER_LOOKBACK", 86400))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chain_transfers (
+    tx_hash TEXT PRIMARY KEY,
+    agent TEXT NOT NULL,
+    to_addr TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    tx_index INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    status INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_chain_transfers_agent ON chain_transfers (agent, timestamp);
+CREATE TABLE IF NOT EXISTS ledger_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+CHECKPOINT_KEY = "indexer_block"
+# Receipt status of an indexed transfer whose receipt the node did not return
+UNKNOWN_STATUS = None
+
+
+def _raise_errors(results):
+    for result in results:
+        if isinstance(result, RPCError):
+            raise result
+    return results
+
+
+class TransferIndex:
+    """
+    Indexed privacyTransfer transactions and the scan checkpoint, in the ledger database
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"]: row for row in conn.execute("PRAGMA table_info(chain_transfers)")}
+            if columns["status"]["notnull"]:
+                # Indexes created before unknown receipts were kept apart
+                conn.executescript(
+                    "BEGIN; ALTER TABLE chain_transfers RENAME TO chain_transfers_old; "
+                    "DROP INDEX IF EXISTS idx_chain_transfers_agent; " + SCHEMA +
+                    "INSERT INTO chain_transfers SELECT * FROM chain_transfers_old; "
+                    "DROP TABLE chain_transfers_old; COMMIT;")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def checkpoint(self):
+        """
+        Returns:
+            int: Last block processed, or None before the first scan
+        """
+        row = self._connect().execute("SELECT value FROM ledger_meta WHERE key = ?", (CHECKPOINT_KEY,)).fetchone()
+        return int(row["value"]) if row else None
+
+    def store(self, transfers, checkpoint=None):
+        """
+        Save transfers and move the checkpoint in one transaction
+
+        Args:
+            transfers (list): Transfer dicts (tx_hash, agent, to_addr, block_number, tx_index, timestamp, status)
+            checkpoint (int): Last block now fully processed
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO chain_transfers (tx_hash, agent, to_addr, block_number, tx_index, "
+                "timestamp, status) VALUES (:tx_hash, :agent, :to_addr, :block_number, :tx_index, :timestamp, "
+                ":status)", transfers)
+            if checkpoint is not None:
+                conn.execute("INSERT OR REPLACE INTO ledger_meta (key, value) VALUES (?, ?)",
+                             (CHECKPOINT_KEY, str(checkpoint)))
+
+    def transfers(self, agents=None):
+        """
+        Get indexed transfers, optionally of some agents only
+
+        Returns:
+            dict: {tx_hash: transfer dict}
+        """
+        rows = self._connect().execute("SELECT * FROM chain_transfers ORDER BY block_number, tx_index")
+        agents = {agent.lower() for agent in agents} if agents is not None else None
+        return {row["tx_hash"]: dict(row) for row in rows
+                if agents is None or row["agent"].lower() in agents}
+
+
+class ReconciliationIndexer:
+    """
+    Scans the chain for our agents' transfers and reconciles the ledger with them
+    """
+
+    def __init__(self, rpc_url, lite_addr, ledger, journal, agents, batch_size=INDEXER_BATCH_SIZE,
+                 concurrency=INDEXER_CONCURRENCY, confirmations=CONFIRMATION_DEPTH):
+        """
+        Initialize indexer
+
+        Args:
+            rpc_url (str): RPC endpoint
+            lite_addr (str): LITE contract address
+            ledger (SpendingLedger): Ledger to reconcile
+            journal (PaymentJournal): Journal that knows the amounts of our transfers
+            agents (iterable): Agent addresses whose transfers are indexed
+            batch_size (int): Blocks or receipts per JSON-RPC batch
+            concurrency (int): Batches in flight at once
+            confirmations (int): Blocks (including the inclusion block) before a block is indexed
+        """
+        self.rpc_url = rpc_url
+        self.lite_addr = lite_addr.lower()
+        self.ledger = ledger
+        self.journal = journal
+        self.agents = {agent.lower() for agent in agents}
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.confirmations = max(1, confirmations)
+        self.index = TransferIndex(ledger.path)
+
+    async def _batches(self, calls):
+        """Run calls in batches of batch_size, concurrency batches at a time, results in order"""
+        batches = [calls[i:i + self.batch_size] for i in range(0, len(calls), self.batch_size)]
+        results = []
+        for i in range(0, len(batches), self.concurrency):
+            window = batches[i:i + self.concurrency]
+            for batch in await asyncio.gather(*(async_rpc_batch(self.rpc_url, b) for b in window)):
+                results.extend(batch)
+        return results
+
+    async def head(self):
+        """
+        Returns:
+            int: Latest block deep enough to index
+        """
+        head = int(_raise_errors(await async_rpc_batch(self.rpc_url, [("eth_blockNumber", [])]))[0], 16)
+        return head - self.confirmations + 1
+
+    async def block_at(self, timestamp, head):
+        """
+        Binary search for the first block at or after a timestamp
+
+        Returns:
+            int: Block number (head + 1 if every block is older)
+        """
+        low, high = 0, head + 1
+        while low < high:
+            middle = (low + high) // 2
+            block = _raise_errors(await async_rpc_batch(self.rpc_url, [("eth_getBlockByNumber", [hex(middle), False])]))[0]
+            if int(block["timestamp"], 16) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _match(self, block):
+        """Our agents' privacyTransfer transactions in a block with full transactions"""
+        matches = []
+        for tx in block.get("transactions", []):
+            if (tx.get("to") or "").lower() != self.lite_addr or tx["from"].lower() not in self.agents:
+                continue
+            data = tx.get("input") or tx.get("data") or ""
+            if not data.startswith(PRIVACY_TRANSFER_SELECTOR):
+                continue
+            matches.append({
+                "tx_hash": tx["hash"].lower(),
+                "agent": checksum(tx["from"]),
+                # First argument is the receiver, right-aligned in a 32-byte word
+                "to_addr": checksum("0x" + data[10 + 24:10 + 64]),
+                "block_number": int(block["number"], 16),
+                "tx_index": int(tx.get("transactionIndex", "0x0"), 16),
+                "timestamp": int(block["timestamp"], 16),
+            })
+        return matches
+
+    async def _with_status(self, transfers):
+        receipts = _raise_errors(await self._batches(
+            [("eth_getTransactionReceipt", [transfer["tx_hash"]]) for transfer in transfers]))
+        for transfer, receipt in zip(transfers, receipts):
+            transfer["status"] = int(receipt.get("status", "0x1"), 16) if receipt else UNKNOWN_STATUS
+        return transfers
+
+    async def scan(self, from_block=None, to_block=None, quiet=False):
+        """
+        Index our agents' transfers from the checkpoint (or from_block) up to to_block
+
+        The first scan starts INDEXER_LOOKBACK seconds before the oldest ledger
+        record, or at the head for an empty ledger.
+
+        Returns:
+            dict: Blocks scanned, transfers found and the new checkpoint
+        """
+        head = await self.head()
+        end = min(head, to_block) if to_block is not None else head
+        if from_block is None:
+            checkpoint = self.index.checkpoint()
+            if checkpoint is not None:
+                from_block = checkpoint + 1
+            else:
+                records = self.ledger.transaction_records()
+                oldest = min((record["timestamp"] for record in records), default=None)
+                from_block = await self.block_at(oldest - INDEXER_LOOKBACK, head) if oldest is not None else end
+        stats = {"blocks": 0, "transfers": 0, "checkpoint": self.index.checkpoint()}
+        if from_block > end:
+            return stats
+        if not quiet:
+            print(f"📡 Scanning blocks {from_block}-{end} for transfers of {len(self.agents)} agents...")
+        started = time.monotonic()
+        window = self.batch_size * self.concurrency
+        for start in range(from_block, end + 1, window):
+            last = min(end, start + window - 1)
+            blocks = _raise_errors(await self._batches(
+                [("eth_getBlockByNumber", [hex(n), True]) for n in range(start, last + 1)]))
+            if any(block is None for block in blocks):
+                # Node has not caught up with its own head yet
+                break
+            transfers = [transfer for block in blocks for transfer in self._match(block)]
+            if transfers:
+                await self._with_status(transfers)
+            self.index.store(transfers, checkpoint=last)
+            stats["blocks"] += last - start + 1
+            stats["transfers"] += len(transfers)
+            stats["checkpoint"] = last
+            if not quiet and last < end:
+                elapsed = time.monotonic() - started
+                print(f"  block {last}: {stats['blocks'] / elapsed:.0f} blocks/s, {stats['transfers']} transfers")
+        return stats
+
+    async def _lookup(self, tx_hashes):
+        """Receipts and block times of transactions the scans have not indexed"""
+        receipts = _raise_errors(await self._batches(
+            [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in tx_hashes]))
+        mined = {tx_hash: receipt for tx_hash, receipt in zip(tx_hashes, receipts)
+                 if receipt is not None and receipt.get("blockNumber") is not None}
+        numbers = sorted({receipt["blockNumber"] for receipt in mined.values()})
+        blocks = _raise_errors(await self._batches([("eth_getBlockByNumber", [n, False]) for n in numbers]))
+        times = {n: int(block["timestamp"], 16) for n, block in zip(numbers, blocks) if block is not None}
+        found = []
+        for tx_hash, receipt in mined.items():
+            if receipt["blockNumber"] not in times:
+                continue
+            found.append({
+                "tx_hash": tx_hash,
+                "agent": checksum(receipt["from"]),
+                "to_addr": checksum(receipt.get("to") or receipt["from"]),
+                "block_number": int(receipt["blockNumber"], 16),
+                "tx_index": int(receipt.get("transactionIndex") or "0x0", 16),
+                "timestamp": times[receipt["blockNumber"]],
+                "status": int(receipt.get("status", "0x1"), 16),
+            })
+        # Not our agents' privacyTransfer necessarily: kept out of the index, used for this check only
+        return {transfer["tx_hash"]: transfer for transfer in found}
+
+    async def verify(self, fix=False, quiet=False):
+        """
+        Compare the ledger with the chain, and optionally correct it
+
+        Returns:
+            dict: Lists of findings: reverted, unknown (no receipt, never
+            removed), retimed, duplicate, unrecorded (amount from the journal)
+            and unmatched (amount unknown), plus the number of verified and of
+            legacy records without a hash
+        """
+        records = self.ledger.transaction_records()
+        chain = self.index.transfers(self.agents | {record["agent"].lower() for record in records})
+        unresolved = {tx_hash for tx_hash, transfer in chain.items() if transfer["status"] is UNKNOWN_STATUS}
+        missing = sorted({record["tx_hash"].lower() for record in records} - set(chain) | unresolved)
+        if missing:
+            if not quiet:
+                print(f"📡 Looking up {len(missing)} transactions outside the indexed range or without a receipt...")
+            found = await self._lookup(missing)
+            chain.update(found)
+            # Indexed transfers whose receipt the node returns by now
+            self.index.store([transfer for tx_hash, transfer in found.items() if tx_hash in unresolved])
+
+        report = {"verified": 0, "reverted": [], "unknown": [], "retimed": [], "duplicate": [],
+                  "unrecorded": [], "unmatched": []}
+        seen = set()
+        for record in records:
+            tx_hash = record["tx_hash"].lower()
+            transfer = chain.get(tx_hash)
+            if tx_hash in seen:
+                report["duplicate"].append(record)
+            elif transfer is None or transfer["status"] is UNKNOWN_STATUS:
+                report["unknown"].append(record)
+            elif transfer["status"] != 1:
+                report["reverted"].append(record)
+            else:
+                report["verified"] += 1
+                if any(bucket_key(period, record["timestamp"]) != bucket_key(period, transfer["timestamp"])
+                       for period in PERIOD_FORMATS):
+                    report["retimed"].append(dict(record, chain_timestamp=transfer["timestamp"]))
+            seen.add(tx_hash)
+
+        unrecorded = [transfer for tx_hash, transfer in chain.items()
+                      if tx_hash not in seen and transfer["status"] == 1 and transfer["agent"].lower() in self.agents]
+        payments = self.journal.payments_by_hash(transfer["tx_hash"] for transfer in unrecorded)
+        for transfer in unrecorded:
+            entry = payments.get(transfer["tx_hash"])
+            if entry is None:
+                report["unmatched"].append(transfer)
+            else:
+                report["unrecorded"].append(dict(transfer, amount=entry["amount"], key=entry["key"]))
+
+        if fix:
+            self.ledger.apply_corrections(
+                remove=[record["id"] for record in report["reverted"] + report["duplicate"]],
+                retime=[(record["id"], record["chain_timestamp"]) for record in report["retimed"]],
+                add=[(transfer["agent"], transfer["amount"], transfer["timestamp"], transfer["to_addr"],
+                      transfer["tx_hash"]) for transfer in report["unrecorded"]])
+        return report
+
+
+def print_report(report, fixed):
+    print(f"✅ {report['verified']} ledger records match the chain")
+    findings = (("reverted", "records of reverted transactions"),
+                ("duplicate", "records with a duplicated transaction hash"),
+                ("retimed", "records whose day/month differs from the block time"),
+                ("unrecorded", "confirmed transfers missing from the ledger (amount from the journal)"))
+    for name, description in findings:
+        if report[name]:
+            print(f"{'📝' if fixed else '⚠️ '} {len(report[name])} {description}"
+                  + (" - corrected" if fixed else ""))
+    if report["unknown"]:
+        print(f"⚠️  {len(report['unknown'])} records of transactions the node returns no receipt for "
+              f"(not corrected, verify again later): {[r['tx_hash'] for r in report['unknown'][:10]]}")
+    if report["unmatched"]:
+        print(f"⚠️  {len(report['unmatched'])} confirmed transfers are in neither the ledger nor the journal "
+              f"(amount unknown, not corrected): {[t['tx_hash'] for t in report['unmatched'][:10]]}")
+    if not fixed and any(report[name] for name, _ in findings):
+        print("Run with --fix to correct the ledger and rebuild the spend buckets")
+
+
+def load_agents(ledger):
+    """Agent addresses from the environment keys and the ledger"""
+    from eth_account import Account
+    from agent_pool import load_agent_keys
+    agents = {Account.from_key(key).address for key in load_agent_keys()}
+    agents |= {record["agent"] for record in ledger.transaction_records()}
+    return sorted(agents)
+
+
+async def main_async(args):
+    import pay
+    from ledger import SpendingLedger
+    from journal import PaymentJournal
+
+    ledger = SpendingLedger(args.db)
+    agents = load_agents(ledger)
+    if not agents:
+        print("❌ No agents to index: set ETH_PRIVATE_KEY (or AGENT_KEYS) or record payments first")
+        sys.exit(1)
+    indexer = ReconciliationIndexer(pay.RPC_URL, pay.LITE_ADDR, ledger, PaymentJournal(args.db), agents)
+    if args.command == "verify":
+        print_report(await indexer.verify(fix=args.fix), args.fix)
+        return
+    while True:
+        started = time.monotonic()
+        stats = await indexer.scan(args.from_block, args.to_block, quiet=args.follow and args.from_block is None)
+        args.from_block = None
+        if stats["blocks"] and not (args.follow and not stats["transfers"]):
+            elapsed = time.monotonic() - started
+            print(f"✅ Indexed {stats['blocks']} blocks in {elapsed:.1f}s, {stats['transfers']} transfers, "
+                  f"checkpoint {stats['checkpoint']}")
+        if stats["transfers"] or not args.follow:
+            print_report(await indexer.verify(fix=args.fix, quiet=args.follow), args.fix)
+        if not args.follow:
+            return
+        await asyncio.sleep(CONFIRMATION_POLL_INTERVAL)
+
+
+def main():
+    from pay import LEDGER_DB_FILE
+    parser = argparse.ArgumentParser(description='Reconcile the spending ledger with the chain')
+    parser.add_argument('command', choices=['scan', 'verify'],
+                        help='scan: index new blocks, then verify; verify: check the ledger only')
+    parser.add_argument('--db', type=str, default=LEDGER_DB_FILE,
+                        help=f'Ledger database (default: {LEDGER_DB_FILE})')
+    parser.add_argument('--from-block', type=int,
+                        help='First block to scan (default: after the checkpoint)')
+    parser.add_argument('--to-block', type=int,
+                        help='Last block to scan (default: the latest confirmed block)')
+    parser.add_argument('--follow', '-f', action='store_true',
+                        help='Keep scanning new blocks')
+    parser.add_argument('--fix', action='store_true',
+                        help='Correct the ledger and rebuild the spend buckets')
+    args = parser.parse_args()
+
+    from async_pay import run
+    try:
+        run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Write-ahead payment journal backed by SQLite
+
+Every payment is recorded under an idempotency key before anything irreversible
+happens, and moves through the states
+
+    planned     accepted, nothing signed yet
+    signed      raw transaction stored (before it is broadcast)
+    sent        broadcast, waiting for confirmation
+    confirmed   mined with status 1 and recorded in the ledger
+    failed      definitely not executed (rejected before signing, or reverted)
+
+A payment whose key is already signed, sent or confirmed is never paid again,
+so a crashed batch can be re-run as is. "main.py resume" reconciles the signed
+and sent entries against the chain in bulk and pays the planned ones.
+
+A planned entry is leased to the process that planned it (host, pid and
+time), so two processes given the same key cannot both pay it: the second
+one backs off while the lease is fresh and its holder is alive.
+
+The journal lives in the ledger database, next to the spending records.
+
+Settings can be overridden with environment variables:
+    JOURNAL_LEASE   Seconds a planned entry stays leased to its process (default: 600)
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import threading
+
+PLANNED = "planned"
+SIGNED = "signed"
+SENT = "sent"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+# Broadcast, or possibly broadcast: only the chain knows whether they executed
+IN_FLIGHT = (SIGNED, SENT)
+
+JOURNAL_LEASE = float(os.getenv("JOURNAL_LEASE", 600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payment_journal (
+    key TEXT PRIMARY KEY,
+    name TEXT,
+    amount REAL NOT NULL,
+    to_addr TEXT,
+    agent TEXT,
+    state TEXT NOT NULL,
+    nonce INTEGER,
+    tx_hash TEXT,
+    error TEXT,
+    owner TEXT,
+    lease_at REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_journal_state ON payment_journal (state);
+CREATE TABLE IF NOT EXISTS journal_transactions (
+    tx_hash TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    raw_tx TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_journal_tx_key ON journal_transactions (key);
+"""
+# Columns added since the first schema, created on journals that predate them
+LEASE_COLUMNS = (("owner", "TEXT"), ("lease_at", "REAL"))
+
+
+def process_owner():
+    """Lease owner id of the current process"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_alive(owner):
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        # Another machine's process: only the lease time tells
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class PaymentJournal:
+    """
+    Payment states keyed by idempotency key
+
+    Connections are per thread, in WAL mode like the spending ledger, so a
+    state change costs one small synchronous write.
+    """
+
+    def __init__(self, path, lease=JOURNAL_LEASE):
+        """
+        Open (and create if needed) the journal tables
+
+        Args:
+            path (str): SQLite database file
+            lease (float): Seconds a planned entry stays leased to this process
+        """
+        self.path = path
+        self.lease = lease
+        self.owner = process_owner()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(payment_journal)")}
+            for column, kind in LEASE_COLUMNS:
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE payment_journal ADD COLUMN {column} {kind}")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """
+        Get the entry of an idempotency key
+
+        Returns:
+            dict: Journal entry, or None
+        """
+        row = self._connect().execute("SELECT * FROM payment_journal WHERE key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def begin(self, key, name, amount):
+        """
+        Plan a payment unless its key was already signed, sent or confirmed
+
+        A failed entry, or a planned one left by a crashed run, is planned again
+        and leased to this process. A planned entry leased to another process
+        is left alone while the lease is fresh and that process is alive.
+
+        Args:
+            key (str): Idempotency key
+            name (str): Recipient name
+            amount (float): Amount in USDT
+
+        Returns:
+            dict: The existing entry if the payment must not be made by this
+            process now, otherwise None
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM payment_journal WHERE key = ?", (key,)).fetchone()
+            if row is not None and row["state"] not in (PLANNED, FAILED):
+                return dict(row)
+            if (row is not None and row["state"] == PLANNED and row["owner"] and row["owner"] != self.owner
+                    and now - (row["lease_at"] or 0) < self.lease and _owner_alive(row["owner"])):
+                return dict(row)
+            conn.execute(
+                "INSERT INTO payment_journal (key, name, amount, state, owner, lease_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "name = excluded.name, amount = excluded.amount, state = excluded.state, "
+                "owner = excluded.owner, lease_at = excluded.lease_at, "
+                "to_addr = NULL, agent = NULL, nonce = NULL, tx_hash = NULL, error = NULL, "
+                "updated_at = excluded.updated_at",
+                (key, name, amount, PLANNED, self.owner, now, now, now))
+            # Transactions of an earlier attempt can no longer execute
+            conn.execute("DELETE FROM journal_transactions WHERE key = ?", (key,))
+        return None
+
+    def _update(self, key, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE payment_journal SET {columns} WHERE key = ?", (*fields.values(), key))
+
+    def add_transaction(self, key, tx_hash, nonce, raw_tx):
+        """
+        Store a signed transaction of a payment before it is broadcast
+
+        Fee bumps add further transactions on the same nonce; the entry's
+        tx_hash always points at the newest one.
+
+        Args:
+            key (str): Idempotency key
+            tx_hash (str): 0x-prefixed transaction hash
+            nonce (int): EVM nonce
+            raw_tx (bytes): Raw signed transaction
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO journal_transactions (tx_hash, key, nonce, raw_tx, created_at) "
+                "VALUES (?, ?, ?, ?, ?)", (tx_hash, key, nonce, "0x" + bytes(raw_tx).hex(), now))
+            conn.execute("UPDATE payment_journal SET tx_hash = ?, updated_at = ? WHERE key = ?",
+                         (tx_hash, now, key))
+
+    def signed(self, key, agent, to_addr, nonce, tx_hash, raw_tx):
+        """
+        Record the first signed transaction of a payment (write-ahead of the broadcast)
+        """
+        self.add_transaction(key, tx_hash, nonce, raw_tx)
+        self._update(key, state=SIGNED, agent=agent, to_addr=to_addr, nonce=nonce)
+
+    def sent(self, key):
+        self._update(key, state=SENT)
+
+    def confirmed(self, key, tx_hash):
+        self._update(key, state=CONFIRMED, tx_hash=tx_hash, error=None)
+
+    def failed(self, key, error):
+        self._update(key, state=FAILED, error=error)
+
+    def replan(self, key, error=None):
+        """
+        Plan a payment again whose transactions can no longer execute
+        """
+        self._update(key, state=PLANNED, nonce=None, tx_hash=None, error=error, owner=None, lease_at=None)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM journal_transactions WHERE key = ?", (key,))
+
+    def entries(self, states):
+        """
+        Get the entries in some states, oldest first
+
+        Args:
+            states (tuple): Journal states
+
+        Returns:
+            list: Entry dicts
+        """
+        placeholders = ", ".join("?" for _ in states)
+        rows = self._connect().execute(
+            f"SELECT * FROM payment_journal WHERE state IN ({placeholders}) ORDER BY created_at, key",
+            tuple(states))
+        return [dict(row) for row in rows]
+
+    def transactions(self, keys):
+        """
+        Get the signed transactions of some payments, oldest first
+
+        Returns:
+            dict: {key: [{"tx_hash", "nonce", "raw_tx"}, ...]}
+        """
+        keys = list(keys)
+        transactions = {key: [] for key in keys}
+        conn = self._connect()
+        # Stay below SQLite's bound parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(
+                f"SELECT key, tx_hash, nonce, raw_tx FROM journal_transactions WHERE key IN ({placeholders}) "
+                "ORDER BY created_at", chunk)
+            for row in rows:
+                transactions[row["key"]].append(
+                    {"tx_hash": row["tx_hash"], "nonce": row["nonce"], "raw_tx": row["raw_tx"]})
+        return transactions
+
+    def payments_by_hash(self, tx_hashes):
+        """
+        Find the payments that signed some transactions, including replacements
+
+        Returns:
+            dict: {tx_hash (lowercase): entry dict}
+        """
+        hashes = [tx_hash.lower() for tx_hash in tx_hashes]
+        found = {}
+        conn = self._connect()
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(
+                f"SELECT LOWER(t.tx_hash) AS signed_hash, p.* FROM journal_transactions t "
+                f"JOIN payment_journal p ON p.key = t.key WHERE LOWER(t.tx_hash) IN ({placeholders})", chunk)
+            for row in rows:
+                entry = dict(row)
+                found[entry.pop("signed_hash")] = entry
+        return found
+
+    def counts(self):
+        """
+        Number of entries per state
+        """
+        rows = self._connect().execute("SELECT state, COUNT(*) FROM payment_journal GROUP BY state")
+        return {state: count for state, count in rows}
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Spending ledger backed by SQLite
+
+Records are appended to an indexed table in WAL mode, so a payment costs one
+small insert instead of rewriting the whole history, and several processes can
+record payments at the same time. Per-agent day and month totals are kept in
+rolling buckets updated in the same transaction, so limit checks never scan
+the history.
+
+Usage:
+    python ledger.py migrate [JSON_FILE] [DB_FILE]
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spending_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent TEXT NOT NULL,
+    amount REAL NOT NULL,
+    timestamp INTEGER NOT NULL,
+    to_addr TEXT,
+    tx_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_spending_agent_ts ON spending_records (agent, timestamp);
+CREATE INDEX IF NOT EXISTS idx_spending_tx ON spending_records (tx_hash);
+CREATE TABLE IF NOT EXISTS spend_buckets (
+    agent TEXT NOT NULL,
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (agent, period)
+);
+CREATE TABLE IF NOT EXISTS ledger_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Bucket keys per period; they sort chronologically as strings
+PERIOD_FORMATS = {
+    "day": "%Y-%m-%d",
+    "month": "%Y-%m",
+}
+
+# Add to the current bucket, start a new one on rollover, ignore late records for past periods
+UPSERT_BUCKET = """
+INSERT INTO spend_buckets (agent, period, bucket, total) VALUES (?, ?, ?, ?)
+ON CONFLICT (agent, period) DO UPDATE SET
+    total = CASE
+        WHEN excluded.bucket = spend_buckets.bucket THEN spend_buckets.total + excluded.total
+        WHEN excluded.bucket > spend_buckets.bucket THEN excluded.total
+        ELSE spend_buckets.total
+    END,
+    bucket = MAX(spend_buckets.bucket, excluded.bucket)
+"""
+
+
+def bucket_key(period, timestamp):
+    """Bucket key of a Unix timestamp in local time, e.g. '2026-01-31' for a day"""
+    return datetime.fromtimestamp(timestamp).strftime(PERIOD_FORMATS[period])
+
+
+class SpendingLedger:
+    """
+    Append-only per-agent spending history
+
+    Each thread gets its own SQLite connection; WAL mode lets readers run
+    alongside a writer and busy_timeout serializes concurrent writers.
+    """
+
+    def __init__(self, path):
+        """
+        Open (and create if needed) the ledger database
+
+        Args:
+            path (str): SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            has_buckets = conn.execute(
+                "SELECT value FROM ledger_meta WHERE key = 'buckets_built'").fetchone()
+            if not has_buckets:
+                # Ledgers written before buckets existed: seed them from the history once
+                self._rebuild_buckets(conn)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def append(self, agent_address, amount, timestamp, to_addr=None, tx_hash=None):
+        """
+        Append one spending record
+
+        Args:
+            agent_address (str): Paying agent address
+            amount (float): Amount in USDT
+            timestamp (int): Unix timestamp of the payment
+            to_addr (str): Receiver address
+            tx_hash (str): Transaction hash
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO spending_records (agent, amount, timestamp, to_addr, tx_hash) VALUES (?, ?, ?, ?, ?)",
+                (agent_address, amount, timestamp, to_addr, tx_hash))
+            for period in PERIOD_FORMATS:
+                conn.execute(UPSERT_BUCKET, (agent_address, period, bucket_key(period, timestamp), amount))
+
+    def period_total(self, agent_address, period, timestamp):
+        """
+        Get an agent's spending in the day or month containing a timestamp
+
+        Reads a single bucket row; a bucket from an earlier period counts as zero.
+
+        Args:
+            agent_address (str): Agent address
+            period (str): "day" or "month"
+            timestamp (int): Any Unix timestamp inside the period
+
+        Returns:
+            float: Total amount in USDT
+        """
+        row = self._connect().execute(
+            "SELECT bucket, total FROM spend_buckets WHERE agent = ? AND period = ?",
+            (agent_address, period)).fetchone()
+        if row is None or row["bucket"] != bucket_key(period, timestamp):
+            return 0
+        return row["total"]
+
+    def _rebuild_buckets(self, conn):
+        now = datetime.now()
+        starts = {
+            "day": now.replace(hour=0, minute=0, second=0, microsecond=0),
+            "month": now.replace(day=1, hour=0, minute=0, second=0, microsecond=0),
+        }
+        conn.execute("DELETE FROM spend_buckets")
+        for period, start in starts.items():
+            conn.execute(
+                "INSERT INTO spend_buckets (agent, period, bucket, total) "
+                "SELECT agent, ?, ?, SUM(amount) FROM spending_records WHERE timestamp >= ? GROUP BY agent",
+                (period, start.strftime(PERIOD_FORMATS[period]), int(start.timestamp())))
+        conn.execute(
+            "INSERT OR REPLACE INTO ledger_meta (key, value) VALUES ('buckets_built', ?)",
+            (str(int(now.timestamp())),))
+
+    def rebuild_buckets(self):
+        """
+        Recompute the current day and month buckets of every agent from the records
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._rebuild_buckets(conn)
+
+    def records(self, agent_address, since=None, until=None):
+        """
+        Get the records of one agent, oldest first
+
+        Args:
+            agent_address (str): Agent address
+            since (int): Only records at or after this timestamp
+            until (int): Only records before this timestamp
+
+        Returns:
+            list: Record dicts with amount, timestamp, to_addr and tx_hash
+        """
+        query = "SELECT amount, timestamp, to_addr, tx_hash FROM spending_records WHERE agent = ?"
+        params = [agent_address]
+        if since is not None:
+            query += " AND timestamp >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND timestamp < ?"
+            params.append(until)
+        query += " ORDER BY timestamp, id"
+        return [dict(row) for row in self._connect().execute(query, params)]
+
+    def total(self, agent_address, since, until=None):
+        """
+        Sum an agent's spending over a time range using the (agent, timestamp) index
+
+        Returns:
+            float: Total amount in USDT
+        """
+        query = "SELECT COALESCE(SUM(amount), 0) FROM spending_records WHERE agent = ? AND timestamp >= ?"
+        params = [agent_address, since]
+        if until is not None:
+            query += " AND timestamp < ?"
+            params.append(until)
+        return self._connect().execute(query, params).fetchone()[0]
+
+    def has_transaction(self, tx_hash):
+        """
+        Check whether a transaction hash is already recorded
+        """
+        row = self._connect().execute(
+            "SELECT 1 FROM spending_records WHERE tx_hash = ? LIMIT 1", (tx_hash,)).fetchone()
+        return row is not None
+
+    def transaction_records(self):
+        """
+        Get every record that carries a transaction hash, oldest first
+
+        Returns:
+            list: Record dicts with id, agent, amount, timestamp, to_addr and tx_hash
+        """
+        rows = self._connect().execute(
+            "SELECT id, agent, amount, timestamp, to_addr, tx_hash FROM spending_records "
+            "WHERE tx_hash IS NOT NULL ORDER BY id")
+        return [dict(row) for row in rows]
+
+    def apply_corrections(self, remove=(), retime=(), add=()):
+        """
+        Correct the history in one transaction and recompute the buckets
+
+        Args:
+            remove (iterable): Record ids to delete
+            retime (iterable): (record id, timestamp) pairs
+            add (iterable): (agent, amount, timestamp, to_addr, tx_hash) rows to insert
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("DELETE FROM spending_records WHERE id = ?", [(record_id,) for record_id in remove])
+            conn.executemany("UPDATE spending_records SET timestamp = ? WHERE id = ?",
+                             [(timestamp, record_id) for record_id, timestamp in retime])
+            conn.executemany(
+                "INSERT INTO spending_records (agent, amount, timestamp, to_addr, tx_hash) VALUES (?, ?, ?, ?, ?)",
+                list(add))
+            self._rebuild_buckets(conn)
+
+    def all_records(self):
+        """
+        Export the whole ledger in the legacy transaction_records.json layout
+
+        Returns:
+            dict: {agent_address: [{"amount": ..., "timestamp": ...}, ...]}
+        """
+        records = {}
+        rows = self._connect().execute(
+            "SELECT agent, amount, timestamp FROM spending_records ORDER BY id")
+        for row in rows:
+            records.setdefault(row["agent"], []).append({
+                "amount": row["amount"],
+                "timestamp": row["timestamp"]
+            })
+        return records
+
+    def migrate_json(self, json_path):
+        """
+        Import a legacy transaction_records.json file once
+
+        The migration is recorded in ledger_meta, so calling this again (or from
+        another process) does not import the records twice.
+
+        Returns:
+            int: Number of records imported
+        """
+        if not os.path.exists(json_path):
+            return 0
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            done = conn.execute(
+                "SELECT value FROM ledger_meta WHERE key = 'json_migrated'").fetchone()
+            if done:
+                return 0
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Could not read {json_path}, skipping migration: {e}")
+                legacy = {}
+            rows = [
+                (agent, record["amount"], record["timestamp"])
+                for agent, agent_records in legacy.items()
+                for record in agent_records
+            ]
+            conn.executemany(
+                "INSERT INTO spending_records (agent, amount, timestamp) VALUES (?, ?, ?)", rows)
+            conn.execute(
+                "INSERT INTO ledger_meta (key, value) VALUES ('json_migrated', ?)",
+                (f"{json_path}:{len(rows)}",))
+            if rows:
+                self._rebuild_buckets(conn)
+        return len(rows)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print(__doc__)
+        sys.exit(1)
+    from pay import TRANSACTION_RECORD_FILE, LEDGER_DB_FILE
+    json_path = sys.argv[2] if len(sys.argv) > 2 else TRANSACTION_RECORD_FILE
+    db_path = sys.argv[3] if len(sys.argv) > 3 else LEDGER_DB_FILE
+    count = SpendingLedger(db_path).migrate_json(json_path)
+    print(f"✅ Migrated {count} records from {json_path} to {db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Persistent response cache and stream assembly for chat completions
+
+cached_client() wraps an OpenAI or AsyncOpenAI client so that
+chat.completions.create answers a request it has seen before (same model,
+messages, tools and parameters) from a SQLite cache instead of the network.
+Entries expire after a TTL, and the least recently used ones are evicted once
+the cache outgrows its size limit.
+
+Streaming requests (stream=True) are cached too: a miss passes the chunks
+through as they arrive and stores the assembled completion at the end, a hit
+replays it as chunks. assemble_stream() turns chunks back into a completion,
+concatenating content and tool-call argument deltas by tool-call index.
+
+Settings can be overridden with environment variables:
+    LLM_CACHE_FILE          SQLite cache file (default: llm_cache.db)
+    LLM_CACHE_TTL           Seconds a cached response is reused (default: 86400)
+    LLM_CACHE_MAX_BYTES     Total size of cached responses before eviction (default: 67108864)
+"""
+
+import os
+import json
+import time
+import hashlib
+import inspect
+import sqlite3
+import threading
+
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", "llm_cache.db")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 86400))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_responses (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_used ON llm_responses (used_at);
+"""
+
+# Request arguments that do not change the answer
+UNKEYED_ARGUMENTS = ("stream", "timeout", "extra_headers")
+
+
+def _plain(obj):
+    """JSON fallback for SDK objects in messages, e.g. assistant messages appended as returned"""
+    dump = getattr(obj, "model_dump", None)
+    if dump is not None:
+        return dump(exclude_none=True)
+    if hasattr(obj, "dict"):
+        return obj.dict(exclude_none=True)
+    return vars(obj)
+
+
+def _dump(completion):
+    return json.loads(json.dumps(completion, default=_plain))
+
+
+def request_key(kwargs):
+    """
+    Cache key of a chat.completions.create request
+
+    Returns:
+        str: SHA-256 of the canonical JSON of every answer-relevant argument
+    """
+    request = {name: value for name, value in kwargs.items() if name not in UNKEYED_ARGUMENTS}
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=_plain)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite store of completions with TTL and LRU eviction by total size
+    """
+
+    def __init__(self, path=LLM_CACHE_FILE, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES):
+        """
+        Open (and create if needed) the response cache
+
+        Args:
+            path (str): SQLite database file
+            ttl (float): Seconds an entry is valid
+            max_bytes (int): Total response size kept before the least recently used entries go
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """
+        Get a cached completion dict, or None if missing or expired
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE llm_responses SET used_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, completion):
+        """
+        Store a completion and evict expired and least recently used entries beyond max_bytes
+
+        Args:
+            key (str): Request key
+            completion: ChatCompletion or its dict form
+        """
+        response = json.dumps(_dump(completion))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO llm_responses (key, response, size, created_at, used_at) "
+                         "VALUES (?, ?, ?, ?, ?)", (key, response, len(response), now, now))
+            conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute("SELECT key, size FROM llm_responses ORDER BY used_at").fetchall()
+                evict = []
+                for old_key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evict.append((old_key,))
+                    total -= size
+                conn.executemany("DELETE FROM llm_responses WHERE key = ?", evict)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_responses")
+
+
+class StreamAssembler:
+    """
+    Accumulates chat completion chunks into one completion
+    """
+
+    def __init__(self, on_token=None):
+        """
+        Args:
+            on_token (callable): Called with each content delta as it arrives
+        """
+        self.on_token = on_token
+        self.id = None
+        self.model = None
+        self.created = None
+        self.content = []
+        self.tool_calls = {}
+        self.finish_reason = None
+
+    def add(self, chunk):
+        self.id = self.id or chunk.id
+        self.model = self.model or chunk.model
+        self.created = self.created or chunk.created
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        delta = choice.delta
+        if delta.content:
+            self.content.append(delta.content)
+            if self.on_token is not None:
+                self.on_token(delta.content)
+        # Tool calls arrive in pieces: id and name first, then argument fragments, keyed by index
+        for call in delta.tool_calls or ():
+            entry = self.tool_calls.setdefault(call.index, {"id": None, "type": "function",
+                                                            "function": {"name": "", "arguments": ""}})
+            if call.id:
+                entry["id"] = call.id
+            if call.function is not None:
+                if call.function.name:
+                    entry["function"]["name"] += call.function.name
+                if call.function.arguments:
+                    entry["function"]["arguments"] += call.function.arguments
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+
+    def completion(self):
+        """
+        Returns:
+            ChatCompletion: The assembled completion
+        """
+        from openai.types.chat import ChatCompletion
+        message = {"role": "assistant", "content": "".join(self.content) or None}
+        if self.tool_calls:
+            message["tool_calls"] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        return ChatCompletion.construct(
+            id=self.id or "", object="chat.completion", created=self.created or int(time.time()),
+            model=self.model or "", choices=[{"index": 0, "message": message,
+                                              "finish_reason": self.finish_reason or "stop"}])
+
+
+def assemble_stream(chunks, on_token=None):
+    """
+    Consume a stream of chunks and return the completion they make up
+
+    Args:
+        chunks (iterable): ChatCompletionChunk objects
+        on_token (callable): Called with each content delta as it arrives
+
+    Returns:
+        ChatCompletion: Assembled completion
+    """
+    assembler = StreamAssembler(on_token)
+    for chunk in chunks:
+        assembler.add(chunk)
+    return assembler.completion()
+
+
+async def assemble_stream_async(chunks, on_token=None):
+    """
+    Async variant of assemble_stream() for AsyncOpenAI streams
+    """
+    assembler = StreamAssembler(on_token)
+    async for chunk in chunks:
+        assembler.add(chunk)
+    return assembler.completion()
+
+
+def replay_chunks(completion):
+    """
+    Chunks that reassemble into a cached completion
+
+    Returns:
+        list: ChatCompletionChunk objects
+    """
+    from openai.types.chat import ChatCompletionChunk
+    choice = completion["choices"][0]
+    message = choice["message"]
+    delta = {"role": "assistant"}
+    if message.get("content"):
+        delta["content"] = message["content"]
+    if message.get("tool_calls"):
+        delta["tool_calls"] = [dict(call, index=index) for index, call in enumerate(message["tool_calls"])]
+    base = {"id": completion["id"], "object": "chat.completion.chunk",
+            "created": completion["created"], "model": completion["model"]}
+    return [
+        ChatCompletionChunk.construct(**base, choices=[{"index": 0, "delta": delta, "finish_reason": None}]),
+        ChatCompletionChunk.construct(**base, choices=[{"index": 0, "delta": {},
+                                                        "finish_reason": choice.get("finish_reason")}]),
+    ]
+
+
+class _CachedCompletions:
+    def __init__(self, completions, cache):
+        self._completions = completions
+        self._cache = cache
+
+    def create(self, **kwargs):
+        from openai.types.chat import ChatCompletion
+        key = request_key(kwargs)
+        cached = self._cache.get(key)
+        if kwargs.get("stream"):
+            if cached is not None:
+                return iter(replay_chunks(cached))
+            return self._record(key, self._completions.create(**kwargs))
+        if cached is not None:
+            return ChatCompletion.construct(**cached)
+        completion = self._completions.create(**kwargs)
+        self._cache.put(key, completion)
+        return completion
+
+    def _record(self, key, stream):
+        assembler = StreamAssembler()
+        for chunk in stream:
+            assembler.add(chunk)
+            yield chunk
+        self._cache.put(key, assembler.completion())
+
+
+class _AsyncCachedCompletions(_CachedCompletions):
+    async def create(self, **kwargs):
+        from openai.types.chat import ChatCompletion
+        key = request_key(kwargs)
+        cached = self._cache.get(key)
+        if kwargs.get("stream"):
+            if cached is not None:
+                return self._replay(cached)
+            return self._record(key, await self._completions.create(**kwargs))
+        if cached is not None:
+            return ChatCompletion.construct(**cached)
+        completion = await self._completions.create(**kwargs)
+        self._cache.put(key, completion)
+        return completion
+
+    async def _replay(self, cached):
+        for chunk in replay_chunks(cached):
+            yield chunk
+
+    async def _record(self, key, stream):
+        assembler = StreamAssembler()
+        async for chunk in stream:
+            assembler.add(chunk)
+            yield chunk
+        self._cache.put(key, assembler.completion())
+
+
+class _Namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class CachedClient:
+    """
+    Client whose chat.completions.create goes through a ResponseCache
+
+    Every other attribute is the wrapped client's.
+    """
+
+    def __init__(self, client, cache):
+        self._client = client
+        self.cache = cache
+        completions = client.chat.completions
+        is_async = inspect.iscoroutinefunction(inspect.unwrap(completions.create))
+        wrapper = _AsyncCachedCompletions if is_async else _CachedCompletions
+        self.chat = _Namespace(completions=wrapper(completions, cache))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def cached_client(client, cache=None):
+    """
+    Wrap an OpenAI or AsyncOpenAI client with a persistent response cache
+
+    Args:
+        client: OpenAI or AsyncOpenAI client
+        cache (ResponseCache): Cache to use (default: LLM_CACHE_FILE with the env settings)
+
+    Returns:
+        CachedClient: Drop-in replacement for the client
+    """
+    return CachedClient(client, cache if cache is not None else ResponseCache())
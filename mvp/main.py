@@ -4,24 +4,159 @@ Main entry point for executing privacy payments on KiteAI Testnet
 
 Usage:
     python main.py [OPTIONS]
+    python main.py serve [SERVE OPTIONS]
+    python main.py resume [--concurrency N]
 
 Options:
     --recipient, -r     Recipient name from address book (default: target)
     --amount, -a        Amount to send in USDT (default: 1.0)
-    --private-key, -k   Ethereum private key (optional, uses ETH_PRIVATE_KEY env var if not provided)
+    --private-key, -k   Pay from this key only (default: the agent pool from ETH_PRIVATE_KEY,
+                        HR_AGENT_KEY, PAYROLL_AGENT_KEY, EMPLOYEE_AGENT_KEY and AGENT_KEYS)
+    --key               Idempotency key; a key already paid is not paid again
+    --batch, -b         CSV file with "name,amount[,key]" rows to pay as one batch
+    --concurrency, -c   Maximum number of batch payments in flight (default: 64)
+    --recipients        CSV/JSON recipients file (name,address[,whitelisted]) to load
+    --whitelist         File with one whitelisted address per line
+    --quiet, -q         Suppress per-payment progress messages
+    --metrics-port      Serve Prometheus metrics on this port while paying (default: METRICS_PORT env var)
+    --metrics-out       Append per-stage latency metrics to this JSON-lines file
 
 Example:
     python main.py --recipient target --amount 1.0
+    python main.py --batch payroll.csv
+    python main.py --batch payroll.csv --quiet --metrics-out metrics.jsonl
+    python main.py serve --port 8700 --spool payments.jsonl
+    python main.py resume
+
+Run "python main.py serve --help" for the daemon options. "resume" finishes the
+payments of a crashed run from the payment journal.
 """
 
 import os
 import sys
+import csv
 import argparse
-from pay import pay, connect_and_check, address_book
+from pay import pay, pay_batch, connect_and_check, get_directory
+from agent_pool import load_agent_keys
+
+
+def load_batch_file(path):
+    """Read payroll entries from a CSV file with name,amount columns and an optional key column"""
+    entries = []
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            entries.append({"name": row["name"].strip(), "amount": float(row["amount"]),
+                            "key": (row.get("key") or "").strip() or None})
+    return entries
+
+
+def load_directory(recipients_file=None, whitelist_file=None):
+    """Load the recipient directory, with extra files given on the command line"""
+    directory = get_directory()
+    if recipients_file or whitelist_file:
+        count = directory.load(recipients_file, whitelist_file)
+        print(f"✅ Loaded {count} recipients")
+    return directory
+
+
+def available_recipients(directory, limit=20):
+    names = directory.names()
+    return names[:limit] + ([f"... {len(names) - limit} more"] if len(names) > limit else [])
+
+
+def serve(argv):
+    """Run the resident payment daemon (see daemon.py)"""
+    parser = argparse.ArgumentParser(prog='main.py serve',
+                                     description='Run the payment daemon with warm connections')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='HTTP listen address (default: 127.0.0.1)')
+    parser.add_argument('--port', '-p', type=int, default=8700,
+                        help='HTTP listen port (default: 8700)')
+    parser.add_argument('--socket', '-s', type=str,
+                        help='Listen on this Unix socket instead of TCP')
+    parser.add_argument('--spool', type=str,
+                        help='JSON-lines file to read payment jobs from')
+    parser.add_argument('--no-http', action='store_true',
+                        help='Only read jobs from the spool file')
+    parser.add_argument('--workers', '-w', type=int, default=64,
+                        help='Jobs processed concurrently (default: 64)')
+    parser.add_argument('--private-key', '-k', type=str,
+                        help='Pay from this key only (default: the agent pool from ETH_PRIVATE_KEY, '
+                             'HR_AGENT_KEY, PAYROLL_AGENT_KEY, EMPLOYEE_AGENT_KEY and AGENT_KEYS)')
+    parser.add_argument('--recipients', type=str,
+                        help='CSV/JSON recipients file to load on top of the address book (default: RECIPIENTS_FILE)')
+    parser.add_argument('--whitelist', type=str,
+                        help='Whitelist file to load on top of the built-in whitelist (default: WHITELIST_FILE)')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Suppress per-payment progress messages')
+    args = parser.parse_args(argv)
+
+    if args.no_http and not args.spool:
+        print("❌ --no-http needs a --spool file to read jobs from")
+        sys.exit(1)
+    private_keys = [args.private_key] if args.private_key else load_agent_keys()
+    if not private_keys:
+        print("❌ Ethereum private key not found")
+        print("Please provide it via --private-key option or set ETH_PRIVATE_KEY environment variable")
+        sys.exit(1)
+    if args.quiet:
+        from console import set_quiet
+        set_quiet()
+
+    try:
+        load_directory(args.recipients, args.whitelist)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"❌ Failed to load recipient directory: {e}")
+        sys.exit(1)
+
+    from async_pay import run
+    from daemon import PaymentDaemon
+
+    connect_and_check()
+    daemon = PaymentDaemon(private_keys, workers=args.workers, spool=args.spool)
+    run(daemon.serve(host=args.host, port=None if args.no_http else args.port, unix_socket=args.socket))
+
+
+def resume(argv):
+    """Reconcile in-flight payments from the journal and pay the unfinished ones"""
+    parser = argparse.ArgumentParser(prog='main.py resume',
+                                     description='Finish the payments of a crashed run from the payment journal')
+    parser.add_argument('--concurrency', '-c', type=int,
+                        help='Maximum number of payments in flight (default: 64)')
+    parser.add_argument('--private-key', '-k', type=str,
+                        help='Pay from this key only (default: the agent pool from ETH_PRIVATE_KEY, '
+                             'HR_AGENT_KEY, PAYROLL_AGENT_KEY, EMPLOYEE_AGENT_KEY and AGENT_KEYS)')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Suppress per-payment progress messages')
+    args = parser.parse_args(argv)
+
+    if not args.private_key and not load_agent_keys():
+        print("❌ Ethereum private key not found")
+        print("Please provide it via --private-key option or set ETH_PRIVATE_KEY environment variable")
+        sys.exit(1)
+    if args.quiet:
+        from console import set_quiet
+        set_quiet()
+
+    from pay import resume as resume_payments
+
+    connect_and_check()
+    results = resume_payments(concurrency=args.concurrency, private_key=args.private_key)
+    for r in results:
+        print(f"  {r['name']}: {r['amount']} USDT - {r['status']}"
+              + (f" ({r['error']})" if r['error'] else "")
+              + (f" {r['tx_hash']}" if r['tx_hash'] else ""))
 
 
 def main():
     """Main function to execute privacy payment"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        serve(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'resume':
+        resume(sys.argv[2:])
+        return
+
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Execute privacy payment on KiteAI Testnet')
     parser.add_argument('--recipient', '-r', type=str, default='target',
@@ -29,32 +164,85 @@ def main():
     parser.add_argument('--amount', '-a', type=float, default=1.0,
                         help='Amount to send in USDT (default: 1.0)')
     parser.add_argument('--private-key', '-k', type=str,
-                        help='Ethereum private key (optional, uses ETH_PRIVATE_KEY env var if not provided)')
+                        help='Pay from this key only (default: the agent pool from ETH_PRIVATE_KEY, '
+                             'HR_AGENT_KEY, PAYROLL_AGENT_KEY, EMPLOYEE_AGENT_KEY and AGENT_KEYS)')
+    parser.add_argument('--key', type=str,
+                        help='Idempotency key; a key already paid is not paid again')
+    parser.add_argument('--batch', '-b', type=str,
+                        help='CSV file with "name,amount[,key]" rows to pay as one batch')
+    parser.add_argument('--concurrency', '-c', type=int,
+                        help='Maximum number of batch payments in flight (default: 64)')
+    parser.add_argument('--recipients', type=str,
+                        help='CSV/JSON recipients file to load on top of the address book (default: RECIPIENTS_FILE)')
+    parser.add_argument('--whitelist', type=str,
+                        help='Whitelist file to load on top of the built-in whitelist (default: WHITELIST_FILE)')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Suppress per-payment progress messages')
+    parser.add_argument('--metrics-port', type=int, default=os.getenv("METRICS_PORT") or None,
+                        help='Serve Prometheus metrics on this port while paying (default: METRICS_PORT)')
+    parser.add_argument('--metrics-out', type=str,
+                        help='Append per-stage latency metrics to this JSON-lines file')
     
     args = parser.parse_args()
-    
+
+    try:
+        directory = load_directory(args.recipients, args.whitelist)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"❌ Failed to load recipient directory: {e}")
+        sys.exit(1)
+
+    entries = None
+    if args.batch:
+        try:
+            entries = load_batch_file(args.batch)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"❌ Failed to read batch file {args.batch}: {e}")
+            sys.exit(1)
+        unknown = [e["name"] for e in entries if e["name"] not in directory]
+        if unknown:
+            print(f"❌ Recipients not found in address book: {unknown[:20]}"
+                  + (f" and {len(unknown) - 20} more" if len(unknown) > 20 else ""))
+            sys.exit(1)
     # Check if recipient exists in address book
-    if args.recipient not in address_book:
+    elif args.recipient not in directory:
         print(f"❌ Recipient '{args.recipient}' not found in address book")
-        print(f"Available recipients: {list(address_book.keys())}")
+        print(f"Available recipients: {available_recipients(directory)}")
         sys.exit(1)
     
-    # Set private key if provided
-    if args.private_key:
-        os.environ['ETH_PRIVATE_KEY'] = args.private_key
-    
     # Check if private key is available
-    if 'ETH_PRIVATE_KEY' not in os.environ:
+    if not args.private_key and not load_agent_keys():
         print("❌ Ethereum private key not found")
         print("Please provide it via --private-key option or set ETH_PRIVATE_KEY environment variable")
         sys.exit(1)
     
+    if args.quiet:
+        from console import set_quiet
+        set_quiet()
+    if args.metrics_port:
+        from metrics import start_http_server
+        start_http_server(args.metrics_port)
+        print(f"📊 Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+
     # Connect to network and check balance
     connect_and_check()
     
     # Execute payment
-    print(f"\n📤 Initiating payment of {args.amount} USDT to {args.recipient}...")
-    pay(args.recipient, args.amount)
+    if entries is not None:
+        total = sum(e["amount"] for e in entries)
+        print(f"\n📤 Initiating batch payment of {total} USDT to {len(entries)} recipients...")
+        results = pay_batch(entries, concurrency=args.concurrency, private_key=args.private_key)
+        for r in results:
+            print(f"  {r['name']}: {r['amount']} USDT - {r['status']}"
+                  + (f" ({r['error']})" if r['error'] else "")
+                  + (f" {r['tx_hash']}" if r['tx_hash'] else ""))
+    else:
+        print(f"\n📤 Initiating payment of {args.amount} USDT to {args.recipient}...")
+        pay(args.recipient, args.amount, key=args.key, private_key=args.private_key)
+
+    if args.metrics_out:
+        from metrics import registry
+        registry.dump_jsonl(args.metrics_out)
+        print(f"📊 Metrics written to {args.metrics_out}")
     
     print("\n✅ Payment process completed!")
 
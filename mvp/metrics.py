@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+In-process metrics for the payment path
+
+Each stage of a payment (limit check, state reads, gas price, witness
+signature, signing, submission, confirmation) is timed with span() and
+recorded in a latency histogram labelled by stage. The registry can be
+scraped in Prometheus text format over HTTP or dumped as JSON lines.
+
+Settings can be overridden with environment variables:
+    METRICS_PORT    Port main.py serves /metrics on while paying (same as --metrics-port),
+                    and the default port of start_http_server() (default: 9464)
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from local signing up to slow confirmations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """
+    Cumulative bucket histogram of one labelled series
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs, ending with +Inf"""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            pairs.append((bound, total))
+        pairs.append((float("inf"), self.count))
+        return pairs
+
+    def quantile(self, q):
+        """Upper bucket bound below which a fraction q of observations fall"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        for bound, total in self.cumulative():
+            if total >= rank:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of histograms and counters
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def describe(self, name, help_text):
+        """Set the HELP line of a metric"""
+        self._help[name] = help_text
+
+    def observe(self, name, value, **labels):
+        """Record one observation in the histogram series name{labels}"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        """Increment the counter series name{labels}"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    @contextmanager
+    def span(self, stage, name="payment_stage_seconds", **labels):
+        """
+        Time a block and record it under stage, also when it raises
+
+        Works in synchronous code and around awaits in coroutines alike.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, stage=stage, **labels)
+
+    def reset(self):
+        """Drop every recorded series"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """
+        Current values of every series
+
+        Returns:
+            list: One dict per series with name, type, labels and values
+        """
+        entries = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                for key, value in sorted(series.items()):
+                    entries.append({"name": name, "type": "counter", "labels": dict(key), "value": value})
+            for name, series in sorted(self._histograms.items()):
+                for key, histogram in sorted(series.items()):
+                    entries.append({
+                        "name": name, "type": "histogram", "labels": dict(key),
+                        "count": histogram.count, "sum": histogram.sum,
+                        "p50": histogram.quantile(0.5), "p99": histogram.quantile(0.99),
+                        "buckets": {("+Inf" if b == float("inf") else repr(b)): c
+                                    for b, c in histogram.cumulative()},
+                    })
+        return entries
+
+    def render_prometheus(self):
+        """
+        Render every series in the Prometheus text exposition format
+
+        Returns:
+            str: Exposition text
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, total in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', le)])} {total}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump_jsonl(self, path):
+        """
+        Append the current snapshot to a JSON-lines file, one series per line
+
+        Args:
+            path (str): Output file
+        """
+        timestamp = time.time()
+        with open(path, 'a', encoding='utf-8') as f:
+            for entry in self.snapshot():
+                entry["timestamp"] = timestamp
+                f.write(json.dumps(entry) + "\n")
+
+
+registry = MetricsRegistry()
+registry.describe("payment_stage_seconds", "Latency of each stage of the payment path")
+registry.describe("payments_total", "Finished payments by status")
+
+span = registry.span
+
+
+def start_http_server(port=None, host="127.0.0.1"):
+    """
+    Serve the registry at /metrics in Prometheus text format on a daemon thread
+
+    Args:
+        port (int): Listen port (default: METRICS_PORT)
+        host (str): Listen address
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    port = int(port if port is not None else os.getenv("METRICS_PORT", 9464))
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Local nonce management for Kite Agents
+
+Each agent sends on two nonce sequences: the EVM account nonce and the LITE
+privacy nonce that the witness signs over. Both are tracked locally so that
+many payments from one agent can be in flight at once without an RPC round
+trip per payment.
+"""
+
+import threading
+
+# Fragments of node error messages that mean our local nonce view is stale
+NONCE_ERROR_MARKERS = (
+    "nonce too low",
+    "nonce too high",
+    "invalid nonce",
+    "already known",
+    "replacement transaction underpriced",
+)
+
+
+def is_nonce_error(error):
+    """
+    Check whether an exception raised while sending was caused by a nonce conflict
+
+    Args:
+        error (Exception): Error raised by send_raw_transaction
+
+    Returns:
+        bool: True if the nonce manager should resync from the chain
+    """
+    message = str(error).lower()
+    return any(marker in message for marker in NONCE_ERROR_MARKERS)
+
+
+class NonceLane:
+    """
+    One locally tracked nonce sequence
+
+    Released nonces are handed out again before new ones, so a failed send
+    leaves no permanent gap in the sequence.
+    """
+
+    def __init__(self, next_nonce):
+        self.next_nonce = next_nonce
+        self.gaps = set()
+
+    def reserve(self):
+        if self.gaps:
+            nonce = min(self.gaps)
+            self.gaps.remove(nonce)
+            return nonce
+        nonce = self.next_nonce
+        self.next_nonce += 1
+        return nonce
+
+    def release(self, nonce):
+        if nonce >= self.next_nonce:
+            return
+        self.gaps.add(nonce)
+        # Released nonces at the top of the sequence shrink it instead of leaving gaps
+        while self.next_nonce - 1 in self.gaps:
+            self.next_nonce -= 1
+            self.gaps.remove(self.next_nonce)
+
+
+class NonceManager:
+    """
+    Hands out EVM and LITE nonces for one agent address
+
+    The manager reads both sequences from the chain on first use and after a
+    nonce error; every other reservation is served from local state.
+    """
+
+    def __init__(self, w3, lite_contract, address):
+        """
+        Initialize nonce manager
+
+        Args:
+            w3 (Web3): Web3 client used for resyncing
+            lite_contract (Contract): LITE contract instance
+            address (str): Checksummed agent address
+        """
+        self.w3 = w3
+        self.lite_contract = lite_contract
+        self.address = address
+        self.evm = None
+        self.lite = None
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """
+        Reload both nonce sequences from the chain, dropping any local gaps
+        """
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        evm_nonce = self.w3.eth.get_transaction_count(self.address, 'pending')
+        # The witness signs over the next privacy nonce, i.e. privacyNonces + 1
+        lite_nonce = self.lite_contract.functions.privacyNonces(self.address).call() + 1
+        self.evm = NonceLane(evm_nonce)
+        self.lite = NonceLane(lite_nonce)
+
+    @property
+    def synced(self):
+        """True while both sequences are tracked locally"""
+        return self.evm is not None and self.lite is not None
+
+    def seed(self, evm_nonce, lite_nonce):
+        """
+        Load the sequences from values read elsewhere (e.g. a batched state snapshot)
+
+        Sequences that are already tracked locally are left untouched, since
+        nonces may have been reserved from them since the values were read.
+
+        Args:
+            evm_nonce (int): Pending EVM account nonce
+            lite_nonce (int): Next LITE privacy nonce, i.e. privacyNonces + 1
+        """
+        with self._lock:
+            if self.evm is None:
+                self.evm = NonceLane(evm_nonce)
+            if self.lite is None:
+                self.lite = NonceLane(lite_nonce)
+
+    def invalidate(self):
+        """
+        Force a resync on the next reservation
+        """
+        with self._lock:
+            self.evm = None
+            self.lite = None
+
+    def reserve_evm(self):
+        """
+        Reserve the next EVM account nonce
+
+        Returns:
+            int: Nonce to use for the transaction
+        """
+        with self._lock:
+            if self.evm is None:
+                self._sync_locked()
+            return self.evm.reserve()
+
+    def reserve_lite(self):
+        """
+        Reserve the next LITE privacy nonce for a witness signature request
+
+        Returns:
+            int: Nonce to send to /api/sign_transfer
+        """
+        with self._lock:
+            if self.lite is None:
+                self._sync_locked()
+            return self.lite.reserve()
+
+    def release_evm(self, nonce):
+        """
+        Return an EVM nonce whose transaction was never broadcast
+        """
+        with self._lock:
+            if self.evm is not None:
+                self.evm.release(nonce)
+
+    def release_lite(self, nonce):
+        """
+        Return a LITE nonce whose transfer was never broadcast
+        """
+        with self._lock:
+            if self.lite is not None:
+                self.lite.release(nonce)
+
+    def handle_send_error(self, error, evm_nonce=None, lite_nonce=None):
+        """
+        Give back the nonces of a failed send and resync if the node rejected the nonce
+
+        Args:
+            error (Exception): Error raised while sending
+            evm_nonce (int): EVM nonce reserved for the failed transaction
+            lite_nonce (int): LITE nonce reserved for the failed transaction
+        """
+        if is_nonce_error(error):
+            print(f"⚠️  Nonce conflict for {self.address}, resyncing from chain: {error}")
+            self.invalidate()
+            return
+        if evm_nonce is not None:
+            self.release_evm(evm_nonce)
+        if lite_nonce is not None:
+            self.release_lite(lite_nonce)
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_nonce_manager(w3, lite_contract, address):
+    """
+    Get the process-wide nonce manager for an agent address
+
+    Args:
+        w3 (Web3): Web3 client used for resyncing
+        lite_contract (Contract): LITE contract instance
+        address (str): Checksummed agent address
+
+    Returns:
+        NonceManager: Shared manager for the address
+    """
+    with _managers_lock:
+        manager = _managers.get(address)
+        if manager is None:
+            manager = NonceManager(w3, lite_contract, address)
+            _managers[address] = manager
+        return manager
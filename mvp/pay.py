@@ -1,10 +1,8 @@
-from web3 import Web3
 import os
-import requests
-import json
-from datetime import datetime, timedelta
+import threading
+from chain_cache import chain_cache, checksum
 
-LITE_API = "https://pusdc-kite-testnet.zentra.dev"
+LITE_API = os.getenv("KITE_LITE_API", "https://pusdc-kite-testnet.zentra.dev")
 
 # 限额配置
 LIMITS = {
@@ -13,8 +11,10 @@ LIMITS = {
     "monthly": 50000             # 月限额
 }
 
-# 交易记录存储文件
+# 交易记录存储文件（旧版JSON，首次打开账本时自动迁移）
 TRANSACTION_RECORD_FILE = "transaction_records.json"
+# 交易账本数据库
+LEDGER_DB_FILE = "transaction_records.db"
 
 # 白名单配置
 WHITELIST = {
@@ -22,94 +22,128 @@ WHITELIST = {
     "time_windows": ["00:00-23:59"]  # 24小时允许交易
 }
 
+_ledger = None
+_ledger_lock = threading.Lock()
+
+def get_ledger():
+    """
+    获取交易账本（首次调用时迁移旧版JSON记录）
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            from ledger import SpendingLedger
+            ledger = SpendingLedger(LEDGER_DB_FILE)
+            migrated = ledger.migrate_json(TRANSACTION_RECORD_FILE)
+            if migrated:
+                print(f"📝 Migrated {migrated} records from {TRANSACTION_RECORD_FILE}")
+            _ledger = ledger
+        return _ledger
+
 def load_transaction_records():
     """
     加载交易记录
     """
-    if os.path.exists(TRANSACTION_RECORD_FILE):
-        try:
-            with open(TRANSACTION_RECORD_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    return get_ledger().all_records()
 
-def save_transaction_record(agent_address, amount, timestamp):
+def save_transaction_record(agent_address, amount, timestamp, to_addr=None, tx_hash=None):
     """
     保存交易记录
     """
-    records = load_transaction_records()
-    if agent_address not in records:
-        records[agent_address] = []
-    records[agent_address].append({
-        "amount": amount,
-        "timestamp": timestamp
-    })
-    with open(TRANSACTION_RECORD_FILE, 'w', encoding='utf-8') as f:
-        json.dump(records, f, ensure_ascii=False, indent=2)
+    get_ledger().append(agent_address, amount, timestamp, to_addr=to_addr, tx_hash=tx_hash)
+
+_journal = None
+
+def get_journal():
+    """
+    获取支付日志（预写日志，与交易账本共用数据库）
+    """
+    global _journal
+    with _ledger_lock:
+        if _journal is None:
+            from journal import PaymentJournal
+            _journal = PaymentJournal(LEDGER_DB_FILE)
+        return _journal
+
+_limiter = None
 
-def check_limits(agent_address, amount):
+def get_limiter():
+    """
+    获取限额检查器（基于账本的日/月累计桶）
+    """
+    global _limiter
+    if _limiter is None:
+        ledger = get_ledger()
+        with _ledger_lock:
+            if _limiter is None:
+                from spend_limits import SpendLimiter
+                _limiter = SpendLimiter(ledger, LIMITS)
+    return _limiter
+
+def check_limits(agent_address, amount, pending=0):
     """
     检查交易限额
+
+    pending: 同一批次中已计划但尚未记录的金额
     """
-    # 1. 检查单笔限额
-    if amount > LIMITS["single_transaction"]:
-        print(f"❌ 超出单笔限额 {LIMITS['single_transaction']} USDT")
+    violation = get_limiter().check(agent_address, amount, pending=pending)
+    if violation:
+        print(f"❌ {violation}")
         return False
-    
-    # 2. 检查日限额
-    now = datetime.now()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_start_timestamp = int(today_start.timestamp())
-    
-    records = load_transaction_records()
-    daily_amount = 0
-    monthly_amount = 0
-    
-    if agent_address in records:
-        for record in records[agent_address]:
-            record_time = datetime.fromtimestamp(record["timestamp"])
-            # 计算日累计
-            if record["timestamp"] >= today_start_timestamp:
-                daily_amount += record["amount"]
-            # 计算月累计
-            if (now.year == record_time.year and 
-                now.month == record_time.month):
-                monthly_amount += record["amount"]
-    
-    # 检查日限额
-    if daily_amount + amount > LIMITS["daily"]:
-        print(f"❌ 超出日限额 {LIMITS['daily']} USDT")
-        print(f"今日已使用: {daily_amount} USDT, 本次尝试: {amount} USDT")
-        return False
-    
-    # 检查月限额
-    if monthly_amount + amount > LIMITS["monthly"]:
-        print(f"❌ 超出月限额 {LIMITS['monthly']} USDT")
-        print(f"本月已使用: {monthly_amount} USDT, 本次尝试: {amount} USDT")
-        return False
-    
     return True
 
+def reserve_limits(agent_address, amount):
+    """
+    检查交易限额并预留额度，直到交易确认（commit）或失败（release）
+
+    Returns:
+        SpendReservation: 预留凭证，超出限额时返回 None
+    """
+    reservation, violation = get_limiter().reserve(agent_address, amount)
+    if violation:
+        print(f"❌ {violation}")
+    return reservation
+
+_directory = None
+
+def get_directory():
+    """
+    获取收款人目录（地址簿与白名单的预计算索引）
+    """
+    global _directory
+    with _ledger_lock:
+        if _directory is None:
+            from recipients import RecipientDirectory, RECIPIENTS_FILE, WHITELIST_FILE
+            _directory = RecipientDirectory(address_book, WHITELIST["receivers"],
+                                            recipients_file=RECIPIENTS_FILE, whitelist_file=WHITELIST_FILE)
+        return _directory
+
+def lookup_recipient(name):
+    """
+    按名称查找收款人（大小写不敏感），返回校验和地址，未找到时返回 None
+    """
+    return get_directory().lookup(name)
+
 def check_whitelist(to_addr):
     """
-    检查接收方是否在白名单中
+    检查接收方是否在白名单中（大小写不敏感）
     """
-    if WHITELIST["receivers"] and to_addr not in WHITELIST["receivers"]:
+    if not get_directory().is_whitelisted(to_addr):
         print(f"❌ 接收地址不在白名单中: {to_addr}")
         return False
     return True
 
-# KiteAI Testnet Settings
-RPC_URL = "https://rpc-testnet.gokite.ai/"
-CHAIN_ID = 2368
+# KiteAI Testnet Settings (environment variables point the client at another chain, e.g. the local benchmark node)
+RPC_URL = os.getenv("KITE_RPC_URL", "https://rpc-testnet.gokite.ai/")
+CHAIN_ID = int(os.getenv("KITE_CHAIN_ID", 2368))
 
-LITE_ADDR = '0x35A9b4E215c8Bf9b7bFF83Ac08aD32dEE8D19F64'
-USDT_ADDR = "0x0fF5393387ad2f9f691FD6Fd28e07E3969e27e63"
+LITE_ADDR = os.getenv("KITE_LITE_ADDR", '0x35A9b4E215c8Bf9b7bFF83Ac08aD32dEE8D19F64')
+USDT_ADDR = os.getenv("KITE_USDT_ADDR", "0x0fF5393387ad2f9f691FD6Fd28e07E3969e27e63")
 
-# Address book for recipients
+# Address book for recipients (RECIPIENTS_FILE adds a larger directory, see recipients.py)
 address_book = {
-    "target": "0x742d35Cc6634C0532925a3b844Bc454e4438f44e",  # Example address
+    'laowang': '0x35A9b4E215c8Bf9b7bFF83Ac08aD32dEE8D19F64', # Just as example, use real address here if different
+    'target': '0x376d3737Da2A540318BbA02A98f03a97d1DD8f6d', # Example employee
     "alice": "0x742d35Cc6634C0532925a3b844Bc454e4438f44e",   # Example
     "bob": "0x742d35Cc6634C0532925a3b844Bc454e4438f44e"      # Example
 }
@@ -131,168 +165,152 @@ LITE_ABI = [
     {"inputs": [], "name": "witness", "outputs": [{"name": "", "type": "address"}], "stateMutability": "view", "type": "function"}
 ]
 
-# Initialize Web3
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+def get_w3():
+    """
+    共享的Web3客户端（keep-alive连接池），首次使用时才导入web3并创建
+    """
+    from transport import get_web3
+    return get_web3(RPC_URL)
 
-def connect_and_check():
-    if w3.is_connected():
-        print(f"✅ Connected to KiteAI Testnet")
-        print(f"Network ID: {w3.eth.chain_id}")
-
-        # Create USDT contract instance
-        usdt_contract = w3.eth.contract(address=USDT_ADDR, abi=ERC20_ABI)
-
-        try:
-            # Query USDT balance of LITE contract
-            balance_raw = usdt_contract.functions.balanceOf(LITE_ADDR).call()
-            try:
-                decimals = usdt_contract.functions.decimals().call()
-            except:
-                decimals = 6 # Default for USDT if call fails
-            
-            balance_formatted = balance_raw / (10 ** decimals)
-            
-            print(f"\n--- Balance Info ---")
-            print(f"LITE Contract: {LITE_ADDR}")
-            print(f"USDT Balance: {balance_formatted} USDT")
-            print(f"--------------------\n")
-        except Exception as e:
-            print(f"❌ Error querying USDT balance: {e}")
-    else:
-        print("❌ Failed to connect to KiteAI Testnet")
+def __getattr__(name):
+    # pay.w3 stays available for existing callers without importing web3 at module load
+    if name == "w3":
+        return get_w3()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-address_book = {
-    'laowang': '0x35A9b4E215c8Bf9b7bFF83Ac08aD32dEE8D19F64', # Just as example, use real address here if different
-    'target': '0x376d3737Da2A540318BbA02A98f03a97d1DD8f6d' # Example employee
-}
+def get_chain_constants():
+    """
+    链常量（chain_id、USDT decimals、LITE合约的erc20/witness/tick），进程内只读取一次
+    """
+    from state_reader import StateReader
+    return chain_cache.get("chain_constants",
+                           lambda: StateReader(RPC_URL, LITE_ADDR).chain_constants(USDT_ADDR))
 
-def pay(name, amount_human=1.0):
-    print(f"🚀 Starting payment for: {name}")
-    
-    # 1. Setup account and contract
-    private_key = os.getenv("ETH_PRIVATE_KEY")
-    if not private_key:
-        print("❌ ETH_PRIVATE_KEY not found")
-        return
+def get_lite_contract():
+    """
+    LITE合约对象（进程内复用）
+    """
+    return chain_cache.get("lite_contract",
+                           lambda: get_w3().eth.contract(address=checksum(LITE_ADDR), abi=LITE_ABI))
 
-    # Initialize Kite Agent
-    from agent import KiteAgent
-    agent = KiteAgent(private_key)
-    account_addr = w3.to_checksum_address(agent.get_address())
-    print(f"✅ Using Kite Agent with address: {account_addr}")
-    
-    # Get traditional account for fallback
-    account = w3.eth.account.from_key(private_key)
-    
-    to_addr_raw = address_book.get(name)
-    if not to_addr_raw:
-        print(f"❌ Name {name} not found in address book")
+def connect_and_check():
+    from state_reader import StateReader
+    try:
+        constants = get_chain_constants()
+        balance_raw = StateReader(RPC_URL, LITE_ADDR).token_balance(USDT_ADDR, LITE_ADDR)
+    except Exception as e:
+        print(f"❌ Failed to connect to KiteAI Testnet: {e}")
         return
-    to_addr = w3.to_checksum_address(to_addr_raw)
 
-    # 2. 检查限额
-    print("🔍 Checking transaction limits...")
-    if not check_limits(account_addr, amount_human):
-        return
-    
-    # 3. 检查白名单
-    print("🔍 Checking whitelist...")
-    if not check_whitelist(to_addr):
-        return
+    print(f"✅ Connected to KiteAI Testnet")
+    print(f"Network ID: {constants['chain_id']}")
 
-    lite_contract = w3.eth.contract(address=w3.to_checksum_address(LITE_ADDR), abi=LITE_ABI)
-    
-    # Convert amount to internal representation (assuming 6 decimals for USDT)
-    amount_parsed = int(amount_human * 10**6)
+    decimals = constants["decimals"]
+    if decimals is None:
+        decimals = 6 # Default for USDT if call fails
 
-    try:
-        # Fetch current state from contract
-        print("📡 Fetching nonces and balances...")
-        sender_nonce = lite_contract.functions.privacyNonces(account_addr).call()
-        sender_balance = lite_contract.functions.privacyBalances(account_addr).call()
-        receiver_balance = lite_contract.functions.privacyBalances(to_addr).call()
-
-        # 2. Fetch signature from API
-        print("✍️ Requesting witness signature from API...")
-        
-        params = {
-            "from_addr": account.address,
-            "to_addr": to_addr,
-            "amount": str(amount_parsed),
-            "nonce": str(sender_nonce + 1),
-            "sender_balance": "0x" + sender_balance.hex() if sender_balance else "0x",
-            "receiver_balance": "0x" + receiver_balance.hex() if receiver_balance else "0x"
-        }
-        
-        response = requests.get(f"{LITE_API}/api/sign_transfer", params=params)
-        if response.status_code != 200:
-            print(f"❌ API Error: {response.status_code} - {response.text}")
-            return
-            
-        data = response.json()
-        print("✅ Witness signature received")
-
-        # 3. Call privacyTransfer
-        print("🔗 Building privacyTransfer transaction...")
-        
-        # Prepare arguments (ensure hex strings are converted to bytes)
-        tx_args = [
-            to_addr,
-            w3.to_bytes(hexstr=data['amount_cipher']),
-            w3.to_bytes(hexstr=data['current_sender_balance']),
-            w3.to_bytes(hexstr=data['updated_sender_balance']),
-            w3.to_bytes(hexstr=data['current_receiver_balance']),
-            w3.to_bytes(hexstr=data['updated_receiver_balance']),
-            w3.to_bytes(hexstr=data['signature'])
-        ]
-        
-        # Build transaction
-        nonce = w3.eth.get_transaction_count(account_addr)
-        
-        # Determine gas (optional: let it be estimated)
-        transaction = lite_contract.functions.privacyTransfer(*tx_args).build_transaction({
-            'chainId': CHAIN_ID,
-            'gas': 2000000, # A safe limit for privacy operations
-            'gasPrice': w3.eth.gas_price,
-            'nonce': nonce,
-            'from': account_addr
-        })
-        
-        print("🔐 Signing transaction...")
-        # Try to use Kite Agent for signing
-        try:
-            signed_tx = agent.sign_transaction(transaction)
-            if hasattr(signed_tx, 'rawTransaction'):
-                # Traditional signed transaction
-                print("📡 Sending transaction to network...")
-                tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-            else:
-                # Kite Agent signed transaction (simplified)
-                print("📡 Sending transaction to network using Kite Agent...")
-                # Fallback to traditional sending for now
-                signed_tx = w3.eth.account.sign_transaction(transaction, private_key)
-                tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        except Exception as e:
-            print(f"⚠️  Kite Agent signing failed, falling back to traditional signing: {e}")
-            signed_tx = w3.eth.account.sign_transaction(transaction, private_key)
-            tx_hash = w3.eth.send_raw_transaction(signed_tx.rawTransaction)
-        
-        print(f"⌛ Transaction sent! Hash: {tx_hash.hex()}")
-        print("Waiting for confirmation...")
-        
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-        
-        if receipt.status == 1:
-            print("✅ Transaction successful!")
-            # 保存交易记录
-            timestamp = int(datetime.now().timestamp())
-            save_transaction_record(account_addr, amount_human, timestamp)
-            print(f"📝 Transaction record saved: {amount_human} USDT to {to_addr}")
-        else:
-            print("❌ Transaction failed (status 0)")
+    balance_formatted = balance_raw / (10 ** decimals)
+
+    print(f"\n--- Balance Info ---")
+    print(f"LITE Contract: {LITE_ADDR}")
+    if constants["witness"]:
+        print(f"Witness: {constants['witness']}")
+    print(f"USDT Balance: {balance_formatted} USDT")
+    print(f"--------------------\n")
+
+def witness_params(from_addr, to_addr, amount_parsed, lite_nonce, sender_balance, receiver_balance):
+    """Query parameters of a /api/sign_transfer request"""
+    return {
+        "from_addr": from_addr,
+        "to_addr": to_addr,
+        "amount": str(amount_parsed),
+        "nonce": str(lite_nonce),
+        "sender_balance": cipher_hex(sender_balance),
+        "receiver_balance": cipher_hex(receiver_balance)
+    }
+
+def cipher_hex(cipher):
+    """Balance ciphers come back from the contract as bytes and from the API as hex strings"""
+    if isinstance(cipher, str):
+        return cipher if cipher.startswith("0x") else "0x" + cipher
+    return "0x" + cipher.hex() if cipher else "0x"
 
+def transfer_args(to_addr, data):
+    """privacyTransfer arguments from the witness signature data"""
+    # Prepare arguments (ensure hex strings are converted to bytes)
+    w3 = get_w3()
+    return [
+        to_addr,
+        w3.to_bytes(hexstr=data['amount_cipher']),
+        w3.to_bytes(hexstr=data['current_sender_balance']),
+        w3.to_bytes(hexstr=data['updated_sender_balance']),
+        w3.to_bytes(hexstr=data['current_receiver_balance']),
+        w3.to_bytes(hexstr=data['updated_receiver_balance']),
+        w3.to_bytes(hexstr=data['signature'])
+    ]
+
+def sign_transfer(agent, transaction):
+    """
+    Sign with the Kite Agent, falling back to its local account
+
+    Returns:
+        bytes: Raw signed transaction
+    """
+    # Try to use Kite Agent for signing
+    try:
+        signed_tx = agent.sign_transaction(transaction)
+        if hasattr(signed_tx, 'rawTransaction'):
+            # Traditional signed transaction
+            return signed_tx.rawTransaction
+        # Kite Agent signed transaction (simplified): fall back to traditional signing for now
     except Exception as e:
-        print(f"❌ Payment failed: {e}")
+        print(f"⚠️  Kite Agent signing failed, falling back to traditional signing: {e}")
+    return agent.account.sign_transaction(transaction).rawTransaction
+
+def pay(name, amount_human=1.0, key=None, private_key=None):
+    """
+    执行单笔隐私支付（异步支付引擎的同步封装）
+
+    key: 幂等键，同一个键的支付只会执行一次
+    private_key: 只用这个私钥支付（默认使用环境变量中的Agent池）
+
+    Returns:
+        dict: 支付结果
+    """
+    from async_pay import pay_async, run
+    return run(pay_async(name, amount_human, private_key=private_key, key=key))
+
+def pay_batch(entries, concurrency=None, private_key=None):
+    """
+    批量支付（工资发放）
+
+    All payments run concurrently on the async engine: receiver balances are read
+    in parallel, witness signatures are chained per agent while earlier transfers
+    are being sent, transactions go out with sequential nonces and receipts are
+    awaited together.
+
+    Args:
+        entries (list): (name, amount[, key]) tuples or {"name": ..., "amount": ..., "key": ...} dicts
+        concurrency (int): 同时处理的最大支付数
+        private_key (str): 只用这个私钥支付（默认使用环境变量中的Agent池）
+
+    Returns:
+        list: one result dict per entry, in input order
+    """
+    from async_pay import pay_batch_async, run, DEFAULT_CONCURRENCY
+    return run(pay_batch_async(entries, concurrency=concurrency or DEFAULT_CONCURRENCY, private_key=private_key))
+
+def resume(concurrency=None, private_key=None):
+    """
+    恢复中断的支付：按链上状态批量核对已签名/已发送的日志条目，再执行尚未开始的支付
+
+    private_key: 只用这个私钥支付（默认使用环境变量中的Agent池）
+
+    Returns:
+        list: 重新执行的支付结果
+    """
+    from async_pay import resume_async, run, DEFAULT_CONCURRENCY
+    return run(resume_async(concurrency=concurrency or DEFAULT_CONCURRENCY, private_key=private_key))
 
 if __name__ == "__main__":
     connect_and_check()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Recipient directory: address book and receiver whitelist with precomputed indexes
+
+Addresses are validated when they are loaded and checksummed (memoized) when
+first looked up, names are indexed case-insensitively and the whitelist is a
+set of lowercase addresses, so a lookup or whitelist check is a dict/set probe
+instead of a list scan plus a keccak hash, and loading the directory to
+validate a command line needs no crypto import. Reloading builds new indexes
+and swaps them in at once, so payments in flight never see a half-loaded
+directory.
+
+Recipients files are CSV with name,address columns (and an optional
+whitelisted column: 1/true/yes) or JSON, either {"name": "0x..."} or a list
+of {"name": ..., "address": ..., "whitelisted": ...} objects. Whitelist files
+hold one address per line, or a JSON list of addresses.
+
+Settings can be overridden with environment variables:
+    RECIPIENTS_FILE     Recipients file loaded on top of the built-in address book
+    WHITELIST_FILE      Whitelist file loaded on top of the built-in whitelist
+"""
+
+import os
+import re
+import csv
+import json
+import threading
+
+from chain_cache import checksum
+
+RECIPIENTS_FILE = os.getenv("RECIPIENTS_FILE")
+WHITELIST_FILE = os.getenv("WHITELIST_FILE")
+
+TRUE_VALUES = ("1", "true", "yes", "y")
+
+ADDRESS_PATTERN = re.compile(r"0x[0-9a-fA-F]{40}")
+
+
+def _truthy(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+def _address(address):
+    """Validate an address without hashing it"""
+    address = address.strip()
+    if not ADDRESS_PATTERN.fullmatch(address):
+        raise ValueError(f"Invalid address: {address!r}")
+    return address
+
+
+def read_recipients(path):
+    """
+    Read a recipients file
+
+    Args:
+        path (str): CSV or JSON file
+
+    Returns:
+        list: (name, address, whitelisted) tuples; whitelisted is None if the file does not say
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            if isinstance(data, dict):
+                return [(name, address, None) for name, address in data.items()]
+            return [(item["name"], item["address"],
+                     _truthy(item["whitelisted"]) if "whitelisted" in item else None) for item in data]
+        rows = []
+        for row in csv.DictReader(f):
+            whitelisted = row.get("whitelisted")
+            rows.append((row["name"].strip(), row["address"].strip(),
+                         _truthy(whitelisted) if whitelisted not in (None, "") else None))
+        return rows
+
+
+def read_whitelist(path):
+    """
+    Read a whitelist file
+
+    Returns:
+        list: Addresses
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith(".json"):
+            return list(json.load(f))
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+class _Index:
+    """One consistent generation of the directory's lookup tables"""
+
+    def __init__(self):
+        self.by_name = {}
+        self.by_folded_name = {}
+        self.whitelist = set()
+
+    def add(self, name, address, whitelisted=False):
+        address = _address(address)
+        # Last one wins for both lookups, so a later file entry or runtime addition
+        # replaces an earlier one however the name is cased
+        self.by_name[name] = address
+        self.by_folded_name[name.casefold()] = address
+        if whitelisted:
+            self.whitelist.add(address.lower())
+        return address
+
+
+class RecipientDirectory:
+    """
+    Name and whitelist lookups for tens of thousands of recipients
+    """
+
+    def __init__(self, address_book=None, whitelist=(), recipients_file=None, whitelist_file=None):
+        """
+        Initialize recipient directory
+
+        Args:
+            address_book (dict): Built-in {name: address} entries
+            whitelist (iterable): Built-in whitelisted addresses
+            recipients_file (str): CSV/JSON recipients file loaded on top
+            whitelist_file (str): Whitelist file loaded on top
+        """
+        self.address_book = dict(address_book or {})
+        self.whitelist = list(whitelist)
+        self.recipients_file = recipients_file
+        self.whitelist_file = whitelist_file
+        self._extra = []
+        self._lock = threading.Lock()
+        self._mtimes = {}
+        self._index = _Index()
+        self.reload()
+
+    def _build(self):
+        index = _Index()
+        for name, address in self.address_book.items():
+            index.add(name, address)
+        for address in self.whitelist:
+            index.whitelist.add(_address(address).lower())
+        if self.recipients_file:
+            for name, address, whitelisted in read_recipients(self.recipients_file):
+                index.add(name, address, whitelisted)
+        if self.whitelist_file:
+            for address in read_whitelist(self.whitelist_file):
+                index.whitelist.add(_address(address).lower())
+        for name, address, whitelisted in self._extra:
+            index.add(name, address, whitelisted)
+        return index
+
+    def _file_mtimes(self):
+        return {path: os.path.getmtime(path) for path in (self.recipients_file, self.whitelist_file)
+                if path and os.path.exists(path)}
+
+    def reload(self):
+        """
+        Re-read the directory files and swap in fresh indexes
+
+        Returns:
+            int: Number of recipients
+        """
+        with self._lock:
+            mtimes = self._file_mtimes()
+            index = self._build()
+            self._index, self._mtimes = index, mtimes
+        return len(index.by_name)
+
+    def reload_if_changed(self):
+        """
+        Reload if a directory file was modified since the last load
+
+        Returns:
+            bool: True if the directory was reloaded
+        """
+        if self._file_mtimes() == self._mtimes:
+            return False
+        self.reload()
+        return True
+
+    def load(self, recipients_file=None, whitelist_file=None):
+        """
+        Use other directory files from now on and load them
+
+        Returns:
+            int: Number of recipients
+        """
+        if recipients_file:
+            self.recipients_file = recipients_file
+        if whitelist_file:
+            self.whitelist_file = whitelist_file
+        return self.reload()
+
+    def add(self, name, address, whitelisted=False):
+        """
+        Add a recipient at runtime; it survives reloads
+
+        Returns:
+            str: Checksummed address
+        """
+        with self._lock:
+            self._extra.append((name, address, whitelisted))
+            return checksum(self._index.add(name, address, whitelisted))
+
+    def lookup(self, name):
+        """
+        Get a recipient's checksummed address, matching the name exactly or else case-insensitively
+
+        Returns:
+            str: Checksummed address, or None if the name is unknown
+        """
+        index = self._index
+        address = index.by_name.get(name)
+        if address is None:
+            address = index.by_folded_name.get(name.casefold())
+        return checksum(address) if address is not None else None
+
+    def __contains__(self, name):
+        index = self._index
+        return name in index.by_name or name.casefold() in index.by_folded_name
+
+    def __len__(self):
+        return len(self._index.by_name)
+
+    def names(self):
+        return list(self._index.by_name)
+
+    def is_whitelisted(self, address):
+        """
+        Check an address against the whitelist, case-insensitively
+
+        An empty whitelist allows every receiver.
+        """
+        whitelist = self._index.whitelist
+        return not whitelist or address.lower() in whitelist
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Constant-time spend limit checks with in-flight reservations
+"""
+
+import itertools
+import threading
+from datetime import datetime
+
+
+class SpendReservation:
+    """
+    Amount held against an agent's limits while its payment is in flight
+    """
+
+    def __init__(self, reservation_id, agent_address, amount):
+        self.id = reservation_id
+        self.agent_address = agent_address
+        self.amount = amount
+
+
+class SpendLimiter:
+    """
+    Checks single, daily and monthly limits for agents
+
+    Spent amounts come from the ledger's rolling day/month buckets (one row read
+    each), and amounts of payments that are still in flight are added on top, so
+    concurrent payments from one process cannot overshoot the limits together.
+    """
+
+    def __init__(self, ledger, limits):
+        """
+        Initialize spend limiter
+
+        Args:
+            ledger (SpendingLedger): Ledger holding the spend buckets
+            limits (dict): "single_transaction", "daily" and "monthly" limits in USDT
+        """
+        self.ledger = ledger
+        self.limits = limits
+        self._in_flight = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def in_flight(self, agent_address):
+        """
+        Get the total amount currently reserved for an agent
+        """
+        with self._lock:
+            return sum(self._in_flight.get(agent_address, {}).values())
+
+    def _violation(self, agent_address, amount, pending):
+        if amount > self.limits["single_transaction"]:
+            return f"超出单笔限额 {self.limits['single_transaction']} USDT"
+
+        now = int(datetime.now().timestamp())
+        reserved = sum(self._in_flight.get(agent_address, {}).values()) + pending
+        daily_amount = self.ledger.period_total(agent_address, "day", now) + reserved
+        monthly_amount = self.ledger.period_total(agent_address, "month", now) + reserved
+
+        if daily_amount + amount > self.limits["daily"]:
+            return (f"超出日限额 {self.limits['daily']} USDT\n"
+                    f"今日已使用: {daily_amount} USDT, 本次尝试: {amount} USDT")
+        if monthly_amount + amount > self.limits["monthly"]:
+            return (f"超出月限额 {self.limits['monthly']} USDT\n"
+                    f"本月已使用: {monthly_amount} USDT, 本次尝试: {amount} USDT")
+        return None
+
+    def check(self, agent_address, amount, pending=0):
+        """
+        Check whether an agent may spend an amount, counting in-flight reservations
+
+        Args:
+            agent_address (str): Agent address
+            amount (float): Amount in USDT
+            pending (float): Additional amount to treat as already spent
+
+        Returns:
+            str: Description of the exceeded limit, or None if the payment is allowed
+        """
+        with self._lock:
+            return self._violation(agent_address, amount, pending)
+
+    def reserve(self, agent_address, amount):
+        """
+        Check the limits and hold the amount until the payment is committed or released
+
+        Returns:
+            tuple: (SpendReservation or None, description of the exceeded limit or None)
+        """
+        with self._lock:
+            violation = self._violation(agent_address, amount, 0)
+            if violation:
+                return None, violation
+            reservation = SpendReservation(next(self._ids), agent_address, amount)
+            self._in_flight.setdefault(agent_address, {})[reservation.id] = amount
+            return reservation, None
+
+    def release(self, reservation):
+        """
+        Drop a reservation whose payment did not go through
+        """
+        with self._lock:
+            agent_reservations = self._in_flight.get(reservation.agent_address, {})
+            agent_reservations.pop(reservation.id, None)
+            if not agent_reservations:
+                self._in_flight.pop(reservation.agent_address, None)
+
+    def commit(self, reservation, timestamp, to_addr=None, tx_hash=None):
+        """
+        Record a confirmed payment in the ledger and drop its reservation
+        """
+        self.ledger.append(reservation.agent_address, reservation.amount, timestamp,
+                           to_addr=to_addr, tx_hash=tx_hash)
+        self.release(reservation)
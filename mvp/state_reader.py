@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Batched LITE state reads
+
+Reads the sender's nonces and the balance ciphers of the sender and any
+number of receivers in a single JSON-RPC batch, so a payment (or a whole
+payroll) starts from a consistent snapshot at the cost of one round trip. The
+batch reads the latest block and carries eth_blockNumber with it; pass a block
+number to pin every read to that block instead.
+"""
+
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector, to_bytes
+
+from transport import RPCError, async_rpc_batch, rpc_batch
+
+
+def encode_call(signature, arg_types=(), args=()):
+    """Calldata for a view function call, e.g. encode_call("privacyNonces(address)", ["address"], [addr])"""
+    return "0x" + (function_signature_to_4byte_selector(signature) + encode(list(arg_types), list(args))).hex()
+
+
+def decode_result(output_type, result):
+    """Decode a single return value of an eth_call"""
+    if isinstance(result, RPCError):
+        raise result
+    return decode([output_type], to_bytes(hexstr=result))[0]
+
+
+class StateSnapshot:
+    """
+    LITE state of a set of accounts at one block
+    """
+
+    def __init__(self, block_number, evm_nonce, lite_nonce, balances):
+        self.block_number = block_number
+        # Pending EVM account nonce of the sender
+        self.evm_nonce = evm_nonce
+        # privacyNonces(sender); the witness signs over lite_nonce + 1
+        self.lite_nonce = lite_nonce
+        # Balance cipher (bytes) per checksummed address
+        self.balances = balances
+
+
+class StateReader:
+    """
+    Reads LITE and token state through JSON-RPC batches
+    """
+
+    def __init__(self, rpc_url, lite_addr):
+        """
+        Initialize state reader
+
+        Args:
+            rpc_url (str): RPC endpoint
+            lite_addr (str): LITE contract address
+        """
+        self.rpc_url = rpc_url
+        self.lite_addr = lite_addr
+
+    def _eth_call(self, data, block_tag, to=None):
+        return ("eth_call", [{"to": to or self.lite_addr, "data": data}, block_tag])
+
+    def _snapshot_calls(self, sender, receivers, block_tag):
+        calls = []
+        if sender:
+            calls.append(("eth_getTransactionCount", [sender, "pending"]))
+            calls.append(self._eth_call(encode_call("privacyNonces(address)", ["address"], [sender]), block_tag))
+        for addr in receivers:
+            calls.append(self._eth_call(encode_call("privacyBalances(address)", ["address"], [addr]), block_tag))
+        return calls
+
+    def _batch_calls(self, sender, accounts, block_number):
+        # Without a block number the reads use "latest" and the block number rides in the
+        # same batch, so a snapshot never costs a second round trip
+        if block_number is not None:
+            return self._snapshot_calls(sender, accounts, hex(block_number))
+        return [("eth_blockNumber", [])] + self._snapshot_calls(sender, accounts, "latest")
+
+    def _accounts(self, sender, receivers):
+        accounts = [sender] if sender else []
+        for addr in receivers:
+            if addr not in accounts:
+                accounts.append(addr)
+        return accounts
+
+    def _snapshot(self, block_number, sender, accounts, results):
+        if block_number is None:
+            if isinstance(results[0], RPCError):
+                raise results[0]
+            block_number = int(results[0], 16)
+            results = results[1:]
+        evm_nonce = lite_nonce = None
+        if sender:
+            if isinstance(results[0], RPCError):
+                raise results[0]
+            evm_nonce = int(results[0], 16)
+            lite_nonce = decode_result("uint256", results[1])
+            results = results[2:]
+        balances = {addr: decode_result("bytes", result) for addr, result in zip(accounts, results)}
+        return StateSnapshot(block_number, evm_nonce, lite_nonce, balances)
+
+    def snapshot(self, sender=None, receivers=(), block_number=None):
+        """
+        Read the sender's nonces and the balance ciphers of the sender and receivers
+
+        Args:
+            sender (str): Checksummed sender address, or None to read receivers only
+            receivers (list): Checksummed receiver addresses
+            block_number (int): Block to pin the reads to (default: the latest block, read in
+                the same batch)
+
+        Returns:
+            StateSnapshot: Consistent view of the accounts
+        """
+        accounts = self._accounts(sender, receivers)
+        calls = self._batch_calls(sender, accounts, block_number)
+        return self._snapshot(block_number, sender, accounts, rpc_batch(self.rpc_url, calls))
+
+    async def snapshot_async(self, sender=None, receivers=(), block_number=None):
+        """
+        Async variant of snapshot() on the shared aiohttp session
+        """
+        accounts = self._accounts(sender, receivers)
+        calls = self._batch_calls(sender, accounts, block_number)
+        return self._snapshot(block_number, sender, accounts, await async_rpc_batch(self.rpc_url, calls))
+
+    def chain_constants(self, token_addr):
+        """
+        Read the values that never change on a deployed chain in one batch
+
+        Returns:
+            dict: chain_id, decimals (None if the token has no decimals()), and the
+            LITE contract's erc20, witness and tick
+        """
+        results = rpc_batch(self.rpc_url, [
+            ("eth_chainId", []),
+            self._eth_call(encode_call("decimals()"), "latest", to=token_addr),
+            self._eth_call(encode_call("erc20()"), "latest"),
+            self._eth_call(encode_call("witness()"), "latest"),
+            self._eth_call(encode_call("tick()"), "latest"),
+        ])
+        if isinstance(results[0], RPCError):
+            raise results[0]
+        constants = {"chain_id": int(results[0], 16)}
+        for key, output_type, result in (("decimals", "uint8", results[1]), ("erc20", "address", results[2]),
+                                         ("witness", "address", results[3]), ("tick", "string", results[4])):
+            try:
+                constants[key] = decode_result(output_type, result)
+            except Exception:
+                constants[key] = None
+        return constants
+
+    def token_balance(self, token_addr, holder):
+        """
+        Read an ERC20 balance
+
+        Returns:
+            int: Raw token balance
+        """
+        results = rpc_batch(self.rpc_url, [
+            self._eth_call(encode_call("balanceOf(address)", ["address"], [holder]), "latest", to=token_addr),
+        ])
+        return decode_result("uint256", results[0])
@@ -0,0 +1,14 @@
+"""
+Shared setup for the offline test suite
+
+The modules live flat in mvp/ and the local stand-ins in mvp/bench/, so both
+are put on sys.path the way running from mvp/ does.
+"""
+
+import os
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MVP_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(MVP_DIR, "bench"))
+sys.path.insert(0, MVP_DIR)
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("eth_account")
+
+import agent
+from agent import KiteAgent, shutdown_signing_pool
+
+KEY = "0x" + "be" * 32
+
+
+def transfers(count):
+    return [{"to": "0x" + "22" * 20, "value": i, "gas": 21000, "gasPrice": 10**9, "nonce": i, "chainId": 2368}
+            for i in range(count)]
+
+
+def raw(signed):
+    return [bytes(tx.rawTransaction) for tx in signed]
+
+
+def test_small_batches_are_signed_in_process(monkeypatch):
+    monkeypatch.setattr(agent, "get_signing_pool", lambda: pytest.fail("small batch used the process pool"))
+    kite = KiteAgent(KEY)
+    batch = transfers(3)
+
+    assert raw(kite.sign_transactions(batch)) == raw(kite.sign_transaction(tx) for tx in batch)
+
+
+def test_process_pool_keeps_the_input_order(monkeypatch):
+    monkeypatch.setattr(agent, "SIGNING_PROCESSES", 2)
+    kite = KiteAgent(KEY)
+    batch = transfers(20)
+    try:
+        parallel = kite.sign_transactions(batch, parallel=True)
+    finally:
+        shutdown_signing_pool()
+
+    assert raw(parallel) == raw(kite.sign_transactions(batch, parallel=False))
+    assert agent._signing_pool is None
+
+
+def test_batches_at_the_threshold_use_the_pool(monkeypatch):
+    monkeypatch.setattr(agent, "SIGNING_PROCESSES", 2)
+    monkeypatch.setattr(agent, "PARALLEL_SIGNING_THRESHOLD", 4)
+    used = []
+
+    class InlinePool:
+        def map(self, function, *arguments):
+            used.append(len(arguments[0]))
+            return map(function, *arguments)
+
+    monkeypatch.setattr(agent, "get_signing_pool", InlinePool)
+    kite = KiteAgent(KEY)
+
+    assert len(kite.sign_transactions(transfers(3))) == 3 and not used
+    assert raw(kite.sign_transactions(transfers(4))) == raw(kite.sign_transactions(transfers(4), parallel=False))
+    assert used
@@ -0,0 +1,88 @@
+import asyncio
+
+from agent_pool import AgentPool, SenderLane, load_agent_keys
+from ledger import SpendingLedger
+from spend_limits import SpendLimiter
+
+AGENTS = ["0x" + "11" * 20, "0x" + "22" * 20]
+ALICE, BOB = "0x" + "a1" * 20, "0x" + "b0" * 20
+LIMITS = {"single_transaction": 5, "daily": 10, "monthly": 100}
+
+
+def make_pool(tmp_path):
+    # Lanes built by hand: scheduling never touches the agent or its nonces
+    pool = AgentPool([], SpendLimiter(SpendingLedger(str(tmp_path / "ledger.db")), LIMITS))
+    pool.lanes = [SenderLane(None, address, None, None) for address in AGENTS]
+    pool._changed = asyncio.Condition()
+    return pool
+
+
+def test_payments_go_to_the_least_loaded_lane(tmp_path):
+    async def main():
+        pool = make_pool(tmp_path)
+        first, _ = await pool.acquire(ALICE, 1)
+        second, _ = await pool.acquire(BOB, 1)
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert {first.address, second.address} == set(AGENTS)
+
+
+def test_receiver_with_payments_in_flight_sticks_to_its_lane(tmp_path):
+    async def main():
+        pool = make_pool(tmp_path)
+        lanes = [(await pool.acquire(ALICE, 1))[0] for _ in range(3)]
+        other, _ = await pool.acquire(BOB, 1)
+        return pool, lanes, other
+
+    pool, lanes, other = asyncio.run(main())
+    # Alice's lane carries more load, yet every payment to her stays on it
+    assert lanes[0] is lanes[1] is lanes[2]
+    assert other is not lanes[0]
+    assert pool.in_flight(ALICE)
+
+
+def test_released_receiver_may_move_and_drops_its_stale_cipher(tmp_path):
+    async def main():
+        pool = make_pool(tmp_path)
+        for lane in pool.lanes:
+            lane.ciphers[ALICE] = b"chained"
+        first, _ = await pool.acquire(ALICE, 1)
+        await pool.release(first, ALICE)
+        # Load the first lane so Alice's next payment moves to the other one
+        busy, _ = await pool.acquire(BOB, 1)
+        moved, _ = await pool.acquire(ALICE, 1)
+        return pool, first, busy, moved
+
+    pool, first, busy, moved = asyncio.run(main())
+    assert busy is first and moved is not first
+    # Alice's cipher on the new lane predates the first lane's payment
+    assert ALICE not in moved.ciphers and ALICE in first.ciphers
+
+
+def test_sticky_lane_waits_for_headroom_instead_of_moving(tmp_path):
+    async def main():
+        pool = make_pool(tmp_path)
+        lane, first = await pool.acquire(ALICE, 5)
+        await pool.acquire(ALICE, 5)
+        # The lane's daily limit is held in flight; the next payment to Alice waits for it
+        waiter = asyncio.ensure_future(pool.acquire(ALICE, 5))
+        await asyncio.sleep(0.05)
+        waited = not waiter.done()
+        pool.limiter.release(first)
+        await pool.release(lane, ALICE)
+        return lane, waited, (await waiter)[0]
+
+    lane, waited, next_lane = asyncio.run(main())
+    assert waited
+    assert next_lane is lane
+
+
+def test_agent_keys_are_read_without_duplicates(monkeypatch):
+    monkeypatch.setenv("ETH_PRIVATE_KEY", "ab" * 32)
+    monkeypatch.setenv("HR_AGENT_KEY", "0x" + "ab" * 32)
+    monkeypatch.setenv("AGENT_KEYS", " 0x" + "cd" * 32 + ",,")
+    for name in ("PAYROLL_AGENT_KEY", "EMPLOYEE_AGENT_KEY"):
+        monkeypatch.delenv(name, raising=False)
+
+    assert load_agent_keys() == ["0x" + "ab" * 32, "0x" + "cd" * 32]
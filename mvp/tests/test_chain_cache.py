@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from chain_cache import ChainCache
+
+
+def test_values_without_ttl_are_kept():
+    cache = ChainCache()
+    calls = []
+    for _ in range(3):
+        assert cache.get("chain_id", lambda: calls.append(1) or 2368) == 2368
+
+    assert len(calls) == 1
+    assert cache.stats()["keys"]["chain_id"] == {"hits": 2, "misses": 1}
+
+
+def test_values_expire_after_their_ttl():
+    cache = ChainCache()
+    values = iter([1, 2])
+    assert cache.get("fee_state", lambda: next(values), ttl=0.05) == 1
+    assert cache.get("fee_state", lambda: next(values), ttl=0.05) == 1
+    time.sleep(0.1)
+    assert cache.get("fee_state", lambda: next(values), ttl=0.05) == 2
+
+
+def test_invalidate_forces_a_fetch():
+    cache = ChainCache()
+    values = iter([1, 2])
+    cache.get("fee_state", lambda: next(values))
+    cache.invalidate("fee_state")
+    assert cache.get("fee_state", lambda: next(values)) == 2
+
+
+def test_concurrent_async_misses_share_one_fetch():
+    cache = ChainCache()
+    fetches = []
+
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def burst():
+        return await asyncio.gather(*(cache.get_async("gas_price", fetch, ttl=15) for _ in range(20)))
+
+    assert asyncio.run(burst()) == [42] * 20
+    assert len(fetches) == 1
+    assert cache.get("gas_price", fetch) == 42
+
+
+def test_failed_async_fetch_is_not_cached():
+    cache = ChainCache()
+    attempts = []
+
+    async def fetch():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("node unavailable")
+        return 7
+
+    async def twice():
+        try:
+            await cache.get_async("chain_id", fetch)
+        except ConnectionError:
+            pass
+        return await cache.get_async("chain_id", fetch)
+
+    assert asyncio.run(twice()) == 7
+    assert len(attempts) == 2
@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("eth_utils")
+
+import cipher_cache
+from cipher_cache import PRIVACY_TRANSFER_SELECTOR, CipherCache
+from state_reader import StateSnapshot
+
+LITE = "0x" + "1e" * 20
+AGENT = "0x" + "11" * 20
+OTHER = "0x" + "33" * 20
+RECEIVER = "0x" + "22" * 20
+OURS, FOREIGN, BUMPED = "0x" + "01" * 32, "0x" + "02" * 32, "0x" + "03" * 32
+
+
+def checksummed(address):
+    from eth_utils import to_checksum_address
+    return to_checksum_address(address)
+
+
+def transfer(tx_hash, sender, receiver=RECEIVER, index=0):
+    return {"hash": tx_hash, "from": sender, "to": LITE, "transactionIndex": hex(index),
+            "input": PRIVACY_TRANSFER_SELECTOR + "00" * 12 + receiver[2:] + "00" * 64}
+
+
+class FakeNode:
+    """Answers the cache's block scans from an in-memory chain"""
+
+    def __init__(self):
+        self.blocks = [[]]
+
+    def mine(self, *transactions):
+        self.blocks.append(list(transactions))
+        return len(self.blocks) - 1
+
+    async def batch(self, rpc_url, calls):
+        results = []
+        for method, params in calls:
+            if method == "eth_blockNumber":
+                results.append(hex(len(self.blocks) - 1))
+            else:
+                number = int(params[0], 16)
+                results.append({"number": hex(number), "transactions": self.blocks[number]})
+        return results
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = FakeNode()
+    monkeypatch.setattr(cipher_cache, "async_rpc_batch", node.batch)
+    return node
+
+
+@pytest.fixture
+def cache():
+    return CipherCache("rpc", LITE, sync_interval=0)
+
+
+def scan(cache):
+    return asyncio.run(cache.sync())
+
+
+def test_newer_ciphers_win(cache):
+    cache.store_snapshot(StateSnapshot(5, None, None, {AGENT: b"at-5"}))
+    cache.confirmed({"blockNumber": 4, "transactionIndex": 0}, {AGENT: "0xat4"})
+    assert cache.get(AGENT) == b"at-5"
+    cache.confirmed({"blockNumber": 6, "transactionIndex": 0}, {AGENT: "0xat6"})
+    assert cache.get(AGENT) == "0xat6"
+
+
+def test_foreign_transfers_invalidate_and_ours_do_not(cache, node):
+    touched = []
+    cache.add_listener(lambda addresses: touched.append(addresses))
+    scan(cache)
+    cache.store_snapshot(StateSnapshot(0, None, None, {checksummed(AGENT): b"a", checksummed(OTHER): b"o",
+                                                       checksummed(RECEIVER): b"r"}))
+    cache.expect(OURS)
+    node.mine(transfer(OURS, AGENT))
+    scan(cache)
+    assert cache.get(checksummed(AGENT)) == b"a" and touched == []
+
+    node.mine(transfer(FOREIGN, OTHER))
+    scan(cache)
+    assert cache.get(checksummed(OTHER)) is None and cache.get(checksummed(RECEIVER)) is None
+    assert touched == [{checksummed(OTHER), checksummed(RECEIVER)}]
+    # A confirmation of an older transfer cannot bring the dropped cipher back
+    cache.confirmed({"blockNumber": 1, "transactionIndex": 0}, {checksummed(RECEIVER): "0xold"})
+    assert cache.get(checksummed(RECEIVER)) is None
+
+
+def test_resolved_payments_are_forgotten(cache, node):
+    scan(cache)
+    cache.expect(OURS)
+    cache.expect(BUMPED)
+    block = node.mine(transfer(BUMPED, AGENT))
+    # Settled before the scan reached its block: only the mined version is kept
+    cache.resolved([OURS, BUMPED], {"transactionHash": BUMPED, "blockNumber": block})
+    assert cache.stats()["expected"] == 1
+    touched = []
+    cache.add_listener(lambda addresses: touched.append(addresses))
+    scan(cache)
+    assert touched == [] and cache.stats()["expected"] == 0
+
+    # A failed payment whose transfer never reached a block
+    cache.expect(OURS)
+    cache.resolved([OURS])
+    assert cache.stats()["expected"] == 0
+
+
+def test_falling_too_far_behind_clears_the_cache(node):
+    cache = CipherCache("rpc", LITE, sync_interval=0, max_scan=2)
+    touched = []
+    cache.add_listener(lambda addresses: touched.append(addresses))
+    scan(cache)
+    cache.store(AGENT, b"a", (0, 0))
+    for _ in range(3):
+        node.mine()
+    scan(cache)
+
+    assert cache.get(AGENT) is None
+    assert touched == [None]
+    assert cache.next_block == 4
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("requests")
+
+import confirmation_tracker
+from confirmation_tracker import ConfirmationTimeout, ConfirmationTracker
+
+OK, REVERTED = "0x" + "01" * 32, "0x" + "02" * 32
+
+
+class FakeNode:
+    """Answers the tracker's JSON-RPC batches from an in-memory chain"""
+
+    def __init__(self):
+        self.blocks = [[]]
+        self.receipts = {}
+
+    def mine(self, *transactions, status=1):
+        number = len(self.blocks)
+        self.blocks.append(list(transactions))
+        for index, tx_hash in enumerate(transactions):
+            self.receipts[tx_hash] = {"transactionHash": tx_hash, "blockNumber": hex(number),
+                                      "transactionIndex": hex(index), "status": hex(status), "gasUsed": "0x5208"}
+
+    async def batch(self, rpc_url, calls):
+        results = []
+        for method, params in calls:
+            if method == "eth_blockNumber":
+                results.append(hex(len(self.blocks) - 1))
+            elif method == "eth_getBlockByNumber":
+                number = int(params[0], 16)
+                results.append({"number": hex(number), "transactions": self.blocks[number]}
+                               if number < len(self.blocks) else None)
+            else:
+                results.append(self.receipts.get(params[0]))
+        return results
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = FakeNode()
+    monkeypatch.setattr(confirmation_tracker, "async_rpc_batch", node.batch)
+    return node
+
+
+def test_successful_receipt_fires_on_confirmed(node):
+    confirmed = []
+
+    async def main():
+        tracker = ConfirmationTracker("rpc", poll_interval=0.01)
+        future = tracker.track(OK, on_confirmed=confirmed.append)
+        node.mine(OK)
+        return await asyncio.wait_for(future, 5)
+
+    receipt = asyncio.run(main())
+    assert receipt["status"] == 1 and receipt["blockNumber"] == 1
+    assert confirmed == [receipt]
+
+
+def test_reverted_receipt_resolves_without_on_confirmed(node):
+    confirmed = []
+
+    async def main():
+        tracker = ConfirmationTracker("rpc", poll_interval=0.01)
+        future = tracker.track(REVERTED, on_confirmed=confirmed.append)
+        node.mine(REVERTED, status=0)
+        return await asyncio.wait_for(future, 5)
+
+    receipt = asyncio.run(main())
+    assert receipt["status"] == 0
+    assert confirmed == []
+
+
+def test_waits_for_the_confirmation_depth(node):
+    async def main():
+        tracker = ConfirmationTracker("rpc", confirmations=3, poll_interval=0.01)
+        future = tracker.track(OK)
+        node.mine(OK)
+        node.mine()
+        await asyncio.sleep(0.1)
+        assert not future.done()
+        node.mine()
+        return await asyncio.wait_for(future, 5)
+
+    assert asyncio.run(main())["blockNumber"] == 1
+
+
+def test_unmined_transaction_times_out(node):
+    async def main():
+        tracker = ConfirmationTracker("rpc", timeout=0.05, poll_interval=0.01)
+        await tracker.wait(OK)
+
+    with pytest.raises(ConfirmationTimeout):
+        asyncio.run(main())
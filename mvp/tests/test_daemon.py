@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("eth_utils")
+pytest.importorskip("requests")
+
+import daemon
+from daemon import PaymentDaemon
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+KEY = "0x" + "be" * 32
+
+
+class UnwritableJournal:
+    def begin(self, key, name, amount):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_finished_jobs_are_forgotten_oldest_first(monkeypatch):
+    monkeypatch.setattr(daemon, "MAX_FINISHED_JOBS", 2)
+    payment_daemon = PaymentDaemon([KEY])
+    jobs = [daemon.Job(f"job-{i}", "target", 1.0, "http") for i in range(4)]
+    for job in jobs:
+        payment_daemon.jobs[job.id] = job
+    for job in jobs[:3]:
+        payment_daemon._finish(job, "confirmed")
+
+    assert list(payment_daemon.jobs) == ["job-1", "job-2", "job-3"]
+
+
+def test_unwritable_journal_is_a_retryable_503():
+    from aiohttp.test_utils import TestClient, TestServer
+
+    payment_daemon = PaymentDaemon([KEY])
+    payment_daemon.engine.journal = UnwritableJournal()
+
+    async def post():
+        payment_daemon.queue = asyncio.Queue()
+        async with TestClient(TestServer(payment_daemon._app())) as client:
+            response = await client.post("/jobs", json={"id": "j1", "name": "target", "amount": 1.0})
+            return response.status, await response.json()
+
+    status, body = asyncio.run(post())
+    assert status == 503
+    assert body["retryable"] and body["accepted"] == []
+    assert "j1" not in payment_daemon.jobs
+
+
+@pytest.fixture(scope="module")
+def network():
+    pytest.importorskip("eth_tester")
+    from local_chain import LocalChain
+    from witness_server import WitnessServer
+
+    chain = LocalChain("eth-tester", agents=1).start()
+    witness = WitnessServer(latency=0.01).start()
+    yield chain, witness
+    witness.stop()
+    chain.stop()
+
+
+class DaemonProcess:
+    def __init__(self, network, cwd, port):
+        chain, witness = network
+        env = dict(os.environ, **chain.env(), KITE_LITE_API=witness.url, ETH_PRIVATE_KEY=chain.agent_keys[0],
+                   CONFIRMATION_POLL_INTERVAL="0.1")
+        self.url = f"http://127.0.0.1:{port}"
+        self.process = subprocess.Popen([sys.executable, MAIN, "serve", "--port", str(port), "--spool",
+                                         "spool.jsonl", "-q"], cwd=str(cwd), env=env,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.request("get", "/health", wait=30)
+
+    def request(self, method, path, wait=0, **kwargs):
+        import requests
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                return getattr(requests, method)(self.url + path, timeout=10, **kwargs)
+            except requests.ConnectionError:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    raise
+                time.sleep(0.2)
+
+    def wait_for(self, job_id, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.request("get", f"/jobs/{job_id}").json()
+            if job.get("finished_at"):
+                return job
+            time.sleep(0.1)
+        raise AssertionError(f"job {job_id} did not finish")
+
+    def stop(self):
+        self.process.send_signal(signal.SIGTERM)
+        assert self.process.wait(timeout=60) == 0
+
+
+def lite_nonce(chain):
+    from eth_account import Account
+    contract = chain.w3.eth.contract(address=chain.lite_addr, abi=[{
+        "inputs": [{"name": "", "type": "address"}], "name": "privacyNonces",
+        "outputs": [{"name": "", "type": "uint256"}], "stateMutability": "view", "type": "function"}])
+    return contract.functions.privacyNonces(Account.from_key(chain.agent_keys[0]).address).call()
+
+
+def test_jobs_are_paid_once_across_restarts(network, tmp_path):
+    from local_chain import free_port
+
+    chain, _ = network
+    before = lite_nonce(chain)
+    (tmp_path / "spool.jsonl").write_text(json.dumps({"id": "spool-1", "name": "target", "amount": 0.5}) + "\n",
+                                          encoding="utf-8")
+    first = DaemonProcess(network, tmp_path, free_port())
+    try:
+        job = {"id": "http-1", "name": "target", "amount": 1.0}
+        response = first.request("post", "/jobs", json=job)
+        assert response.status_code == 202
+        # A duplicate id is the same job
+        duplicate = first.request("post", "/jobs", json=job)
+        assert duplicate.json()["created_at"] == response.json()["created_at"]
+        assert first.wait_for("http-1")["status"] == "confirmed"
+        assert first.wait_for("spool-1")["status"] == "confirmed"
+    finally:
+        first.stop()
+    assert lite_nonce(chain) == before + 2
+
+    second = DaemonProcess(network, tmp_path, free_port())
+    try:
+        # The spool offset survived the restart, and a resubmitted id replays from the journal
+        time.sleep(1.5)
+        assert second.request("get", "/jobs/spool-1").status_code == 404
+        assert second.request("post", "/jobs", json=job).status_code == 202
+        replayed = second.wait_for("http-1")
+        assert replayed["status"] == "confirmed" and replayed["tx_hash"]
+    finally:
+        second.stop()
+    assert lite_nonce(chain) == before + 2
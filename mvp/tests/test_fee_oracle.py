@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("requests")
+
+import fee_oracle
+from chain_cache import chain_cache
+from fee_oracle import FALLBACK_GAS_LIMIT, FeeOracle, is_underpriced, size_class
+from transport import RPCError
+
+GWEI = 10**9
+
+
+class FakeNode:
+    """Answers the oracle's JSON-RPC batches with a fixed fee state"""
+
+    def __init__(self, base_fee=None, tips=(), gas_price=GWEI, estimate=50000):
+        self.base_fee, self.tips, self.gas_price, self.estimate = base_fee, list(tips), gas_price, estimate
+        self.calls = []
+
+    async def batch(self, rpc_url, calls):
+        results = []
+        for method, params in calls:
+            self.calls.append(method)
+            if method == "eth_feeHistory":
+                base_fees = [] if self.base_fee is None else [hex(self.base_fee)] * 2
+                results.append({"baseFeePerGas": base_fees, "reward": [[hex(tip)] for tip in self.tips]})
+            elif method == "eth_maxPriorityFeePerGas":
+                results.append(hex(0))
+            elif method == "eth_gasPrice":
+                results.append(hex(self.gas_price))
+            elif isinstance(self.estimate, Exception):
+                results.append(self.estimate)
+            else:
+                results.append(hex(self.estimate))
+        return results
+
+
+@pytest.fixture
+def node(monkeypatch):
+    chain_cache.invalidate()
+    node = FakeNode()
+    monkeypatch.setattr(fee_oracle, "async_rpc_batch", node.batch)
+    yield node
+    chain_cache.invalidate()
+
+
+def test_size_classes_are_powers_of_two():
+    assert size_class("0x") == 256
+    assert size_class("0x" + "00" * 300) == 512
+    assert size_class("0x" + "00" * 512) == 512
+
+
+def test_eip1559_fees_from_the_fee_history(node):
+    node.base_fee, node.tips = 10 * GWEI, [1, 3, 2]
+    fees = asyncio.run(FeeOracle("rpc").fees())
+    assert fees == {"maxFeePerGas": 20 * GWEI + 2, "maxPriorityFeePerGas": 2}
+
+
+def test_gas_price_without_a_base_fee(node):
+    assert asyncio.run(FeeOracle("rpc").fees()) == {"gasPrice": GWEI}
+
+
+def test_fee_state_is_shared_until_it_expires(node):
+    oracle = FeeOracle("rpc")
+
+    async def twice():
+        return await oracle.fees(), await oracle.fees()
+
+    asyncio.run(twice())
+    assert node.calls.count("eth_feeHistory") == 1
+
+
+def test_gas_limit_is_estimated_once_per_size_class(node):
+    oracle = FeeOracle("rpc")
+    transaction = {"from": "0x" + "11" * 20, "to": "0x" + "22" * 20, "data": "0x" + "00" * 300}
+
+    async def estimate():
+        return [await oracle.gas_limit(transaction) for _ in range(3)]
+
+    limits = asyncio.run(estimate())
+    assert len(set(limits)) == 1 and limits[0] > node.estimate
+    assert node.calls.count("eth_estimateGas") == 1
+
+
+def test_failed_estimate_falls_back(node):
+    node.estimate = RPCError({"message": "execution reverted"})
+    transaction = {"from": "0x" + "11" * 20, "to": "0x" + "22" * 20, "data": "0x"}
+    assert asyncio.run(FeeOracle("rpc").gas_limit(transaction)) == FALLBACK_GAS_LIMIT
+
+
+def test_bump_raises_every_fee_by_the_replacement_margin(node):
+    node.base_fee, node.tips = GWEI, [1]
+    sent = {"nonce": 3, "maxFeePerGas": 100 * GWEI, "maxPriorityFeePerGas": 2 * GWEI}
+    replacement = asyncio.run(FeeOracle("rpc").bump(sent))
+    assert replacement["maxFeePerGas"] == 112.5 * GWEI
+    assert replacement["maxPriorityFeePerGas"] == 2.25 * GWEI
+    assert replacement["nonce"] == 3
+
+
+def test_bump_raises_a_zero_tip(node):
+    node.base_fee, node.tips = GWEI, [0]
+    sent = {"maxFeePerGas": 2 * GWEI, "maxPriorityFeePerGas": 0}
+    replacement = asyncio.run(FeeOracle("rpc").bump(sent))
+    assert replacement["maxPriorityFeePerGas"] == 1
+    assert replacement["maxFeePerGas"] == 2.25 * GWEI
+
+
+def test_bump_follows_a_higher_current_fee(node):
+    node.gas_price = 5 * GWEI
+    replacement = asyncio.run(FeeOracle("rpc").bump({"gasPrice": GWEI}))
+    assert replacement["gasPrice"] == 5 * GWEI
+
+
+def test_underpriced_errors_are_recognized():
+    assert is_underpriced(ValueError({"message": "replacement transaction underpriced"}))
+    assert is_underpriced(ValueError("transaction underpriced"))
+    assert not is_underpriced(ValueError("nonce too low"))
@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("eth_utils")
+
+import indexer
+from cipher_cache import PRIVACY_TRANSFER_SELECTOR
+from indexer import ReconciliationIndexer
+from journal import PaymentJournal
+from ledger import SpendingLedger
+
+LITE = "0x" + "1e" * 20
+AGENT = "0x" + "11" * 20
+STRANGER = "0x" + "33" * 20
+RECEIVER = "0x" + "22" * 20
+DAY = 86400
+
+
+def tx_hash(i):
+    return "0x" + format(i, "064x")
+
+
+def checksummed(address):
+    from eth_utils import to_checksum_address
+    return to_checksum_address(address)
+
+
+class FakeNode:
+    """Answers the indexer's JSON-RPC batches from an in-memory chain"""
+
+    def __init__(self):
+        self.now = int(time.time())
+        self.blocks = [{"number": "0x0", "timestamp": hex(self.now - DAY), "transactions": []}]
+        self.receipts = {}
+
+    def mine(self, *transfers):
+        """transfers: (tx hash, sender, receipt status or None for a receipt the node does not return)"""
+        number = len(self.blocks)
+        transactions = []
+        for index, (hash_, sender, status) in enumerate(transfers):
+            transactions.append({"hash": hash_, "from": sender, "to": LITE, "transactionIndex": hex(index),
+                                 "input": PRIVACY_TRANSFER_SELECTOR + "00" * 12 + RECEIVER[2:]})
+            if status is not None:
+                self.receipts[hash_] = {"transactionHash": hash_, "from": sender, "to": LITE,
+                                        "blockNumber": hex(number), "transactionIndex": hex(index),
+                                        "status": hex(status)}
+        self.blocks.append({"number": hex(number), "timestamp": hex(self.now), "transactions": transactions})
+        return number
+
+    async def batch(self, rpc_url, calls):
+        results = []
+        for method, params in calls:
+            if method == "eth_blockNumber":
+                results.append(hex(len(self.blocks) - 1))
+            elif method == "eth_getBlockByNumber":
+                number = int(params[0], 16)
+                results.append(self.blocks[number] if number < len(self.blocks) else None)
+            else:
+                results.append(self.receipts.get(params[0]))
+        return results
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = FakeNode()
+    monkeypatch.setattr(indexer, "async_rpc_batch", node.batch)
+    return node
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return SpendingLedger(str(tmp_path / "ledger.db"))
+
+
+def make_indexer(ledger):
+    journal = PaymentJournal(ledger.path)
+    return ReconciliationIndexer("rpc", LITE, ledger, journal, [AGENT], batch_size=2, concurrency=2)
+
+
+def record(ledger, i, timestamp, amount=1.0):
+    ledger.append(checksummed(AGENT), amount, timestamp, to_addr=checksummed(RECEIVER), tx_hash=tx_hash(i))
+
+
+def test_scan_indexes_our_transfers_from_the_checkpoint(node, ledger):
+    index = make_indexer(ledger)
+    node.mine((tx_hash(1), AGENT, 1), (tx_hash(2), STRANGER, 1))
+    node.mine((tx_hash(3), AGENT, 0))
+
+    stats = asyncio.run(index.scan(from_block=0))
+
+    assert stats == {"blocks": 3, "transfers": 2, "checkpoint": 2}
+    transfers = index.index.transfers()
+    assert set(transfers) == {tx_hash(1), tx_hash(3)}
+    assert transfers[tx_hash(3)]["status"] == 0 and transfers[tx_hash(1)]["to_addr"] == checksummed(RECEIVER)
+
+    node.mine((tx_hash(4), AGENT, 1))
+    assert asyncio.run(index.scan()) == {"blocks": 1, "transfers": 1, "checkpoint": 3}
+
+
+def test_verify_and_fix(node, ledger):
+    index = make_indexer(ledger)
+    node.mine((tx_hash(1), AGENT, 1), (tx_hash(2), AGENT, 0), (tx_hash(3), AGENT, None))
+    node.mine((tx_hash(4), AGENT, 1), (tx_hash(5), AGENT, 1), (tx_hash(6), AGENT, 1))
+    record(ledger, 1, node.now)
+    record(ledger, 1, node.now)
+    record(ledger, 2, node.now)
+    record(ledger, 3, node.now)
+    record(ledger, 4, node.now - 40 * DAY)
+    # Paid, but the ledger record was lost; only the journal knows the amount
+    index.journal.begin("paid", "Alice", 2.5)
+    index.journal.signed("paid", checksummed(AGENT), checksummed(RECEIVER), 0, tx_hash(5), b"\x02")
+    asyncio.run(index.scan(from_block=0))
+
+    report = asyncio.run(index.verify(fix=True, quiet=True))
+
+    assert report["verified"] == 2
+    assert [r["tx_hash"] for r in report["duplicate"]] == [tx_hash(1)]
+    assert [r["tx_hash"] for r in report["reverted"]] == [tx_hash(2)]
+    assert [r["tx_hash"] for r in report["unknown"]] == [tx_hash(3)]
+    assert [r["tx_hash"] for r in report["retimed"]] == [tx_hash(4)]
+    assert [(t["tx_hash"], t["amount"]) for t in report["unrecorded"]] == [(tx_hash(5), 2.5)]
+    assert [t["tx_hash"] for t in report["unmatched"]] == [tx_hash(6)]
+
+    # A record without a receipt is never removed; everything else is corrected
+    remaining = sorted(r["tx_hash"] for r in ledger.transaction_records())
+    assert remaining == [tx_hash(1), tx_hash(3), tx_hash(4), tx_hash(5)]
+    assert ledger.period_total(checksummed(AGENT), "day", node.now) == 1.0 + 1.0 + 1.0 + 2.5
+    again = asyncio.run(index.verify(quiet=True))
+    assert again["verified"] == 3 and [r["tx_hash"] for r in again["unknown"]] == [tx_hash(3)]
+    assert not any(again[name] for name in ("reverted", "duplicate", "retimed", "unrecorded"))
+
+
+def test_receipt_returned_later_resolves_an_unknown_transfer(node, ledger):
+    index = make_indexer(ledger)
+    node.mine((tx_hash(1), AGENT, None))
+    record(ledger, 1, node.now)
+    asyncio.run(index.scan(from_block=0))
+    assert index.index.transfers()[tx_hash(1)]["status"] is None
+
+    node.receipts[tx_hash(1)] = {"transactionHash": tx_hash(1), "from": AGENT, "to": LITE,
+                                 "blockNumber": "0x1", "transactionIndex": "0x0", "status": "0x0"}
+    report = asyncio.run(index.verify(quiet=True))
+
+    assert [r["tx_hash"] for r in report["reverted"]] == [tx_hash(1)]
+    assert index.index.transfers()[tx_hash(1)]["status"] == 0
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from journal import CONFIRMED, FAILED, IN_FLIGHT, PLANNED, SENT, SIGNED, PaymentJournal, SCHEMA
+
+AGENT = "0x" + "11" * 20
+RECEIVER = "0x" + "22" * 20
+RAW_TX = b"\x02\xf8"
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return PaymentJournal(str(tmp_path / "ledger.db"))
+
+
+def other_process(journal, owner):
+    """Second handle on the same journal that claims entries as another process"""
+    other = PaymentJournal(journal.path)
+    other.owner = owner
+    return other
+
+
+def sign(journal, key, nonce=0, tx_hash="0x01"):
+    journal.signed(key, AGENT, RECEIVER, nonce, tx_hash, RAW_TX)
+
+
+def test_payment_moves_through_the_states(journal):
+    assert journal.begin("k", "Alice", 1.0) is None
+    assert journal.get("k")["state"] == PLANNED
+    sign(journal, "k")
+    assert journal.get("k")["state"] == SIGNED
+    assert journal.transactions(["k"])["k"] == [{"tx_hash": "0x01", "nonce": 0, "raw_tx": "0x02f8"}]
+    journal.sent("k")
+    assert [entry["key"] for entry in journal.entries(IN_FLIGHT)] == ["k"]
+    journal.confirmed("k", "0x01")
+
+    assert journal.get("k")["state"] == CONFIRMED
+    assert journal.counts() == {CONFIRMED: 1}
+
+
+@pytest.mark.parametrize("state", [SIGNED, SENT, CONFIRMED])
+def test_begin_refuses_keys_that_may_have_been_paid(journal, state):
+    journal.begin("k", "Alice", 1.0)
+    sign(journal, "k")
+    if state == SENT:
+        journal.sent("k")
+    elif state == CONFIRMED:
+        journal.confirmed("k", "0x01")
+
+    existing = journal.begin("k", "Alice", 1.0)
+
+    assert existing["state"] == state
+    assert journal.get("k")["state"] == state
+    assert journal.transactions(["k"])["k"]
+
+
+def test_begin_plans_a_failed_key_again(journal):
+    journal.begin("k", "Alice", 1.0)
+    sign(journal, "k")
+    journal.failed("k", "transaction reverted (status 0)")
+
+    assert journal.begin("k", "Alice", 2.0) is None
+    entry = journal.get("k")
+    assert (entry["state"], entry["amount"], entry["error"], entry["tx_hash"]) == (PLANNED, 2.0, None, None)
+    assert journal.transactions(["k"])["k"] == []
+
+
+def test_begin_plans_its_own_planned_key_again(journal):
+    assert journal.begin("k", "Alice", 1.0) is None
+    assert journal.begin("k", "Alice", 1.0) is None
+    assert journal.get("k")["owner"] == journal.owner
+
+
+def test_begin_refuses_a_planned_key_leased_to_a_live_process(journal):
+    other = other_process(journal, f"{journal.owner.rpartition(':')[0]}:{os.getppid()}")
+    assert other.begin("k", "Alice", 1.0) is None
+
+    existing = journal.begin("k", "Alice", 1.0)
+
+    assert existing["state"] == PLANNED
+    assert existing["owner"] == other.owner
+
+
+def test_begin_takes_over_an_expired_lease(journal):
+    other = other_process(journal, f"{journal.owner.rpartition(':')[0]}:{os.getppid()}")
+    other.begin("k", "Alice", 1.0)
+    journal.lease = 0.05
+    time.sleep(0.1)
+
+    assert journal.begin("k", "Alice", 1.0) is None
+    assert journal.get("k")["owner"] == journal.owner
+
+
+def test_begin_takes_over_the_lease_of_a_dead_process(journal):
+    finished = subprocess.Popen([sys.executable, "-c", "pass"])
+    finished.wait()
+    other = other_process(journal, f"{journal.owner.rpartition(':')[0]}:{finished.pid}")
+    other.begin("k", "Alice", 1.0)
+
+    assert journal.begin("k", "Alice", 1.0) is None
+
+
+def test_replan_releases_the_lease(journal):
+    other = other_process(journal, f"{journal.owner.rpartition(':')[0]}:{os.getppid()}")
+    other.begin("k", "Alice", 1.0)
+    sign(other, "k")
+    other.replan("k", "dropped")
+
+    assert journal.get("k")["state"] == PLANNED
+    assert journal.transactions(["k"])["k"] == []
+    assert journal.begin("k", "Alice", 1.0) is None
+
+
+def test_fee_bumps_are_found_by_hash(journal):
+    journal.begin("k", "Alice", 1.0)
+    sign(journal, "k", tx_hash="0xAA")
+    journal.add_transaction("k", "0xbb", 0, RAW_TX)
+
+    assert journal.get("k")["tx_hash"] == "0xbb"
+    assert set(journal.payments_by_hash(["0xaa", "0xBB"])) == {"0xaa", "0xbb"}
+
+
+def test_journals_without_lease_columns_are_migrated(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA.replace("    owner TEXT,\n    lease_at REAL,\n", ""))
+    conn.execute("INSERT INTO payment_journal (key, amount, state, created_at, updated_at) "
+                 "VALUES ('old', 1.0, 'planned', 0, 0)")
+    conn.commit()
+    conn.close()
+
+    journal = PaymentJournal(path)
+
+    assert journal.begin("old", "Alice", 1.0) is None
+    assert journal.get("old")["owner"] == journal.owner
+    assert FAILED not in journal.counts()
@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from ledger import SpendingLedger, bucket_key
+
+AGENT = "0x" + "11" * 20
+OTHER = "0x" + "22" * 20
+
+
+def test_records_and_totals_by_time_range(tmp_path):
+    ledger = SpendingLedger(str(tmp_path / "ledger.db"))
+    ledger.append(AGENT, 1.0, 100, to_addr=OTHER, tx_hash="0x01")
+    ledger.append(AGENT, 2.0, 200)
+    ledger.append(OTHER, 5.0, 150)
+
+    assert [record["amount"] for record in ledger.records(AGENT)] == [1.0, 2.0]
+    assert ledger.records(AGENT, since=150) == [{"amount": 2.0, "timestamp": 200, "to_addr": None, "tx_hash": None}]
+    assert ledger.total(AGENT, 0) == 3.0
+    assert ledger.total(AGENT, 0, until=200) == 1.0
+    assert ledger.has_transaction("0x01") and not ledger.has_transaction("0x02")
+
+
+def test_concurrent_handles_share_the_history(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    first, second = SpendingLedger(path), SpendingLedger(path)
+    first.append(AGENT, 1.0, 100)
+    second.append(AGENT, 2.0, 101)
+
+    assert first.total(AGENT, 0) == 3.0
+
+
+def test_legacy_json_is_migrated_once(tmp_path):
+    legacy = tmp_path / "transaction_records.json"
+    now = int(time.time())
+    legacy.write_text(json.dumps({AGENT: [{"amount": 1.5, "timestamp": now}, {"amount": 2.5, "timestamp": now}]}),
+                      encoding="utf-8")
+    path = str(tmp_path / "ledger.db")
+
+    assert SpendingLedger(path).migrate_json(str(legacy)) == 2
+    ledger = SpendingLedger(path)
+    assert ledger.migrate_json(str(legacy)) == 0
+    assert ledger.all_records() == {AGENT: [{"amount": 1.5, "timestamp": now}, {"amount": 2.5, "timestamp": now}]}
+
+
+def test_missing_or_broken_legacy_file_is_skipped(tmp_path):
+    ledger = SpendingLedger(str(tmp_path / "ledger.db"))
+    assert ledger.migrate_json(str(tmp_path / "missing.json")) == 0
+    broken = tmp_path / "broken.json"
+    broken.write_text("{", encoding="utf-8")
+    assert ledger.migrate_json(str(broken)) == 0
+    assert ledger.all_records() == {}
+
+
+def test_append_updates_day_and_month_buckets(tmp_path):
+    ledger = SpendingLedger(str(tmp_path / "ledger.db"))
+    now = int(time.time())
+    ledger.append(AGENT, 1.5, now)
+    ledger.append(AGENT, 2.0, now)
+
+    assert ledger.period_total(AGENT, "day", now) == 3.5
+    assert ledger.period_total(AGENT, "month", now) == 3.5
+    assert ledger.period_total("0x" + "22" * 20, "day", now) == 0
+
+
+def test_bucket_rolls_over_and_ignores_late_records(tmp_path):
+    ledger = SpendingLedger(str(tmp_path / "ledger.db"))
+    today = datetime.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    yesterday = int((today - timedelta(days=1)).timestamp())
+    ledger.append(AGENT, 5.0, yesterday)
+    ledger.append(AGENT, 1.0, int(today.timestamp()))
+    # A record for a past day arriving late must not touch today's bucket
+    ledger.append(AGENT, 7.0, yesterday)
+
+    assert ledger.period_total(AGENT, "day", int(today.timestamp())) == 1.0
+    assert ledger.period_total(AGENT, "day", yesterday) == 0
+
+
+def test_buckets_are_seeded_from_a_ledger_written_before_they_existed(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    now = int(time.time())
+    last_month = int((datetime.now().replace(day=1) - timedelta(days=1)).timestamp())
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE spending_records (id INTEGER PRIMARY KEY AUTOINCREMENT, agent TEXT NOT NULL, "
+                 "amount REAL NOT NULL, timestamp INTEGER NOT NULL, to_addr TEXT, tx_hash TEXT)")
+    conn.executemany("INSERT INTO spending_records (agent, amount, timestamp) VALUES (?, ?, ?)",
+                     [(AGENT, 2.0, now), (AGENT, 3.0, now), (AGENT, 100.0, last_month)])
+    conn.commit()
+    conn.close()
+
+    ledger = SpendingLedger(path)
+
+    assert ledger.period_total(AGENT, "day", now) == 5.0
+    assert ledger.period_total(AGENT, "month", now) == 5.0
+    row = ledger._connect().execute("SELECT bucket FROM spend_buckets WHERE agent = ? AND period = 'day'",
+                                    (AGENT,)).fetchone()
+    assert row["bucket"] == bucket_key("day", now)
+
+
+def test_buckets_are_seeded_only_once(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    now = int(time.time())
+    SpendingLedger(path).append(AGENT, 1.0, now)
+    # Reopening must not rebuild (and so must not double count) the buckets
+    ledger = SpendingLedger(path)
+    ledger.append(AGENT, 1.0, now)
+
+    assert ledger.period_total(AGENT, "day", now) == 2.0
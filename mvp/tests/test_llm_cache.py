@@ -0,0 +1,141 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from llm_cache import ResponseCache, assemble_stream, assemble_stream_async, cached_client, request_key
+from mock_openai import MockOpenAIServer
+
+TOOLS = [{"type": "function", "function": {
+    "name": "get_salary_info", "description": "Salary of an employee",
+    "parameters": {"type": "object", "properties": {"employee_name": {"type": "string"}},
+                   "required": ["employee_name"]}}}]
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = MockOpenAIServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / "llm_cache.db"), ttl=3600)
+
+
+def client_for(server, cache, is_async=False):
+    openai = pytest.importorskip("openai")
+    httpx = pytest.importorskip("httpx")
+    if is_async:
+        client = openai.AsyncOpenAI(base_url=server.url, api_key="mock", http_client=httpx.AsyncClient())
+    else:
+        client = openai.OpenAI(base_url=server.url, api_key="mock", http_client=httpx.Client())
+    return cached_client(client, cache)
+
+
+def ask(question, **kwargs):
+    return dict(model="mock", messages=[{"role": "user", "content": question}], **kwargs)
+
+
+def test_repeated_request_is_answered_from_the_cache(server, cache):
+    client = client_for(server, cache)
+    before = server.requests
+    first = client.chat.completions.create(**ask("What can you do?"))
+    second = client.chat.completions.create(**ask("What can you do?"))
+
+    assert server.requests - before == 1
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert second.choices[0].message.content == first.choices[0].message.content
+    assert "Alice" in second.choices[0].message.content
+
+
+def test_different_parameters_miss(server, cache):
+    client = client_for(server, cache)
+    before = server.requests
+    client.chat.completions.create(**ask("What can you do?"))
+    client.chat.completions.create(**ask("What can you do?", temperature=0))
+    client.chat.completions.create(**ask("What can you do?", tools=TOOLS))
+
+    assert server.requests - before == 3
+    assert cache.hits == 0
+
+
+def test_stream_is_passed_through_and_replayed(server, cache):
+    client = client_for(server, cache)
+    before = server.requests
+
+    tokens = []
+    streamed = assemble_stream(client.chat.completions.create(**ask("Tell me something", stream=True)),
+                               on_token=tokens.append)
+    assert server.requests - before == 1
+    assert len(tokens) > 1
+    assert "".join(tokens) == streamed.choices[0].message.content
+
+    replayed = assemble_stream(client.chat.completions.create(**ask("Tell me something", stream=True)))
+    assert replayed.choices[0].message.content == streamed.choices[0].message.content
+    assert replayed.choices[0].finish_reason == "stop"
+    # stream does not change the answer, so a plain request is a hit too
+    plain = client.chat.completions.create(**ask("Tell me something"))
+    assert plain.choices[0].message.content == streamed.choices[0].message.content
+    assert server.requests - before == 1
+    assert (cache.misses, cache.hits) == (1, 2)
+
+
+def test_streamed_tool_call_arguments_are_assembled(server, cache):
+    client = client_for(server, cache)
+    request = ask("How much do Alice and Bob earn?", tools=TOOLS, stream=True)
+
+    for _ in range(2):
+        completion = assemble_stream(client.chat.completions.create(**request))
+        calls = completion.choices[0].message.tool_calls
+        assert completion.choices[0].finish_reason == "tool_calls"
+        assert [call.function.name for call in calls] == ["get_salary_info"] * 2
+        arguments = [json.loads(call.function.arguments) for call in calls]
+        assert arguments == [{"employee_name": "Alice"}, {"employee_name": "Bob"}]
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_async_client_stream(server, cache):
+    client = client_for(server, cache, is_async=True)
+    before = server.requests
+
+    async def stream_twice():
+        answers = []
+        for _ in range(2):
+            stream = await client.chat.completions.create(**ask("Hello there", stream=True))
+            completion = await assemble_stream_async(stream)
+            answers.append(completion.choices[0].message.content)
+        return answers
+
+    first, second = asyncio.run(stream_twice())
+    assert first == second
+    assert server.requests - before == 1
+
+
+def test_request_key_ignores_transport_arguments():
+    assert request_key(ask("Hi", stream=True, timeout=5)) == request_key(ask("Hi"))
+    assert request_key(ask("Hi", temperature=0)) != request_key(ask("Hi"))
+
+
+def test_entries_expire(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm_cache.db"), ttl=0.05)
+    cache.put("k", {"id": "k"})
+    assert cache.get("k") == {"id": "k"}
+    time.sleep(0.1)
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "llm_cache.db"), ttl=3600, max_bytes=2000)
+    for i in range(10):
+        cache.put(str(i), {"id": str(i), "pad": "x" * 400})
+        # Keep the first entry in use
+        cache.get("0")
+
+    total = cache._connect().execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+    assert total <= 2000
+    assert cache.get("0") is not None
+    assert cache.get("1") is None
+    assert cache.get("9") is not None
@@ -0,0 +1,74 @@
+from nonce_manager import NonceLane, NonceManager, is_nonce_error
+
+
+def test_reserves_consecutive_nonces():
+    lane = NonceLane(7)
+    assert [lane.reserve() for _ in range(3)] == [7, 8, 9]
+    assert lane.next_nonce == 10
+
+
+def test_released_gap_is_reused_before_new_nonces():
+    lane = NonceLane(0)
+    for _ in range(4):
+        lane.reserve()
+    lane.release(1)
+    lane.release(2)
+
+    assert lane.reserve() == 1
+    assert lane.reserve() == 2
+    assert lane.reserve() == 4
+
+
+def test_release_at_the_top_shrinks_the_sequence():
+    lane = NonceLane(0)
+    for _ in range(3):
+        lane.reserve()
+    lane.release(1)
+    lane.release(2)
+
+    assert lane.gaps == set()
+    assert lane.next_nonce == 1
+    assert lane.reserve() == 1
+
+
+def test_release_of_an_unreserved_nonce_is_ignored():
+    lane = NonceLane(5)
+    lane.release(9)
+    assert lane.reserve() == 5
+
+
+def test_nonce_errors_are_recognized():
+    assert is_nonce_error(ValueError({"message": "Nonce too low"}))
+    assert is_nonce_error(ValueError("replacement transaction underpriced"))
+    assert not is_nonce_error(ValueError("execution reverted"))
+
+
+def seeded_manager():
+    # Seeded sequences never touch the chain, so no client is needed
+    manager = NonceManager(None, None, "0x" + "11" * 20)
+    manager.seed(5, 2)
+    return manager
+
+
+def test_seed_keeps_sequences_already_tracked():
+    manager = seeded_manager()
+    assert manager.reserve_evm() == 5
+    manager.seed(0, 0)
+    assert manager.reserve_evm() == 6
+    assert manager.reserve_lite() == 2
+
+
+def test_failed_send_gives_its_nonces_back():
+    manager = seeded_manager()
+    evm_nonce, lite_nonce = manager.reserve_evm(), manager.reserve_lite()
+    manager.handle_send_error(ValueError("insufficient funds"), evm_nonce=evm_nonce, lite_nonce=lite_nonce)
+
+    assert (manager.reserve_evm(), manager.reserve_lite()) == (5, 2)
+
+
+def test_nonce_conflict_forces_a_resync():
+    manager = seeded_manager()
+    manager.reserve_evm()
+    manager.handle_send_error(ValueError("nonce too low"), evm_nonce=5)
+
+    assert not manager.synced
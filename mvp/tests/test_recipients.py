@@ -0,0 +1,100 @@
+import csv
+import json
+import os
+
+import pytest
+
+from recipients import RecipientDirectory
+
+BUILT_IN = {"Alice": "0x" + "a1" * 20}
+
+
+def address(i):
+    return "0x" + format(0xbe00000 + i, "040x")
+
+
+def write_recipients(path, count, start=0):
+    """Generate a recipients CSV of count synthetic employees, every other one whitelisted"""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "address", "whitelisted"])
+        for i in range(start, start + count):
+            writer.writerow([f"emp-{i:05d}", address(i), "1" if i % 2 == 0 else ""])
+
+
+def touch_later(path):
+    # Some filesystems keep whole-second mtimes; make the change visible to reload_if_changed
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 2))
+
+
+def test_loads_a_large_recipients_file(tmp_path):
+    path = str(tmp_path / "recipients.csv")
+    write_recipients(path, 50000)
+
+    directory = RecipientDirectory(BUILT_IN, recipients_file=path)
+
+    assert len(directory) == 50001
+    assert "emp-49999" in directory and "EMP-00042" in directory
+    assert directory.is_whitelisted(address(42).upper().replace("0X", "0x"))
+    assert not directory.is_whitelisted(address(43))
+
+
+def test_reload_swaps_in_the_new_file(tmp_path):
+    path = str(tmp_path / "recipients.csv")
+    write_recipients(path, 10)
+    directory = RecipientDirectory(BUILT_IN, recipients_file=path)
+
+    write_recipients(path, 5, start=100)
+    touch_later(path)
+
+    assert directory.reload_if_changed()
+    assert not directory.reload_if_changed()
+    assert "emp-00000" not in directory
+    assert "emp-00100" in directory
+    assert "Alice" in directory
+
+
+def test_failed_reload_keeps_the_previous_directory(tmp_path):
+    path = str(tmp_path / "recipients.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"Bob": address(1)}, f)
+    directory = RecipientDirectory(recipients_file=path)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"Bob": "not an address"}, f)
+    with pytest.raises(ValueError):
+        directory.reload()
+
+    assert "Bob" in directory and len(directory) == 1
+
+
+def test_lookup_and_runtime_additions(tmp_path):
+    pytest.importorskip("eth_utils")
+    whitelist = tmp_path / "whitelist.txt"
+    whitelist.write_text(f"# payroll\n{address(7)}\n", encoding="utf-8")
+    directory = RecipientDirectory({"Carol": address(7)}, whitelist_file=str(whitelist))
+    directory.add("Runtime", address(999), whitelisted=True)
+
+    assert directory.lookup("carol").lower() == address(7)
+    assert directory.lookup("Dave") is None
+    assert not directory.is_whitelisted(address(8))
+    # Runtime additions survive reloads
+    directory.reload()
+    assert directory.lookup("Runtime").lower() == address(999)
+    assert directory.is_whitelisted(address(999))
+
+
+def test_later_entries_win_for_exact_and_case_insensitive_lookups(tmp_path):
+    pytest.importorskip("eth_utils")
+    path = tmp_path / "recipients.csv"
+    path.write_text(f"name,address\nBob,{address(1)}\nbob,{address(2)}\n", encoding="utf-8")
+    directory = RecipientDirectory({"BOB": address(0)}, recipients_file=str(path))
+
+    assert directory.lookup("bob").lower() == address(2)
+    assert directory.lookup("BOB").lower() == address(0)
+    assert directory.lookup("Bob").lower() == address(1)
+    # Neither exact spelling: the last entry for the folded name
+    assert directory.lookup("bOB").lower() == address(2)
+    directory.add("BoB", address(3))
+    assert directory.lookup("bOB").lower() == address(3)
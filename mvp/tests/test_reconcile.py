@@ -0,0 +1,102 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("eth_utils")
+pytest.importorskip("requests")
+
+import pay
+from async_pay import PaymentEngine
+from journal import CONFIRMED, PLANNED, PaymentJournal
+from ledger import SpendingLedger
+from transport import RPCError
+
+AGENT = "0x" + "11" * 20
+RECEIVER = "0x" + "22" * 20
+TX_HASH = "0x" + "ab" * 32
+
+
+class FakeNode:
+    """
+    Answers the engine's reconcile batches; the payment's transaction is mined
+    once after_batches batches have been answered
+    """
+
+    def __init__(self, nonce, after_batches, receipt_errors=0):
+        self.nonce = nonce
+        self.after_batches = after_batches
+        self.receipt_errors = receipt_errors
+        self.batches = []
+
+    @property
+    def mined(self):
+        return len(self.batches) > self.after_batches
+
+    async def batch(self, calls):
+        self.batches.append([method for method, _ in calls])
+        results = []
+        for method, params in calls:
+            if method == "eth_getTransactionCount":
+                results.append(hex(self.nonce + 1 if self.mined else self.nonce))
+            elif self.receipt_errors:
+                self.receipt_errors -= 1
+                results.append(RPCError({"message": "header not found"}))
+            elif self.mined:
+                results.append({"transactionHash": params[0], "blockNumber": "0x5", "transactionIndex": "0x0",
+                                "status": "0x1", "gasUsed": "0x5208"})
+            else:
+                results.append(None)
+        return results
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(pay, "_ledger", SpendingLedger(str(tmp_path / "ledger.db")))
+    engine = PaymentEngine([])
+    # A started engine without a chain: reconcile only reads through _rpc_batch
+    engine.pool = SimpleNamespace(lanes=[])
+    engine.ciphers = SimpleNamespace(invalidate=lambda addresses: None)
+    engine.journal = PaymentJournal(str(tmp_path / "ledger.db"))
+    engine.journal.begin("k", "Alice", 1.0)
+    engine.journal.signed("k", AGENT, RECEIVER, 7, TX_HASH, b"\x02")
+    engine.journal.sent("k")
+    return engine
+
+
+def reconcile(engine, node, monkeypatch):
+    monkeypatch.setattr(engine, "_rpc_batch", node.batch)
+    return asyncio.run(engine.reconcile())
+
+
+def test_transaction_mined_between_the_reads_is_settled(engine, monkeypatch):
+    # Mined right after the first read. Had the receipts been read first, the nonce
+    # read would show the nonce used without a receipt and the payment would be made again
+    node = FakeNode(nonce=7, after_batches=1)
+
+    assert reconcile(engine, node, monkeypatch) == {"confirmed": 1}
+    assert node.batches[0] == ["eth_getTransactionCount"]
+    assert engine.journal.get("k")["state"] == CONFIRMED
+
+
+def test_receipt_found_on_the_second_lookup_is_settled(engine, monkeypatch):
+    # The node counts the nonce as used but had not indexed the receipt at the first lookup
+    node = FakeNode(nonce=8, after_batches=2)
+
+    assert reconcile(engine, node, monkeypatch) == {"confirmed": 1}
+    assert len(node.batches) == 3
+    assert engine.journal.get("k")["state"] == CONFIRMED
+
+
+def test_failed_receipt_lookup_stays_pending(engine, monkeypatch):
+    node = FakeNode(nonce=8, after_batches=10, receipt_errors=1)
+
+    assert reconcile(engine, node, monkeypatch) == {"pending": 1}
+    assert engine.journal.get("k")["state"] != PLANNED
+
+
+def test_nonce_taken_by_another_transaction_is_replanned(engine, monkeypatch):
+    node = FakeNode(nonce=8, after_batches=10)
+
+    assert reconcile(engine, node, monkeypatch) == {"replanned": 1}
+    assert engine.journal.get("k")["state"] == PLANNED
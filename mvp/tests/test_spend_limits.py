@@ -0,0 +1,55 @@
+import time
+
+from ledger import SpendingLedger
+from spend_limits import SpendLimiter
+
+AGENT = "0x" + "11" * 20
+LIMITS = {"single_transaction": 5, "daily": 10, "monthly": 100}
+
+
+def make_limiter(tmp_path):
+    return SpendLimiter(SpendingLedger(str(tmp_path / "ledger.db")), LIMITS)
+
+
+def test_reservations_count_against_the_limits(tmp_path):
+    limiter = make_limiter(tmp_path)
+    first, error = limiter.reserve(AGENT, 4)
+    assert error is None
+    second, error = limiter.reserve(AGENT, 4)
+    assert error is None
+    assert limiter.in_flight(AGENT) == 8
+
+    third, error = limiter.reserve(AGENT, 4)
+    assert third is None
+    assert "日限额" in error
+
+
+def test_single_transaction_limit(tmp_path):
+    reservation, error = make_limiter(tmp_path).reserve(AGENT, 6)
+    assert reservation is None
+    assert "单笔限额" in error
+
+
+def test_release_frees_the_reserved_amount(tmp_path):
+    limiter = make_limiter(tmp_path)
+    reservation, _ = limiter.reserve(AGENT, 4)
+    limiter.reserve(AGENT, 4)
+    limiter.release(reservation)
+
+    assert limiter.in_flight(AGENT) == 4
+    assert limiter.reserve(AGENT, 4)[1] is None
+    # Releasing twice is harmless
+    limiter.release(reservation)
+    assert limiter.in_flight(AGENT) == 8
+
+
+def test_commit_moves_the_amount_from_reserved_to_spent(tmp_path):
+    limiter = make_limiter(tmp_path)
+    reservation, _ = limiter.reserve(AGENT, 3)
+    now = int(time.time())
+    limiter.commit(reservation, now, tx_hash="0x" + "ab" * 32)
+
+    assert limiter.in_flight(AGENT) == 0
+    assert limiter.ledger.period_total(AGENT, "day", now) == 3
+    assert limiter.check(AGENT, 5) is None
+    assert limiter.check(AGENT, 5, pending=3) is not None
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("eth_tester")
+
+import state_reader
+from local_chain import LocalChain
+from state_reader import StateReader
+from transport import close_async_transports
+
+
+@pytest.fixture(scope="module")
+def chain():
+    chain = LocalChain("eth-tester", agents=2).start()
+    yield chain
+    chain.stop()
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    sent = []
+    send = state_reader.rpc_batch
+
+    def counting(rpc_url, calls):
+        sent.append([method for method, _ in calls])
+        return send(rpc_url, calls)
+
+    monkeypatch.setattr(state_reader, "rpc_batch", counting)
+    return sent
+
+
+def accounts(chain):
+    from eth_account import Account
+    return [Account.from_key(key).address for key in chain.agent_keys]
+
+
+def test_snapshot_is_one_batch_with_the_block_number(chain, batches):
+    sender, receiver = accounts(chain)
+    snapshot = StateReader(chain.rpc_url, chain.lite_addr).snapshot(sender, [receiver, sender])
+
+    assert len(batches) == 1 and batches[0][0] == "eth_blockNumber"
+    assert snapshot.block_number == chain.w3.eth.block_number
+    assert snapshot.evm_nonce == chain.w3.eth.get_transaction_count(sender, "pending")
+    assert snapshot.lite_nonce == 0
+    assert snapshot.balances == {sender: b"", receiver: b""}
+
+
+def test_snapshot_pinned_to_a_block_skips_the_block_number(chain, batches):
+    _, receiver = accounts(chain)
+    snapshot = StateReader(chain.rpc_url, chain.lite_addr).snapshot(receivers=[receiver], block_number=1)
+
+    assert batches == [["eth_call"]]
+    assert snapshot.block_number == 1
+    assert snapshot.evm_nonce is None and snapshot.balances == {receiver: b""}
+
+
+def test_async_snapshot_matches(chain):
+    pytest.importorskip("aiohttp")
+    sender, receiver = accounts(chain)
+    reader = StateReader(chain.rpc_url, chain.lite_addr)
+
+    async def read():
+        try:
+            return await reader.snapshot_async(sender, [receiver])
+        finally:
+            await close_async_transports()
+
+    snapshot = asyncio.run(read())
+    expected = reader.snapshot(sender, [receiver])
+    assert (snapshot.block_number, snapshot.evm_nonce, snapshot.lite_nonce, snapshot.balances) == \
+        (expected.block_number, expected.evm_nonce, expected.lite_nonce, expected.balances)
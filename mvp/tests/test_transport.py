@@ -0,0 +1,47 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+import transport
+
+
+class Unavailable(BaseHTTPRequestHandler):
+    def _reply(self):
+        self.server.hits[self.command] = self.server.hits.get(self.command, 0) + 1
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.send_response(503)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Unavailable)
+    server.hits = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    transport.configure(retries=2, backoff_factor=0)
+    yield server
+    server.shutdown()
+    transport.configure()
+
+
+def test_get_is_retried_on_5xx(server):
+    response = transport.http_get(f"http://127.0.0.1:{server.server_port}/")
+    assert response.status_code == 503
+    assert server.hits["GET"] == 3
+
+
+def test_rpc_post_is_not_resent_on_5xx(server):
+    url = f"http://127.0.0.1:{server.server_port}/"
+    with pytest.raises(requests.HTTPError):
+        transport.rpc_batch(url, [("eth_sendRawTransaction", ["0x00"])])
+    assert server.hits["POST"] == 1
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from transport import close_async_transports
+from witness_client import CLOSED, OPEN, WitnessClient, WitnessUnavailable
+from witness_server import WitnessServer
+
+PARAMS = {"from_address": "0x0", "to_address": "0x0", "amount": 1, "nonce": 1}
+
+
+@pytest.fixture
+def witness():
+    servers = []
+
+    def start(**kwargs):
+        server = WitnessServer(**kwargs).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def run(coro):
+    """Run a coroutine on a fresh loop and close the loop's shared HTTP session after it"""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_async_transports()
+    return asyncio.run(main())
+
+
+async def sign_many(client, count):
+    return [await client.sign_transfer(PARAMS) for _ in range(count)]
+
+
+def test_signs_through_a_healthy_witness(witness):
+    server = witness()
+    client = WitnessClient([server.url])
+
+    status, body = run(client.sign_transfer(PARAMS))
+
+    assert status == 200 and "signature" in body
+    assert client.stats()["retries"] == 0
+
+
+def test_failed_attempts_are_retried_on_another_endpoint(witness):
+    broken, healthy = witness(), witness()
+    broken.down = True
+    client = WitnessClient([broken.url, healthy.url], retries=2, backoff=0.01)
+
+    results = run(sign_many(client, 5))
+
+    assert [status for status, _ in results] == [200] * 5
+    assert client.retried >= 1
+    assert healthy.requests == 5
+
+
+def test_gives_up_after_the_last_retry(witness):
+    server = witness(error_rate=1.0)
+    client = WitnessClient([server.url], retries=2, backoff=0.01, breaker_failures=100)
+
+    with pytest.raises(WitnessUnavailable):
+        run(client.sign_transfer(PARAMS))
+
+    assert server.requests == 3
+    assert client.retried == 2
+
+
+def test_client_errors_are_returned_without_retrying(witness):
+    server = witness()
+    client = WitnessClient([server.url], retries=3, backoff=0.01)
+
+    status, _ = run(client.get(PARAMS, path="/api/unknown"))
+
+    assert status == 404
+    assert server.requests == 0 and client.retried == 0
+
+
+def test_slow_requests_are_hedged_to_another_endpoint(witness):
+    slow, fast = witness(latency=0.005), witness(latency=0.02)
+    client = WitnessClient([slow.url, fast.url], hedge_percentile=95, hedge_min_samples=5, hedge_ratio=1.0)
+    # Both endpoints learn their latency; the first one is the faster and becomes the primary
+    run(sign_many(client, 10))
+    slow.slow_rate, slow.slow_latency = 1.0, 1.0
+
+    async def timed():
+        started = time.perf_counter()
+        status, _ = await client.sign_transfer(PARAMS)
+        return status, time.perf_counter() - started
+
+    async def burst():
+        return await asyncio.gather(*(timed() for _ in range(5)))
+
+    results = run(burst())
+
+    assert [status for status, _ in results] == [200] * 5
+    assert max(elapsed for _, elapsed in results) < 0.5
+    assert client.hedges >= 1
+
+
+def test_no_hedging_when_disabled(witness):
+    server = witness(latency=0.005)
+    client = WitnessClient([server.url], hedge_percentile=0, hedge_min_samples=1, hedge_ratio=1.0)
+    run(sign_many(client, 10))
+    assert client.hedges == 0
+
+
+def test_breaker_opens_on_an_outage_and_closes_after_a_probe(witness):
+    server = witness()
+    client = WitnessClient([server.url], retries=0, breaker_failures=3, breaker_reset=0.3)
+    breaker = client.endpoints[0].breaker
+    server.down = True
+
+    async def outage():
+        for _ in range(3):
+            with pytest.raises(WitnessUnavailable):
+                await client.sign_transfer(PARAMS)
+        reached = server.requests
+        # Open: fails fast without touching the witness
+        with pytest.raises(WitnessUnavailable):
+            await client.sign_transfer(PARAMS)
+        return reached
+
+    reached = run(outage())
+    assert reached == 3 and server.requests == 3
+    assert breaker.state == OPEN
+    assert client.failed_fast == 1
+
+    server.down = False
+    time.sleep(0.35)
+    status, _ = run(client.sign_transfer(PARAMS))
+
+    assert status == 200
+    assert breaker.state == CLOSED
+    assert server.requests == 4
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP and RPC transports
+
+All modules talk to the witness API and the RPC node through the pooled,
+keep-alive clients created here, so connections (and their TCP/TLS handshakes)
+are reused across payments. Synchronous callers share one requests.Session;
+asyncio callers share one aiohttp.ClientSession per event loop.
+
+Settings can be overridden with environment variables:
+    TRANSPORT_POOL_SIZE         Max pooled connections per host (default: 32)
+    TRANSPORT_CONNECT_TIMEOUT   Connect timeout in seconds (default: 5)
+    TRANSPORT_READ_TIMEOUT      Read timeout in seconds (default: 30)
+    TRANSPORT_RETRIES           Retries for connection errors, and for read errors and 429/5xx
+                                responses to idempotent (GET) requests (default: 3)
+    TRANSPORT_BACKOFF           Exponential backoff factor in seconds (default: 0.3)
+"""
+
+import os
+import asyncio
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RPCError(Exception):
+    """
+    Error object returned for one call of a JSON-RPC batch
+    """
+
+    def __init__(self, error):
+        self.code = error.get("code")
+        self.message = error.get("message")
+        super().__init__(f"RPC error {self.code}: {self.message}")
+
+
+class TransportConfig:
+    """
+    Pool size, timeout and retry settings shared by every transport
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None,
+                 retries=None, backoff_factor=None):
+        self.pool_size = int(pool_size if pool_size is not None
+                             else os.getenv("TRANSPORT_POOL_SIZE", 32))
+        self.connect_timeout = float(connect_timeout if connect_timeout is not None
+                                     else os.getenv("TRANSPORT_CONNECT_TIMEOUT", 5))
+        self.read_timeout = float(read_timeout if read_timeout is not None
+                                  else os.getenv("TRANSPORT_READ_TIMEOUT", 30))
+        self.retries = int(retries if retries is not None
+                           else os.getenv("TRANSPORT_RETRIES", 3))
+        self.backoff_factor = float(backoff_factor if backoff_factor is not None
+                                    else os.getenv("TRANSPORT_BACKOFF", 0.3))
+
+    @property
+    def timeout(self):
+        """(connect, read) timeout tuple in the form requests expects"""
+        return (self.connect_timeout, self.read_timeout)
+
+
+config = TransportConfig()
+
+_lock = threading.Lock()
+_http_session = None
+_web3_clients = {}
+# aiohttp sessions are bound to the loop that created them
+_async_sessions = weakref.WeakKeyDictionary()
+_async_web3_clients = weakref.WeakKeyDictionary()
+
+
+def configure(**kwargs):
+    """
+    Replace the transport settings and drop the existing pooled clients
+
+    Args:
+        **kwargs: Any TransportConfig argument (pool_size, connect_timeout, ...)
+    """
+    global config, _http_session
+    with _lock:
+        config = TransportConfig(**kwargs)
+        if _http_session is not None:
+            _http_session.close()
+        _http_session = None
+        _web3_clients.clear()
+        _async_web3_clients.clear()
+
+
+def get_http_session():
+    """
+    Get the shared keep-alive HTTP session
+
+    Returns:
+        requests.Session: Session with a connection pool and retry policy
+    """
+    global _http_session
+    with _lock:
+        if _http_session is None:
+            retry = Retry(
+                total=config.retries,
+                backoff_factor=config.backoff_factor,
+                status_forcelist=RETRY_STATUS_CODES,
+                # Read errors and 429/5xx are retried only for idempotent methods: a JSON-RPC POST
+                # that reached the node (eth_sendRawTransaction) must not be posted again here.
+                # Connection errors are still retried, since the request never left
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=config.pool_size,
+                                  pool_maxsize=config.pool_size,
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+
+def http_get(url, params=None):
+    """
+    GET through the shared session with the configured timeouts
+
+    Returns:
+        requests.Response: HTTP response
+    """
+    return get_http_session().get(url, params=params, timeout=config.timeout)
+
+
+def get_web3(rpc_url):
+    """
+    Get the shared Web3 client for an RPC endpoint
+
+    The provider reuses the pooled HTTP session, so every module that talks to
+    the same node shares its keep-alive connections.
+
+    Args:
+        rpc_url (str): RPC endpoint
+
+    Returns:
+        Web3: Web3 client
+    """
+    session = get_http_session()
+    with _lock:
+        w3 = _web3_clients.get(rpc_url)
+        if w3 is None:
+            from web3 import Web3
+            provider = Web3.HTTPProvider(rpc_url, request_kwargs={"timeout": config.timeout},
+                                         session=session)
+            w3 = Web3(provider)
+            _web3_clients[rpc_url] = w3
+        return w3
+
+
+def _batch_payload(calls):
+    return [{"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(calls)]
+
+
+def _batch_results(calls, responses):
+    if isinstance(responses, dict):
+        # Nodes answer a rejected batch with a single error object
+        raise RPCError(responses.get("error", {"message": str(responses)}))
+    by_id = {response.get("id"): response for response in responses}
+    results = []
+    for i in range(len(calls)):
+        response = by_id.get(i, {"error": {"message": "missing response"}})
+        results.append(RPCError(response["error"]) if "error" in response else response.get("result"))
+    return results
+
+
+def rpc_batch(rpc_url, calls):
+    """
+    Send several JSON-RPC calls in one HTTP request
+
+    Args:
+        rpc_url (str): RPC endpoint
+        calls (list): (method, params) tuples
+
+    Returns:
+        list: Raw result of each call in order; failed calls are RPCError instances
+    """
+    if not calls:
+        return []
+    response = get_http_session().post(rpc_url, json=_batch_payload(calls), timeout=config.timeout)
+    response.raise_for_status()
+    return _batch_results(calls, response.json())
+
+
+def get_async_http_session():
+    """
+    Get the shared aiohttp session of the running event loop
+
+    Returns:
+        aiohttp.ClientSession: Session with a per-host connection limit and timeouts
+    """
+    import aiohttp
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0, limit_per_host=config.pool_size),
+            timeout=aiohttp.ClientTimeout(sock_connect=config.connect_timeout,
+                                          sock_read=config.read_timeout),
+        )
+        _async_sessions[loop] = session
+        _async_web3_clients.pop(loop, None)
+    return session
+
+
+async def async_http_get(url, params=None):
+    """
+    GET through the shared aiohttp session, retrying like the synchronous session does
+
+    Returns:
+        tuple: (HTTP status code, response body text)
+    """
+    import aiohttp
+    session = get_async_http_session()
+    for attempt in range(config.retries + 1):
+        last_attempt = attempt == config.retries
+        try:
+            async with session.get(url, params=params) as response:
+                body = await response.text()
+                if response.status not in RETRY_STATUS_CODES or last_attempt:
+                    return response.status, body
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if last_attempt:
+                raise
+        await asyncio.sleep(config.backoff_factor * (2 ** attempt))
+
+
+async def async_rpc_batch(rpc_url, calls):
+    """
+    Send several JSON-RPC calls in one HTTP request on the shared aiohttp session
+
+    Args:
+        rpc_url (str): RPC endpoint
+        calls (list): (method, params) tuples
+
+    Returns:
+        list: Raw result of each call in order; failed calls are RPCError instances
+    """
+    if not calls:
+        return []
+    session = get_async_http_session()
+    async with session.post(rpc_url, json=_batch_payload(calls)) as response:
+        response.raise_for_status()
+        return _batch_results(calls, await response.json(content_type=None))
+
+
+async def get_async_web3(rpc_url):
+    """
+    Get the shared AsyncWeb3 client for an RPC endpoint on the running event loop
+
+    Args:
+        rpc_url (str): RPC endpoint
+
+    Returns:
+        AsyncWeb3: Async Web3 client using the shared aiohttp session
+    """
+    session = get_async_http_session()
+    loop = asyncio.get_running_loop()
+    clients = _async_web3_clients.setdefault(loop, {})
+    w3 = clients.get(rpc_url)
+    if w3 is None:
+        import aiohttp
+        from web3 import AsyncWeb3
+        timeout = aiohttp.ClientTimeout(sock_connect=config.connect_timeout, sock_read=config.read_timeout)
+        provider = AsyncWeb3.AsyncHTTPProvider(rpc_url, request_kwargs={"timeout": timeout})
+        await provider.cache_async_session(session)
+        w3 = AsyncWeb3(provider)
+        clients[rpc_url] = w3
+    return w3
+
+
+async def close_async_transports():
+    """
+    Close the aiohttp session of the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    _async_web3_clients.pop(loop, None)
+    session = _async_sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Resilient client for the LITE witness API
+
+Every payment waits for a /api/sign_transfer signature, so a slow witness
+stalls a whole batch and a flaky one drops payments. WitnessClient wraps the
+call with:
+
+- connect and read timeouts of its own, shorter than the generic transport ones
+- retries of connection errors, timeouts and 429/5xx answers, with full-jitter
+  exponential backoff so retrying payments do not hit the witness in lockstep
+- hedged requests: when an answer takes longer than a percentile of the
+  endpoint's recent latencies, a duplicate is sent (to another endpoint if
+  several are configured) and the first answer wins. Signing has no side
+  effects on the witness, and only the winning signature is ever used.
+  Hedges are capped at a share of all requests so an overloaded witness does
+  not get twice the load
+- a circuit breaker per endpoint: after consecutive failures it fails fast for
+  a cool-down, then lets a single probe through
+- per-endpoint latency statistics over a sliding window, also recorded in the
+  metrics registry as witness_request_seconds
+
+A 4xx answer other than 429 is the witness rejecting the request (stale ciphers, bad
+parameters) and is returned at once, as before.
+
+Settings can be overridden with environment variables:
+    WITNESS_URLS                Comma-separated witness base URLs (default: KITE_LITE_API)
+    WITNESS_CONNECT_TIMEOUT     Connect timeout in seconds (default: 3)
+    WITNESS_READ_TIMEOUT        Read timeout in seconds (default: 10)
+    WITNESS_RETRIES             Retries after the first attempt (default: 3)
+    WITNESS_BACKOFF             Backoff base in seconds; retry n waits up to base * 2**n (default: 0.2)
+    WITNESS_HEDGE_PERCENTILE    Latency percentile after which a hedged request is sent, 0 disables (default: 95)
+    WITNESS_HEDGE_MIN_SAMPLES   Answers an endpoint needs before its requests are hedged (default: 20)
+    WITNESS_HEDGE_RATIO         Largest share of requests that may be hedged (default: 0.1)
+    WITNESS_BREAKER_FAILURES    Consecutive failures that open an endpoint's breaker (default: 5)
+    WITNESS_BREAKER_RESET       Seconds an open breaker fails fast before a probe (default: 10)
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+
+from metrics import registry
+from transport import RETRY_STATUS_CODES, get_async_http_session
+
+WITNESS_URLS = [url.strip() for url in os.getenv("WITNESS_URLS", "").split(",") if url.strip()]
+WITNESS_CONNECT_TIMEOUT = float(os.getenv("WITNESS_CONNECT_TIMEOUT", 3))
+WITNESS_READ_TIMEOUT = float(os.getenv("WITNESS_READ_TIMEOUT", 10))
+WITNESS_RETRIES = int(os.getenv("WITNESS_RETRIES", 3))
+WITNESS_BACKOFF = float(os.getenv("WITNESS_BACKOFF", 0.2))
+WITNESS_HEDGE_PERCENTILE = float(os.getenv("WITNESS_HEDGE_PERCENTILE", 95))
+WITNESS_HEDGE_MIN_SAMPLES = int(os.getenv("WITNESS_HEDGE_MIN_SAMPLES", 20))
+WITNESS_HEDGE_RATIO = float(os.getenv("WITNESS_HEDGE_RATIO", 0.1))
+WITNESS_BREAKER_FAILURES = int(os.getenv("WITNESS_BREAKER_FAILURES", 5))
+WITNESS_BREAKER_RESET = float(os.getenv("WITNESS_BREAKER_RESET", 10))
+
+SIGN_TRANSFER_PATH = "/api/sign_transfer"
+# Recent answers per endpoint the latency percentiles are computed from
+LATENCY_WINDOW = 256
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+registry.describe("witness_request_seconds", "Latency of witness API requests by endpoint and outcome")
+registry.describe("witness_hedges_total", "Hedged duplicate witness requests sent")
+registry.describe("witness_retries_total", "Witness requests retried after a failure")
+registry.describe("witness_breaker_open_total", "Times an endpoint's circuit breaker opened")
+
+
+class WitnessUnavailable(Exception):
+    """
+    No witness endpoint answered: every attempt failed or every breaker is open
+    """
+
+
+class _AttemptFailed(Exception):
+    """A retryable failure of one request to one endpoint"""
+
+    def __init__(self, endpoint, message):
+        self.endpoint = endpoint
+        super().__init__(f"{endpoint.url}: {message}" if endpoint is not None else message)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with a single half-open probe
+    """
+
+    def __init__(self, failures=WITNESS_BREAKER_FAILURES, reset=WITNESS_BREAKER_RESET):
+        """
+        Initialize breaker
+
+        Args:
+            failures (int): Consecutive failures that open the breaker
+            reset (float): Seconds the breaker stays open before a probe is let through
+        """
+        self.failures = failures
+        self.reset = reset
+        self.state = CLOSED
+        self.consecutive = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a request may be sent now; an allowed half-open request is the probe
+        """
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def would_allow(self):
+        """Like allow(), without taking the half-open probe"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at >= self.reset
+            return self.state == CLOSED or not self._probing
+
+    def success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive = 0
+            self._probing = False
+
+    def failure(self):
+        """
+        Returns:
+            bool: True if this failure opened the breaker
+        """
+        with self._lock:
+            self.consecutive += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive >= self.failures):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def abandon(self):
+        """A request was cancelled (it lost a hedge race) without an outcome"""
+        with self._lock:
+            self._probing = False
+
+
+class Endpoint:
+    """
+    One witness base URL with its breaker and latency statistics
+    """
+
+    def __init__(self, url, breaker):
+        self.url = url.rstrip("/")
+        self.breaker = breaker
+        self.requests = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self._latencies.append(latency)
+            else:
+                self.errors += 1
+        registry.observe("witness_request_seconds", latency, endpoint=self.url, outcome="ok" if ok else "error")
+
+    def percentile(self, p, min_samples=1):
+        """
+        Nearest-rank percentile of the recent answer latencies
+
+        Returns:
+            float: Seconds, or None with fewer than min_samples answers
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < max(1, min_samples):
+            return None
+        rank = max(1, -(-len(latencies) * p // 100))
+        return latencies[int(rank) - 1]
+
+    def stats(self):
+        return {"requests": self.requests, "errors": self.errors, "state": self.breaker.state,
+                "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99)}
+
+
+class WitnessClient:
+    """
+    Witness API client with timeouts, jittered retries, hedging and circuit breakers
+    """
+
+    def __init__(self, urls, connect_timeout=WITNESS_CONNECT_TIMEOUT, read_timeout=WITNESS_READ_TIMEOUT,
+                 retries=WITNESS_RETRIES, backoff=WITNESS_BACKOFF, hedge_percentile=WITNESS_HEDGE_PERCENTILE,
+                 hedge_min_samples=WITNESS_HEDGE_MIN_SAMPLES, hedge_ratio=WITNESS_HEDGE_RATIO,
+                 breaker_failures=WITNESS_BREAKER_FAILURES, breaker_reset=WITNESS_BREAKER_RESET):
+        """
+        Initialize witness client
+
+        Args:
+            urls (list): Witness base URLs; requests go to the healthiest one first
+            connect_timeout (float): Connect timeout in seconds
+            read_timeout (float): Read timeout in seconds
+            retries (int): Retries after the first attempt
+            backoff (float): Backoff base in seconds; retry n waits up to backoff * 2**n
+            hedge_percentile (float): Latency percentile after which a hedged request is sent, 0 disables
+            hedge_min_samples (int): Answers an endpoint needs before its requests are hedged
+            hedge_ratio (float): Largest share of requests that may be hedged
+            breaker_failures (int): Consecutive failures that open an endpoint's breaker
+            breaker_reset (float): Seconds an open breaker fails fast before a probe
+        """
+        if not urls:
+            raise ValueError("no witness URL configured")
+        self.endpoints = [Endpoint(url, CircuitBreaker(breaker_failures, breaker_reset)) for url in urls]
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_ratio = hedge_ratio
+        self.calls = 0
+        self.hedges = 0
+        self.retried = 0
+        self.failed_fast = 0
+
+    def _pick(self, exclude=()):
+        """Healthiest endpoint that may take a request, preferring those not in exclude"""
+        def rank(endpoint):
+            p50 = endpoint.percentile(50)
+            return (endpoint in exclude, endpoint.breaker.state != CLOSED, p50 if p50 is not None else 0.0)
+
+        for endpoint in sorted(self.endpoints, key=rank):
+            if endpoint.breaker.would_allow() and endpoint.breaker.allow():
+                return endpoint
+        return None
+
+    def _hedge_delay(self, endpoint):
+        if self.hedge_percentile <= 0:
+            return None
+        return endpoint.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    async def _request(self, endpoint, path, params):
+        """
+        One GET to one endpoint
+
+        Returns:
+            tuple: (HTTP status code, response body text) of a non-retryable answer
+
+        Raises:
+            _AttemptFailed: On connection errors, timeouts and 429/5xx answers
+        """
+        import aiohttp
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+        started = time.perf_counter()
+        try:
+            async with get_async_http_session().get(endpoint.url + path, params=params,
+                                                    timeout=timeout) as response:
+                status, body = response.status, await response.text()
+        except asyncio.CancelledError:
+            endpoint.breaker.abandon()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self._failed(endpoint, started)
+            raise _AttemptFailed(endpoint, str(e) or type(e).__name__)
+        if status in RETRY_STATUS_CODES:
+            self._failed(endpoint, started)
+            raise _AttemptFailed(endpoint, f"HTTP {status} - {body[:200]}")
+        endpoint.record(time.perf_counter() - started, ok=True)
+        endpoint.breaker.success()
+        return status, body
+
+    def _failed(self, endpoint, started):
+        endpoint.record(time.perf_counter() - started, ok=False)
+        if endpoint.breaker.failure():
+            registry.inc("witness_breaker_open_total", endpoint=endpoint.url)
+            print(f"⚠️  Witness {endpoint.url} failing, circuit open for {endpoint.breaker.reset:g}s")
+
+    async def _attempt(self, path, params, exclude):
+        """
+        One attempt, hedged once the primary request is slower than usual
+
+        Returns:
+            tuple: (HTTP status code, response body text)
+        """
+        primary = self._pick(exclude)
+        if primary is None:
+            if any(endpoint.breaker.state == HALF_OPEN for endpoint in self.endpoints):
+                # A probe is deciding whether the witness is back: retry after it
+                raise _AttemptFailed(None, "witness recovery probe in flight")
+            self.failed_fast += 1
+            raise WitnessUnavailable("circuit open for every witness endpoint")
+        pending = {asyncio.ensure_future(self._request(primary, path, params))}
+        delay = self._hedge_delay(primary)
+        errors = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slower than the hedge percentile: race a duplicate against it
+                    delay = None
+                    if self.hedges < self.hedge_ratio * self.calls:
+                        hedge = self._pick({primary})
+                        if hedge is not None:
+                            self.hedges += 1
+                            registry.inc("witness_hedges_total")
+                            pending.add(asyncio.ensure_future(self._request(hedge, path, params)))
+                    continue
+                results = [task.result() for task in done if task.exception() is None]
+                errors += [task.exception() for task in done if task.exception() is not None]
+                if results:
+                    return results[0]
+                if any(not isinstance(error, _AttemptFailed) for error in errors):
+                    raise next(error for error in errors if not isinstance(error, _AttemptFailed))
+                # A failure before the hedge delay is retried rather than hedged
+                delay = None
+            raise errors[-1]
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get(self, params, path=SIGN_TRANSFER_PATH):
+        """
+        GET a witness API path with retries, hedging and circuit breaking
+
+        Args:
+            params (dict): Query parameters
+            path (str): API path
+
+        Returns:
+            tuple: (HTTP status code, response body text); 4xx answers are returned, not retried
+
+        Raises:
+            WitnessUnavailable: If every attempt failed or every endpoint's breaker is open
+        """
+        self.calls += 1
+        exclude = set()
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                registry.inc("witness_retries_total")
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            try:
+                return await self._attempt(path, params, exclude)
+            except _AttemptFailed as e:
+                error = e
+                exclude = {e.endpoint}
+        raise WitnessUnavailable(f"witness failed after {self.retries + 1} attempts: {error}")
+
+    async def sign_transfer(self, params):
+        """
+        Request a transfer signature
+
+        Returns:
+            tuple: (HTTP status code, response body text)
+        """
+        return await self.get(params, SIGN_TRANSFER_PATH)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Call, hedge, retry and fail-fast counts, and per-endpoint statistics
+        """
+        return {"calls": self.calls, "hedges": self.hedges, "retries": self.retried,
+                "failed_fast": self.failed_fast,
+                "endpoints": {endpoint.url: endpoint.stats() for endpoint in self.endpoints}}
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_witness_client(urls):
+    """
+    Get the process-wide witness client for some witness URLs, so every payment
+    engine shares its breakers and latency statistics
+
+    Returns:
+        WitnessClient: Shared client
+    """
+    key = tuple(urls)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = WitnessClient(list(urls))
+        return client